@@ -0,0 +1,5 @@
+"""
+Benchmarks for the Queue System.
+Run individual scripts as modules from the repository root, e.g.
+``python -m benchmarks.bench_store``.
+"""
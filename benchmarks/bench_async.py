@@ -0,0 +1,38 @@
+"""Throughput of AsyncQueueSystem.run() with network-bound coroutine handlers.
+
+Each handler awaits ``latency`` seconds; with enough concurrency a single
+event loop keeps thousands of messages in flight.
+"""
+import asyncio
+import logging
+import sys
+import time
+from queue.async_manager import AsyncQueueSystem
+
+CONCURRENCY = [1, 10, 100, 1000, 5000]
+
+def run(concurrency, max_messages=10_000, latency=0.01):
+    # Keep low-concurrency runs short: 100 handler latencies per slot
+    messages = min(max_messages, concurrency * 100)
+    queue_system = AsyncQueueSystem()
+    for i in range(messages):
+        queue_system.enqueue({'n': i})
+
+    async def handler(message):
+        await asyncio.sleep(latency)
+
+    start = time.perf_counter()
+    counts = asyncio.run(queue_system.run(handler, concurrency=concurrency))
+    elapsed = time.perf_counter() - start
+    assert counts['processed'] == messages
+    return messages / elapsed
+
+def main(argv=None):
+    levels = [int(c) for c in (argv or sys.argv[1:])] or CONCURRENCY
+    logging.disable(logging.CRITICAL)
+    print(f"{'concurrency':>12}{'msgs/sec':>12}")
+    for concurrency in levels:
+        print(f"{concurrency:>12}{run(concurrency):>12.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Messages/sec for enqueue -> dequeue -> ack at different batch sizes.
+
+Batch APIs take the lock (and write the WAL) once per batch, so per-message
+overhead should fall as the batch size grows.
+"""
+import logging
+import shutil
+import sys
+import tempfile
+import time
+from queue.manager import QueueSystem
+from queue.wal import WriteAheadLog
+
+BATCH_SIZES = [1, 10, 100, 1000]
+
+def run(batch_size, messages, wal=None):
+    queue_system = QueueSystem(wal=wal)
+    payloads = [{'n': i} for i in range(batch_size)]
+    start = time.perf_counter()
+    for _ in range(messages // batch_size):
+        if batch_size == 1:
+            queue_system.enqueue(payloads[0])
+            message = queue_system.dequeue()
+            queue_system.ack(message['id'])
+        else:
+            queue_system.enqueue_many(payloads)
+            batch = queue_system.dequeue_batch(batch_size)
+            queue_system.ack_many([message['id'] for message in batch])
+    return messages / (time.perf_counter() - start)
+
+def main(argv=None):
+    args = argv or sys.argv[1:]
+    messages = int(args[0]) if args else 100_000
+    logging.disable(logging.CRITICAL)
+    print(f"{'batch':>8}{'in-memory msgs/sec':>20}{'WAL (group) msgs/sec':>22}")
+    for batch_size in BATCH_SIZES:
+        memory_rate = run(batch_size, messages)
+        directory = tempfile.mkdtemp()
+        try:
+            wal = WriteAheadLog(directory, sync='group')
+            wal_rate = run(batch_size, min(messages, batch_size * 200), wal)
+            wal.close()
+        finally:
+            shutil.rmtree(directory)
+        print(f"{batch_size:>8}{memory_rate:>20.0f}{wal_rate:>22.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Round-trip latency and pipelined throughput through the socket broker.
+
+Runs the broker in its own process and a client in this one, over a Unix
+socket and over loopback TCP.  Reports the round-trip latency of a ping
+and of one enqueue -> dequeue -> ack cycle with one request in flight,
+then enqueue + dequeue/ack throughput with requests pipelined ``window``
+at a time, and with ``enqueue_many``/``dequeue_batch`` batches.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from queue.async_manager import AsyncQueueSystem
+from queue.broker import Broker, BrokerClient
+
+PAYLOAD = {'n': 12345, 'user': 'alice', 'items': [{'sku': 'A-1', 'qty': 2}]}
+
+def serve(path, conn):
+    logging.disable(logging.CRITICAL)
+
+    async def main():
+        queue_system = AsyncQueueSystem(max_size=0, processing_timeout=0)
+        async with Broker(queue_system, path=path, port=0) as broker:
+            conn.send((broker.address, broker.token))
+            await broker.serve_forever()
+    asyncio.run(main())
+
+def start_broker(path=None):
+    parent_conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=serve, args=(path, child_conn), daemon=True)
+    process.start()
+    address, token = parent_conn.recv()
+    if path is not None:
+        return process, {'path': address}
+    return process, {'host': address[0], 'port': address[1], 'token': token}
+
+def percentiles(latencies):
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+async def latency(client, requests):
+    pings, cycles = [], []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await client.ping()
+        pings.append(time.perf_counter() - start)
+    for _ in range(requests):
+        start = time.perf_counter()
+        await client.enqueue(PAYLOAD)
+        message = await client.dequeue()
+        await client.ack(message.id)
+        cycles.append(time.perf_counter() - start)
+    return percentiles(pings), percentiles(cycles)
+
+async def pipelined(client, messages, window):
+    """Messages per second through enqueue and dequeue + ack, ``window`` requests in flight"""
+    start = time.perf_counter()
+    for done in range(0, messages, window):
+        await asyncio.gather(*(client.enqueue(PAYLOAD) for _ in range(min(window, messages - done))))
+    enqueued = time.perf_counter() - start
+
+    async def consume():
+        message = await client.dequeue()
+        await client.ack(message.id)
+
+    start = time.perf_counter()
+    for done in range(0, messages, window):
+        await asyncio.gather(*(consume() for _ in range(min(window, messages - done))))
+    return messages / enqueued, messages / (time.perf_counter() - start)
+
+async def batched(client, messages, batch_size):
+    start = time.perf_counter()
+    for done in range(0, messages, batch_size):
+        await client.enqueue_many([PAYLOAD] * min(batch_size, messages - done))
+    enqueued = time.perf_counter() - start
+    start = time.perf_counter()
+    received = 0
+    while received < messages:
+        batch = await client.dequeue_batch(batch_size)
+        await client.ack_many([message.id for message in batch])
+        received += len(batch)
+    return messages / enqueued, messages / (time.perf_counter() - start)
+
+async def measure(address, requests, messages):
+    async with BrokerClient(pool_size=4, **address) as client:
+        (ping_p50, ping_p99), (cycle_p50, cycle_p99) = await latency(client, requests)
+        rates = [('pipelined x1', await pipelined(client, messages // 10, 1)),
+                 ('pipelined x100', await pipelined(client, messages, 100)),
+                 ('batches of 100', await batched(client, messages, 100))]
+    return (ping_p50, ping_p99, cycle_p50, cycle_p99), rates
+
+def main(argv=None):
+    args = argv or sys.argv[1:]
+    messages = int(args[0]) if args else 50_000
+    requests = max(messages // 10, 100)
+    logging.disable(logging.CRITICAL)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for label, path in (('unix', os.path.join(directory, 'broker.sock')), ('tcp', None)):
+            process, address = start_broker(path)
+            try:
+                results[label] = asyncio.run(measure(address, requests, messages))
+            finally:
+                process.terminate()
+                process.join()
+
+    print(f"{'socket':<8}{'ping p50 us':>13}{'ping p99 us':>13}{'cycle p50 us':>14}"
+          f"{'cycle p99 us':>14}")
+    for label, (latencies, _) in results.items():
+        print(f"{label:<8}" + ''.join(f"{value * 1e6:>{width}.1f}"
+                                      for value, width in zip(latencies, (13, 13, 14, 14))))
+    print()
+    print(f"{'socket':<8}{'mode':<16}{'enqueue msg/s':>15}{'dequeue+ack msg/s':>19}")
+    for label, (_, rates) in results.items():
+        for mode, (enqueue_rate, consume_rate) in rates:
+            print(f"{label:<8}{mode:<16}{enqueue_rate:>15,.0f}{consume_rate:>19,.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""Enqueue cost of capacity enforcement per overflow policy.
+
+Fills a queue bounded at ``max_size`` and then keeps producing past it, so
+the bounded policies pay their overflow path on every message.  The
+capacity check itself is a length comparison and should add no per-message
+cost relative to the unbounded queue.
+"""
+import logging
+import sys
+import tempfile
+import time
+from queue.manager import QueueSystem
+
+def fill(max_size, overflow, messages, spill_directory=None):
+    queue_system = QueueSystem(max_size=max_size, overflow=overflow,
+                               spill_directory=spill_directory)
+    start = time.perf_counter()
+    for i in range(messages):
+        queue_system.enqueue({'n': i})
+    return (time.perf_counter() - start) / messages * 1e9
+
+def main(argv=None):
+    args = argv or sys.argv[1:]
+    messages = int(args[0]) if args else 100_000
+    max_size = messages // 2
+    logging.disable(logging.CRITICAL)
+    print(f"{'policy':<14}{'max_size':>10}{'messages':>10}{'ns/enqueue':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for overflow, limit in (('block', 0), ('block', messages), ('drop_oldest', max_size),
+                                ('spill', max_size)):
+            elapsed = fill(limit, overflow, messages, directory)
+            label = 'unbounded' if not limit else overflow
+            print(f"{label:<14}{limit:>10}{messages:>10}{elapsed:>12.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Payload codecs against JSON, and what lazy decoding saves a queue.
+
+Reports encode and decode cost and payload size per codec for a few
+payload shapes, then the enqueue -> dequeue -> ack cycle and memory per
+pending message with data kept as objects (``codec='none'``) and encoded
+with the binary codec: for handlers that skip or read the data, and with
+a write-ahead log, which stores encoded payloads without re-serializing.
+"""
+import gc
+import json
+import logging
+import sys
+import tempfile
+import time
+import tracemalloc
+from queue.codec import CODECS, decode_payload, encode_payload
+from queue.manager import QueueSystem
+from queue.wal import WriteAheadLog
+
+PAYLOADS = {
+    'small': {'n': 12345, 'user': 'alice'},
+    'order': {'n': 12345, 'user': 'alice', 'items': [{'sku': 'A-1', 'qty': 2, 'price': 9.99},
+                                                     {'sku': 'B-7', 'qty': 1, 'price': 24.5}],
+              'paid': True, 'note': None},
+    'blob': {'n': 12345, 'image': bytes(range(256)) * 16},
+}
+
+def per_call(fn, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n
+
+def json_bytes(data):
+    # JSON has no bytes type; ship them as latin-1 text, as a JSON client would have to
+    return json.dumps(data, separators=(',', ':'),
+                      default=lambda value: value.decode('latin-1')).encode()
+
+def cycle(codec, messages, read, wal=None):
+    queue_system = QueueSystem(wal=wal, max_size=0, processing_timeout=0, codec=codec)
+    payload = PAYLOADS['order']
+    start = time.perf_counter()
+    for _ in range(messages):
+        queue_system.enqueue(payload)
+        message = queue_system.dequeue()
+        if read:
+            message['data']['n']
+        queue_system.ack(message['id'])
+    elapsed = (time.perf_counter() - start) / messages
+    if wal is not None:
+        wal.close()
+    return elapsed
+
+def memory(codec, messages):
+    """Bytes per pending message, counting the payloads the producer built"""
+    queue_system = QueueSystem(max_size=0, codec=codec)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    payloads = [dict(PAYLOADS['order'], n=i) for i in range(messages)]
+    queue_system.enqueue_many(payloads)
+    del payloads
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / messages
+
+def main(argv=None):
+    args = argv or sys.argv[1:]
+    messages = int(args[0]) if args else 50_000
+    logging.disable(logging.CRITICAL)
+
+    print(f"{'payload':<8}{'codec':<8}{'bytes':>8}{'encode us':>11}{'decode us':>11}")
+    for label, data in PAYLOADS.items():
+        encoded = json_bytes(data)
+        print(f"{label:<8}{'json':<8}{len(encoded):>8}"
+              f"{per_call(lambda: json_bytes(data), messages) * 1e6:>11.2f}"
+              f"{per_call(lambda: json.loads(encoded), messages) * 1e6:>11.2f}")
+        for name, codec in CODECS.items():
+            if name == 'json':
+                continue
+            payload = encode_payload(data, codec)
+            print(f"{label:<8}{name:<8}{len(payload):>8}"
+                  f"{per_call(lambda: encode_payload(data, codec), messages) * 1e6:>11.2f}"
+                  f"{per_call(lambda: decode_payload(payload), messages) * 1e6:>11.2f}")
+
+    print()
+    print(f"{'queue codec':<14}{'skip us/msg':>13}{'read us/msg':>13}{'WAL us/msg':>12}"
+          f"{'bytes/msg':>11}")
+    for codec in ('none', 'binary'):
+        with tempfile.TemporaryDirectory() as directory:
+            logged = cycle(codec, messages, True, WriteAheadLog(directory, sync='none'))
+        print(f"{codec:<14}{cycle(codec, messages, False) * 1e6:>13.2f}"
+              f"{cycle(codec, messages, True) * 1e6:>13.2f}{logged * 1e6:>12.2f}"
+              f"{memory(codec, messages):>11.0f}")
+
+if __name__ == '__main__':
+    main()
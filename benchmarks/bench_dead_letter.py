@@ -0,0 +1,40 @@
+"""Dead letter lookups: indexed store vs. scanning a list.
+
+Fills a dead letter queue where 1% of the messages failed with the error
+being investigated, then times fetching the first page of those messages
+through the error index and with a list scan.
+"""
+import logging
+import sys
+import time
+from queue.dead_letter import DeadLetterStore
+
+FAILURE_TYPES = ['timeout', 'network', 'database', 'validation', 'resource', 'business']
+
+def _dead(i):
+    error = 'schema mismatch' if i % 100 == 0 else f"error {i % 50}"
+    return {'id': i, 'data': {}, 'error': error,
+            'last_failure': {'type': FAILURE_TYPES[i % len(FAILURE_TYPES)], 'attempt': 1}}
+
+def main(argv=None):
+    sizes = [int(s) for s in (argv or sys.argv[1:])] or [10_000, 100_000, 1_000_000]
+    logging.disable(logging.CRITICAL)
+    print(f"{'messages':>10}{'scan ms':>10}{'index ms':>10}{'page':>10}")
+    for size in sizes:
+        messages = [_dead(i) for i in range(size)]
+        store = DeadLetterStore(max_size=0, max_age=0)
+        for message in messages:
+            store.append(message, dead_at=0)
+
+        start = time.perf_counter()
+        scanned = [m for m in messages if m['error'] == 'schema mismatch'][:100]
+        scan = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found, _ = store.query(error='schema mismatch', limit=100)
+        index = time.perf_counter() - start
+        assert found == scanned
+        print(f"{size:>10}{scan * 1e3:>10.2f}{index * 1e3:>10.2f}{len(found):>10}")
+
+if __name__ == '__main__':
+    main()
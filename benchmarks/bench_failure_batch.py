@@ -0,0 +1,48 @@
+"""handle_message_failure per message versus handle_failures_batch.
+
+Fails a batch of messages the way a downstream outage does, once with a
+single failure type and once with mixed types, and reports the cost per
+message of each path.
+"""
+import logging
+import sys
+import time
+from queue.circuit_breaker import CircuitBreakerRegistry
+from queue.failures import FailureType
+from queue.handler import FailureHandler
+from queue.message import Message
+
+def handler():
+    # A closed breaker keeps both paths on the same strategy
+    return FailureHandler(CircuitBreakerRegistry({'default': {'minimum_calls': 10**9}}))
+
+def per_message(messages, failure_types):
+    failure_handler = handler()
+    start = time.perf_counter()
+    for message, failure_type in zip(messages, failure_types):
+        failure_handler.handle_message_failure(message, failure_type)
+    return time.perf_counter() - start
+
+def batched(messages, failure_types):
+    failure_handler = handler()
+    start = time.perf_counter()
+    failure_handler.handle_failures_batch(messages, failure_types)
+    return time.perf_counter() - start
+
+def main(argv=None):
+    args = argv or sys.argv[1:]
+    count = int(args[0]) if args else 50_000
+    logging.disable(logging.CRITICAL)
+    workloads = (
+        ('network', [FailureType.NETWORK] * count),
+        ('mixed', [list(FailureType)[i % len(FailureType)] for i in range(count)]),
+    )
+    print(f"{'workload':<12}{'per-message us':>16}{'batch us':>12}{'speedup':>10}")
+    for label, failure_types in workloads:
+        single = per_message([Message(i, {}) for i in range(count)], failure_types)
+        batch = batched([Message(i, {}) for i in range(count)], failure_types)
+        print(f"{label:<12}{single / count * 1e6:>16.2f}{batch / count * 1e6:>12.2f}"
+              f"{single / batch:>9.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+"""Message ID generation cost: float timestamps vs. uuid4 vs. Snowflake IDs."""
+import sys
+import time
+import timeit
+import uuid
+from queue.utils import generate_message_id
+
+def main(argv=None):
+    number = int((argv or sys.argv[1:] or [1_000_000])[0])
+    cases = [
+        ('str(time.time())', lambda: str(time.time())),
+        ('str(uuid.uuid4())', lambda: str(uuid.uuid4())),
+        ('generate_message_id()', generate_message_id),
+    ]
+    print(f"{'generator':<24}{'ns/id':>10}{'bytes/id':>10}{'unique':>10}")
+    for name, func in cases:
+        elapsed = timeit.timeit(func, number=number)
+        sample = [func() for _ in range(100_000)]
+        unique = len(set(sample)) == len(sample)
+        size = sys.getsizeof(sample[0])
+        print(f"{name:<24}{elapsed / number * 1e9:>10.0f}{size:>10}{str(unique):>10}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""Cost of a reaper tick vs. number of in-flight leases.
+
+Leases 100k messages, lets a small fraction expire and times one
+``requeue_expired`` tick against a full scan of ``processing`` looking for
+expired deadlines.  The heap tick should only pay for the expired leases.
+"""
+import logging
+import sys
+import time
+from queue.manager import QueueSystem
+
+def lease(in_flight, expiring):
+    queue_system = QueueSystem(max_size=0, processing_timeout=0)
+    queue_system.enqueue_many([{'n': i} for i in range(in_flight)])
+    now = time.time()
+    deadlines = {}
+    for i in range(in_flight):
+        timeout = 1 if i < expiring else 3600
+        message = queue_system.dequeue(visibility_timeout=timeout)
+        deadlines[message['id']] = now + timeout
+    return queue_system, deadlines
+
+def heap_tick(queue_system, now):
+    start = time.perf_counter()
+    expired = queue_system.requeue_expired(now)
+    return time.perf_counter() - start, len(expired)
+
+def scan_tick(processing, deadlines, now):
+    start = time.perf_counter()
+    expired = [message for message_id, message in processing.items() if deadlines[message_id] <= now]
+    return time.perf_counter() - start, len(expired)
+
+def main(argv=None):
+    args = argv or sys.argv[1:]
+    in_flight = int(args[0]) if args else 100_000
+    logging.disable(logging.CRITICAL)
+    print(f"{'in flight':>10}{'expired':>10}{'scan ms':>10}{'heap ms':>10}")
+    for expiring in (0, 10, 1000):
+        queue_system, deadlines = lease(in_flight, expiring)
+        now = time.time() + 60
+        scan, _ = scan_tick(queue_system.processing, deadlines, now)
+        heap, expired = heap_tick(queue_system, now)
+        print(f"{in_flight:>10}{expired:>10}{scan * 1e3:>10.2f}{heap * 1e3:>10.2f}")
+
+if __name__ == '__main__':
+    main()
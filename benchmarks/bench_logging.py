@@ -0,0 +1,69 @@
+"""Messages/sec for enqueue -> dequeue -> ack with logging off and on.
+
+Compares logging disabled, every event written synchronously to a file
+(the previous setup), and the background JSON writer with the default
+1-in-100 sampling of enqueue/ack events.  Background numbers include
+draining the writer at the end.
+"""
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from queue.log import BackgroundHandler, JsonFormatter
+from queue.manager import QueueSystem
+
+def run(messages, sampled=True):
+    queue_system = QueueSystem(max_size=0)
+    if not sampled:
+        queue_system.events.sample_every = {}
+    start = time.perf_counter()
+    for i in range(messages):
+        queue_system.enqueue({'n': i})
+        message = queue_system.dequeue()
+        queue_system.ack(message['id'])
+    return time.perf_counter() - start
+
+def configure(handler, level=logging.INFO):
+    root = logging.getLogger()
+    for old in root.handlers:
+        root.removeHandler(old)
+        old.close()
+    if handler is not None:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+def main(argv=None):
+    args = argv or sys.argv[1:]
+    messages = int(args[0]) if args else 50_000
+    directory = tempfile.mkdtemp()
+    results = []
+
+    logging.disable(logging.CRITICAL)
+    configure(logging.NullHandler())
+    results.append(('off', run(messages)))
+    logging.disable(logging.NOTSET)
+
+    sync_handler = logging.FileHandler(os.path.join(directory, 'sync.log'))
+    sync_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    configure(sync_handler)
+    results.append(('sync, every event', run(messages, sampled=False)))
+
+    file_handler = logging.FileHandler(os.path.join(directory, 'async.jsonl'))
+    file_handler.setFormatter(JsonFormatter())
+    background = BackgroundHandler([file_handler])
+    configure(background)
+    start = time.perf_counter()
+    run(messages)
+    background.flush()
+    results.append(('background, sampled', time.perf_counter() - start))
+    configure(None)
+    shutil.rmtree(directory)
+
+    print(f"{'logging':<22}{'msgs/sec':>12}")
+    for label, elapsed in results:
+        print(f"{label:<22}{messages / elapsed:>12.0f}")
+
+if __name__ == '__main__':
+    main()
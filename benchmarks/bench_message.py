@@ -0,0 +1,49 @@
+"""Bytes per queued message: dict wrappers vs. __slots__ Message records.
+
+Measures with tracemalloc, excluding the payload itself, for fresh
+messages and for messages that have been through one failure.
+"""
+import sys
+import tracemalloc
+from datetime import datetime, UTC
+from queue.handler import FailureHandler
+from queue.failures import FailureType
+from queue.message import Message
+
+def dict_wrapper(i, payload):
+    return {
+        'id': i,
+        'data': payload,
+        'attempt': 0,
+        'timestamp': datetime.now(UTC).isoformat(),
+        'status': 'pending'
+    }
+
+def message_record(i, payload):
+    return Message(i, payload)
+
+def measure(factory, count, fail):
+    handler = FailureHandler()
+    handler.logger.disabled = True
+    payload = {'shared': True}
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    messages = [factory(i, payload) for i in range(count)]
+    if fail:
+        for message in messages:
+            handler.handle_message_failure(message, FailureType.NETWORK)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Exclude the list holding the messages
+    return (after - before - sys.getsizeof(messages)) / count
+
+def main(argv=None):
+    args = argv or sys.argv[1:]
+    count = int(args[0]) if args else 100_000
+    print(f"{'record':<10}{'state':<12}{'bytes/msg':>12}")
+    for name, factory in (('dict', dict_wrapper), ('Message', message_record)):
+        for state, fail in (('queued', False), ('retrying', True)):
+            print(f"{name:<10}{state:<12}{measure(factory, count, fail):>12.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Ordered throughput vs. number of partitions.
+
+Per-key ordering allows one consumer per partition, so a single
+``QueueSystem`` with ordered consumption is limited to one handler at a
+time.  Sharding by ``user_id`` lets each partition's consumer work in
+parallel; with I/O-bound handlers throughput should scale close to
+linearly with the partition count.  Each run also checks that every
+user's messages were handled in order.
+"""
+import logging
+import sys
+import threading
+import time
+from queue.partitioned import PartitionedQueueSystem
+
+PARTITIONS = [1, 2, 4, 8, 16]
+
+def run(partitions, messages=2_000, users=1_000, latency=0.002):
+    partitioned = PartitionedQueueSystem(partitions=partitions, key='user_id', max_size=0)
+    partitioned.enqueue_many([{'user_id': n % users, 'n': n} for n in range(messages)])
+    last_seen = {}
+    in_order = True
+    lock = threading.Lock()
+
+    def handler(message):
+        nonlocal in_order
+        time.sleep(latency)  # downstream call
+        data = message['data']
+        with lock:
+            in_order &= last_seen.get(data['user_id'], -1) < data['n']
+            last_seen[data['user_id']] = data['n']
+
+    start = time.perf_counter()
+    counts = partitioned.run(handler, poll_interval=0.01)
+    elapsed = time.perf_counter() - start
+    assert counts['processed'] == messages and in_order
+    return messages / elapsed
+
+def main(argv=None):
+    partitions = [int(p) for p in (argv or sys.argv[1:])] or PARTITIONS
+    logging.disable(logging.CRITICAL)
+    print(f"{'partitions':>10}{'msgs/sec':>12}{'speedup':>10}")
+    baseline = None
+    for count in partitions:
+        rate = run(count)
+        baseline = baseline or rate
+        print(f"{count:>10}{rate:>12.0f}{rate / baseline:>10.2f}")
+
+if __name__ == '__main__':
+    main()
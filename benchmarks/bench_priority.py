@@ -0,0 +1,47 @@
+"""Critical-message wait behind a bulk backlog: FIFO vs. weighted priority.
+
+Starts with a backlog of low-priority bulk messages, then each tick
+enqueues one more bulk message, a critical one every tenth tick, and
+dequeues one message.  Reports p50/p99 wait in ticks for critical
+messages and for bulk messages, plus the per-message enqueue+dequeue cost.
+"""
+import logging
+import sys
+import time
+from queue.manager import QueueSystem
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else 0
+
+def run(backlog, ticks, prioritized):
+    queue_system = QueueSystem(max_size=0, processing_timeout=0)
+    critical = 'critical' if prioritized else None
+    bulk = 'low' if prioritized else None
+    queue_system.enqueue_many([{'tick': 0, 'kind': 'bulk'}] * backlog, priority=bulk)
+    waits = {'critical': [], 'bulk': []}
+    start = time.perf_counter()
+    for tick in range(1, ticks + 1):
+        queue_system.enqueue({'tick': tick, 'kind': 'bulk'}, priority=bulk)
+        if tick % 10 == 0:
+            queue_system.enqueue({'tick': tick, 'kind': 'critical'}, priority=critical)
+        message = queue_system.dequeue()
+        waits[message['data']['kind']].append(tick - message['data']['tick'])
+        queue_system.ack(message['id'])
+    elapsed = time.perf_counter() - start
+    return waits, elapsed / (ticks * 1.1) * 1e9
+
+def main(argv=None):
+    args = argv or sys.argv[1:]
+    backlog = int(args[0]) if args else 10_000
+    ticks = int(args[1]) if len(args) > 1 else 20_000
+    logging.disable(logging.CRITICAL)
+    print(f"{'queue':<10}{'critical p50':>14}{'critical p99':>14}{'bulk p99':>10}{'ns/msg':>10}")
+    for label, prioritized in (('fifo', False), ('priority', True)):
+        waits, cost = run(backlog, ticks, prioritized)
+        print(f"{label:<10}{percentile(waits['critical'], 0.5):>14}"
+              f"{percentile(waits['critical'], 0.99):>14}"
+              f"{percentile(waits['bulk'], 0.99):>10}{cost:>10.0f}")
+
+if __name__ == '__main__':
+    main()
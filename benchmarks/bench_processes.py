@@ -0,0 +1,45 @@
+"""CPU-bound handler throughput: worker threads vs. worker processes.
+
+Thread mode is capped at one core by the GIL; process mode should scale
+with the number of worker processes up to the core count.
+"""
+import logging
+import multiprocessing
+import sys
+import time
+from queue.manager import QueueSystem
+
+def cpu_handler(message):
+    total = 0
+    for i in range(message['data']['work']):
+        total += i * i
+    return total
+
+def _fill(messages, work):
+    queue_system = QueueSystem()
+    for _ in range(messages):
+        queue_system.enqueue({'work': work})
+    return queue_system
+
+def main(argv=None):
+    args = argv or sys.argv[1:]
+    messages = int(args[0]) if args else 2_000
+    work = 20_000
+    logging.disable(logging.CRITICAL)
+    cores = multiprocessing.cpu_count()
+    print(f"{'mode':<12}{'workers':>8}{'msgs/sec':>12}")
+    for workers in sorted({1, 2, 4, cores}):
+        queue_system = _fill(messages, work)
+        start = time.perf_counter()
+        queue_system.run(cpu_handler, workers=workers)
+        rate = messages / (time.perf_counter() - start)
+        print(f"{'threads':<12}{workers:>8}{rate:>12.0f}")
+    for workers in sorted({1, 2, 4, cores}):
+        queue_system = _fill(messages, work)
+        start = time.perf_counter()
+        queue_system.run_processes(cpu_handler, processes=workers, batch_size=32)
+        rate = messages / (time.perf_counter() - start)
+        print(f"{'processes':<12}{workers:>8}{rate:>12.0f}")
+
+if __name__ == '__main__':
+    main()
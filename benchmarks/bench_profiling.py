@@ -0,0 +1,54 @@
+"""Cost of instrumentation hooks, and where a mixed workload spends its time.
+
+Runs enqueue -> dequeue -> process -> ack with no hooks, with an empty
+hook, with ``PhaseTimer`` and under ``SamplingProfiler``, then prints the
+per-phase table for a workload where one message in four fails.
+"""
+import logging
+import sys
+import time
+from queue.failures import FailureType, MessageFailure
+from queue.manager import QueueSystem
+from queue.profiling import Hook, PhaseTimer, SamplingProfiler
+
+def handler(message):
+    if message['data']['n'] % 4 == 0:
+        raise MessageFailure("flaky", FailureType.NETWORK)
+
+def cycle(queue_system, messages, work=lambda message: None):
+    start = time.perf_counter()
+    for i in range(messages):
+        queue_system.enqueue({'n': i})
+        queue_system.process_message(queue_system.dequeue(), work)
+    return (time.perf_counter() - start) / messages
+
+def main(argv=None):
+    args = argv or sys.argv[1:]
+    messages = int(args[0]) if args else 20_000
+    logging.disable(logging.CRITICAL)
+
+    results = []
+    results.append(('no hooks', cycle(QueueSystem(max_size=0), messages)))
+    queue_system = QueueSystem(max_size=0)
+    queue_system.add_hook(Hook())
+    results.append(('empty hook', cycle(queue_system, messages)))
+    queue_system = QueueSystem(max_size=0)
+    queue_system.add_hook(PhaseTimer())
+    results.append(('PhaseTimer', cycle(queue_system, messages)))
+    queue_system = QueueSystem(max_size=0)
+    with SamplingProfiler(queue_system):
+        results.append(('SamplingProfiler', cycle(queue_system, messages)))
+
+    print(f"{'instrumentation':<20}{'us/msg':>10}")
+    for label, per_message in results:
+        print(f"{label:<20}{per_message * 1e6:>10.2f}")
+
+    queue_system = QueueSystem(max_size=0)
+    timer = PhaseTimer()
+    queue_system.add_hook(timer)
+    cycle(queue_system, messages, handler)
+    print()
+    print(timer.report())
+
+if __name__ == '__main__':
+    main()
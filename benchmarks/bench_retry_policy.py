@@ -0,0 +1,51 @@
+"""Retry herds and the cost of jitter.
+
+Fails a batch of messages with NETWORK at the same instant under each
+jitter scheme and reports how their first retries spread out: the most
+retries due in any one second, and the window they span.  Then times
+``handle_message_failure`` and ``handle_failures_batch`` per scheme.
+"""
+import logging
+import random
+import sys
+import time
+from queue.circuit_breaker import CircuitBreakerRegistry
+from queue.failures import FailureType
+from queue.handler import FailureHandler
+from queue.message import Message
+from queue.retry_policy import JITTER, compile_policies
+
+def handler(jitter):
+    policies = compile_policies({'NETWORK': {'strategy': 'retry_with_backoff', 'base_delay': 10,
+                                             'max_delay': 600, 'jitter': jitter}})
+    return FailureHandler(CircuitBreakerRegistry({'default': {'minimum_calls': 10**9}}),
+                          policies=policies, rng=random.Random(1))
+
+def main(argv=None):
+    args = argv or sys.argv[1:]
+    count = int(args[0]) if args else 50_000
+    logging.disable(logging.CRITICAL)
+
+    print(f"{'jitter':<14}{'peak/s':>10}{'spread s':>10}{'per-message us':>16}{'batch us':>12}")
+    for jitter in JITTER:
+        messages = [Message(i, {}) for i in range(count)]
+        failure_handler = handler(jitter)
+        start = time.perf_counter()
+        for message in messages:
+            failure_handler.handle_message_failure(message, FailureType.NETWORK)
+        single = time.perf_counter() - start
+
+        messages = [Message(i, {}) for i in range(count)]
+        start = time.perf_counter()
+        handler(jitter).handle_failures_batch(messages, FailureType.NETWORK)
+        batch = time.perf_counter() - start
+
+        offsets = [message.next_process_at - message.last_failure_at for message in messages]
+        per_second = {}
+        for offset in offsets:
+            per_second[int(offset)] = per_second.get(int(offset), 0) + 1
+        print(f"{jitter:<14}{max(per_second.values()):>10}{max(offsets) - min(offsets):>10.1f}"
+              f"{single / count * 1e6:>16.2f}{batch / count * 1e6:>12.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""Cost per worker wakeup with many delayed retries outstanding.
+
+Schedules N retries with random deadlines, then pops them in due order in
+small steps, reporting the average cost of each ``dequeue_ready`` call.
+Cost should grow with log(N), not N.
+"""
+import random
+import sys
+import time
+from queue.scheduler import RetryScheduler
+
+SIZES = [1_000, 10_000, 100_000]
+
+def run(size, wakeups=1_000):
+    scheduler = RetryScheduler()
+    rng = random.Random(size)
+    for i in range(size):
+        scheduler.schedule({'id': i}, rng.uniform(0, size))
+    step = size / wakeups
+    start = time.perf_counter()
+    popped = 0
+    for n in range(1, wakeups + 1):
+        popped += len(scheduler.dequeue_ready(now=n * step))
+    elapsed = time.perf_counter() - start
+    return elapsed / wakeups, popped
+
+def main(argv=None):
+    sizes = [int(s) for s in (argv or sys.argv[1:])] or SIZES
+    print(f"{'outstanding':>12}{'us/wakeup':>12}{'us/message':>12}")
+    for size in sizes:
+        per_wakeup, popped = run(size)
+        per_message = per_wakeup * 1_000 / popped
+        print(f"{size:>12}{per_wakeup * 1e6:>12.1f}{per_message * 1e6:>12.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Drain time vs. queue depth for the indexed pending store.
+
+Compares the PendingQueue-backed ``QueueSystem`` dequeue/ack path with the
+previous list-backed ``queue.remove(message)`` approach.  Per-message cost
+should stay flat as depth grows for the indexed store.
+"""
+import logging
+import sys
+import time
+from queue.manager import QueueSystem
+
+DEPTHS = [10_000, 100_000, 1_000_000]
+LIST_DEPTHS = [1_000, 10_000, 20_000]
+
+def _wrapper(i):
+    return {'id': i, 'data': {'n': i}, 'attempt': 0, 'status': 'pending'}
+
+def drain_queue_system(depth):
+    qs = QueueSystem()
+    for i in range(depth):
+        qs.queue.append(_wrapper(i))
+    start = time.perf_counter()
+    while True:
+        message = qs.dequeue()
+        if message is None:
+            break
+        qs.ack(message['id'])
+    return time.perf_counter() - start
+
+def drain_list(depth):
+    queue = [_wrapper(i) for i in range(depth)]
+    start = time.perf_counter()
+    while queue:
+        # Old process_message: remove by value from the list
+        queue.remove(queue[0])
+    return time.perf_counter() - start
+
+def main(argv=None):
+    depths = [int(d) for d in (argv or sys.argv[1:])] or DEPTHS
+    logging.disable(logging.CRITICAL)
+    print(f"{'store':<12}{'depth':>12}{'seconds':>12}{'ns/msg':>12}")
+    for depth in LIST_DEPTHS:
+        elapsed = drain_list(depth)
+        print(f"{'list':<12}{depth:>12}{elapsed:>12.3f}{elapsed / depth * 1e9:>12.0f}")
+    for depth in depths:
+        elapsed = drain_queue_system(depth)
+        print(f"{'indexed':<12}{depth:>12}{elapsed:>12.3f}{elapsed / depth * 1e9:>12.0f}")
+
+if __name__ == '__main__':
+    main()
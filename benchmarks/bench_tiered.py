@@ -0,0 +1,76 @@
+"""Resident memory and dequeue latency with the backlog spilled to disk.
+
+Grows a backlog in steps, once held entirely in memory (``max_size=0``)
+and once with a hot window of ``max_size`` messages in front of the
+memory-mapped spill segments, and prints resident memory after each step.
+Then drains the spilled backlog and reports dequeue + ack latency.
+Resident memory is read from ``/proc/self/statm`` (Linux).
+"""
+import gc
+import logging
+import os
+import sys
+import tempfile
+import time
+from queue.manager import QueueSystem
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+def resident_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * PAGE_SIZE / 2**20
+
+def grow(queue_system, messages, steps):
+    rows = []
+    step = messages // steps
+    payloads = [{'n': i, 'body': 'x' * 64} for i in range(10_000)]
+    start = resident_mb()
+    for done in range(step, messages + 1, step):
+        for _ in range(0, step, len(payloads)):
+            queue_system.enqueue_many(payloads)
+        gc.collect()
+        rows.append((done, resident_mb() - start))
+    return rows
+
+def drain(queue_system, messages):
+    latencies = []
+    for _ in range(messages):
+        start = time.perf_counter()
+        message = queue_system.dequeue()
+        queue_system.ack(message['id'])
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+def main(argv=None):
+    args = argv or sys.argv[1:]
+    messages = int(args[0]) if args else 1_000_000
+    max_size = 10_000
+    logging.disable(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as directory:
+        tiered = QueueSystem(max_size=max_size, overflow='spill', spill_directory=directory,
+                             processing_timeout=0)
+        tiered_rows = grow(tiered, messages, 5)
+        in_memory = QueueSystem(max_size=0, processing_timeout=0)
+        memory_rows = grow(in_memory, messages, 5)
+        del in_memory
+        gc.collect()
+
+        print(f"{'backlog':>10}{'in-memory MB':>14}{'tiered MB':>12}")
+        for (done, memory), (_, tiered_mb) in zip(memory_rows, tiered_rows):
+            print(f"{done:>10}{memory:>14.1f}{tiered_mb:>12.1f}")
+        print(f"spill segments: {tiered.spill.segments()}")
+
+        p50, p99 = drain(tiered, min(messages, 200_000))
+        print()
+        print(f"{'dequeue + ack':<16}{'p50 us':>10}{'p99 us':>10}")
+        print(f"{'tiered':<16}{p50 * 1e6:>10.2f}{p99 * 1e6:>10.2f}")
+        hot = QueueSystem(max_size=0, processing_timeout=0)
+        hot.enqueue_many([{'n': i, 'body': 'x' * 64} for i in range(min(messages, 200_000))])
+        p50, p99 = drain(hot, min(messages, 200_000))
+        print(f"{'in-memory':<16}{p50 * 1e6:>10.2f}{p99 * 1e6:>10.2f}")
+        tiered.spill.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""TTL sweeps: expire_due against scanning with is_message_expired.
+
+Builds queues of growing depth where 1,000 messages have passed their TTL
+and times one sweep each way.  ``expire_due`` pops the expired messages
+off the expiry heap; the scan checks every pending message.
+"""
+import logging
+import sys
+import time
+from queue.manager import QueueSystem
+from queue.utils import is_message_expired
+
+def build(depth, expired):
+    queue_system = QueueSystem(max_size=0)
+    queue_system.enqueue_many([{'n': i} for i in range(expired)], ttl=1)
+    queue_system.enqueue_many([{'n': i} for i in range(depth - expired)], ttl=3600)
+    return queue_system
+
+def main(argv=None):
+    args = argv or sys.argv[1:]
+    depths = [int(arg) for arg in args] or [10_000, 100_000, 1_000_000]
+    expired = 1_000
+    logging.disable(logging.CRITICAL)
+    print(f"{'depth':>10}{'expire_due ms':>16}{'scan ms':>12}")
+    for depth in depths:
+        queue_system = build(depth, expired)
+        now = time.time() + 2
+        start = time.perf_counter()
+        scanned = [m for m in queue_system.queue if is_message_expired(m)]
+        scan = time.perf_counter() - start
+        start = time.perf_counter()
+        swept = queue_system.expire_due(now)
+        sweep = time.perf_counter() - start
+        assert len(swept) == expired
+        print(f"{depth:>10}{sweep * 1e3:>16.2f}{scan * 1e3:>12.2f}")
+
+if __name__ == '__main__':
+    main()
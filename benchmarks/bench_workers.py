@@ -0,0 +1,34 @@
+"""Throughput of QueueSystem.run() with an I/O-bound handler.
+
+Each handler call sleeps for ``latency`` seconds to stand in for a network
+round trip; throughput should scale roughly with the number of workers.
+"""
+import logging
+import sys
+import time
+from queue.manager import QueueSystem
+
+WORKERS = [1, 2, 4, 8, 16, 32]
+
+def run(workers, messages=2_000, latency=0.002):
+    queue_system = QueueSystem()
+    for i in range(messages):
+        queue_system.enqueue({'n': i})
+    start = time.perf_counter()
+    counts = queue_system.run(lambda message: time.sleep(latency), workers=workers)
+    elapsed = time.perf_counter() - start
+    assert counts['processed'] == messages
+    return messages / elapsed
+
+def main(argv=None):
+    worker_counts = [int(w) for w in (argv or sys.argv[1:])] or WORKERS
+    logging.disable(logging.CRITICAL)
+    print(f"{'workers':>8}{'msgs/sec':>12}{'speedup':>10}")
+    baseline = None
+    for workers in worker_counts:
+        rate = run(workers)
+        baseline = baseline or rate
+        print(f"{workers:>8}{rate:>12.0f}{rate / baseline:>10.1f}x")
+
+if __name__ == '__main__':
+    main()
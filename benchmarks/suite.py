@@ -0,0 +1,286 @@
+"""Benchmark suite with machine-readable results and regression checks.
+
+Covers enqueue/dequeue throughput, drain time against queue depth,
+``FailureHandler.handle_message_failure`` cost per ``FailureType``, a
+retry-heavy workload, memory per message and WAL replay time.  Each
+benchmark runs ``--repeat`` times; results are the median and the
+spread between runs.
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --baseline results.json
+
+With ``--baseline`` the run exits with status 1 if any metric is worse
+than the baseline by more than its threshold in
+``benchmarks/thresholds.json`` (``--threshold`` overrides the default),
+raised to ``NOISE_FACTOR`` times the spread either run observed, but
+never past ``MAX_NOISE_WIDENING`` times the threshold.
+``--quick`` runs at a tenth of the size, e.g. for CI smoke runs, and
+only compares against quick baselines.
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, Any, Callable, List, Optional
+from queue.circuit_breaker import CircuitBreakerRegistry
+from queue.failures import FailureType
+from queue.handler import FailureHandler
+from queue.manager import QueueSystem
+from queue.message import Message
+from queue.wal import WriteAheadLog
+
+THRESHOLDS_PATH = os.path.join(os.path.dirname(__file__), 'thresholds.json')
+# A regression must exceed this multiple of the observed run-to-run spread
+NOISE_FACTOR = 1.5
+# ... but noise never widens a threshold by more than this multiple
+MAX_NOISE_WIDENING = 2
+
+# name -> function(scale) returning {metric: (value, unit, 'higher' or 'lower')}
+BENCHMARKS: Dict[str, Callable[[float], Dict[str, tuple]]] = {}
+
+def benchmark(function: Callable[[float], Dict[str, tuple]]) -> Callable:
+    BENCHMARKS[function.__name__] = function
+    return function
+
+def size(n: int, scale: float) -> int:
+    return max(1, int(n * scale))
+
+@benchmark
+def throughput(scale: float) -> Dict[str, tuple]:
+    messages = size(100_000, scale)
+    queue_system = QueueSystem(max_size=0, processing_timeout=0)
+    start = time.perf_counter()
+    for i in range(messages):
+        queue_system.enqueue({'n': i})
+    enqueue = messages / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for _ in range(messages):
+        queue_system.ack(queue_system.dequeue()['id'])
+    dequeue = messages / (time.perf_counter() - start)
+    return {
+        'enqueue': (enqueue, 'msgs/s', 'higher'),
+        'dequeue_ack': (dequeue, 'msgs/s', 'higher'),
+    }
+
+@benchmark
+def drain(scale: float) -> Dict[str, tuple]:
+    """Per-message drain cost at growing depths; flat means O(1) dequeue"""
+    results = {}
+    for depth in (1_000, 10_000, 100_000):
+        depth = size(depth, scale)
+        queue_system = QueueSystem(max_size=0, processing_timeout=0)
+        queue_system.enqueue_many([{'n': i} for i in range(depth)])
+        start = time.perf_counter()
+        while True:
+            batch = queue_system.dequeue_batch(256)
+            if not batch:
+                break
+            queue_system.ack_many([message['id'] for message in batch])
+        results[f"depth_{depth}"] = ((time.perf_counter() - start) / depth * 1e6, 'us/msg', 'lower')
+    return results
+
+@benchmark
+def failure_handler(scale: float) -> Dict[str, tuple]:
+    calls = size(20_000, scale)
+    handler = FailureHandler()
+    results = {}
+    for failure_type in FailureType:
+        messages = [Message(i, {'n': i}) for i in range(calls)]
+        start = time.perf_counter()
+        for message in messages:
+            handler.handle_message_failure(message, failure_type)
+        results[failure_type.value] = ((time.perf_counter() - start) / calls * 1e6, 'us/call', 'lower')
+    messages = [Message(i, {'n': i}) for i in range(calls)]
+    start = time.perf_counter()
+    FailureHandler().handle_failures_batch(messages, FailureType.NETWORK)
+    results['batch_network'] = ((time.perf_counter() - start) / calls * 1e6, 'us/call', 'lower')
+    return results
+
+@benchmark
+def retries(scale: float) -> Dict[str, tuple]:
+    """Every message fails twice with NETWORK before it is acked"""
+    messages = size(20_000, scale)
+    queue_system = QueueSystem(max_size=0, processing_timeout=0)
+    # Keep the breaker closed: this measures the retry path, not parking
+    queue_system.failure_handler.circuit_breakers = CircuitBreakerRegistry(
+        {'default': {'minimum_calls': messages * 3}})
+    queue_system.enqueue_many([{'n': i} for i in range(messages)])
+    done = 0
+    start = time.perf_counter()
+    while done < messages:
+        batch = queue_system.dequeue_batch(256)
+        if not batch:
+            # Fast-forward the retry schedule instead of sleeping through it
+            queue_system.dequeue_ready(time.time() + 3600)
+            continue
+        failing = [message['id'] for message in batch if message['attempt'] < 2]
+        succeeded = [message['id'] for message in batch if message['attempt'] >= 2]
+        queue_system.nack_many(failing, 'flaky', FailureType.NETWORK)
+        done += queue_system.ack_many(succeeded)
+    return {'network_twice': (messages / (time.perf_counter() - start), 'msgs/s', 'higher')}
+
+@benchmark
+def memory(scale: float) -> Dict[str, tuple]:
+    messages = size(100_000, scale)
+    queue_system = QueueSystem(max_size=0)
+    payloads = [{'n': i} for i in range(messages)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    queue_system.enqueue_many(payloads)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return {'bytes_per_message': (used / messages, 'bytes', 'lower')}
+
+@benchmark
+def replay(scale: float) -> Dict[str, tuple]:
+    records = size(200_000, scale)
+    directory = tempfile.mkdtemp()
+    try:
+        wal = WriteAheadLog(directory, sync='none', checkpoint_records=records + 1)
+        for start in range(0, records, 10_000):
+            wal.append_many([('enqueue', Message(i, {'n': i}))
+                             for i in range(start, min(start + 10_000, records))])
+        wal.close()
+        start = time.perf_counter()
+        restored = QueueSystem(wal=WriteAheadLog(directory, sync='none'))
+        elapsed = time.perf_counter() - start
+        restored.wal.close()
+        assert len(restored.queue) == records
+    finally:
+        shutil.rmtree(directory)
+    return {'startup': (elapsed / records * 1e6, 'us/record', 'lower')}
+
+def run(names: Optional[List[str]] = None, scale: float = 1.0,
+        repeat: int = 5) -> Dict[str, Dict[str, Any]]:
+    """Run benchmarks and return ``{'<benchmark>.<metric>': {value, spread, unit, better}}``
+
+    ``value`` is the median over ``repeat`` runs and ``spread`` the range
+    of the runs as a fraction of it, i.e. the noise a comparison must
+    tolerate.
+    """
+    samples: Dict[str, List[float]] = {}
+    metrics: Dict[str, Dict[str, Any]] = {}
+    for name in names or list(BENCHMARKS):
+        for _ in range(repeat):
+            gc.collect()
+            for metric, (value, unit, better) in BENCHMARKS[name](scale).items():
+                key = f"{name}.{metric}"
+                samples.setdefault(key, []).append(value)
+                metrics[key] = {'unit': unit, 'better': better}
+    for key, values in samples.items():
+        median = statistics.median(values)
+        metrics[key]['value'] = median
+        metrics[key]['spread'] = (max(values) - min(values)) / median if median else 0.0
+    return metrics
+
+def load_thresholds(path: str = THRESHOLDS_PATH) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+def check_comparable(results: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Raise ValueError unless both runs used the same benchmark sizes"""
+    def scale(run: Dict[str, Any]) -> float:
+        # Results written before 'scale' was recorded only say whether they were quick
+        return run.get('scale', 0.1 if run.get('quick') else 1.0)
+
+    if scale(results) != scale(baseline):
+        raise ValueError(f"Cannot compare a run at scale {scale(results)} with a baseline "
+                         f"at scale {scale(baseline)}; rerun with matching --quick")
+
+def compare(metrics: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            thresholds: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Return the metrics that got worse than ``baseline`` by more than their threshold
+
+    ``thresholds`` holds a ``default`` fraction and per-metric overrides
+    under ``metrics``.  A metric's threshold is raised to
+    ``NOISE_FACTOR`` times the larger run-to-run spread of the two runs,
+    so noise alone is not reported, capped at ``MAX_NOISE_WIDENING``
+    times the threshold so a noisy run can't hide a real regression.
+    Metrics missing from either side are skipped.
+    """
+    regressions = []
+    for key, current in metrics.items():
+        base = baseline.get(key)
+        if base is None or not base['value']:
+            continue
+        if current['better'] == 'higher':
+            change = (base['value'] - current['value']) / base['value']
+        else:
+            change = (current['value'] - base['value']) / base['value']
+        limit = thresholds.get('metrics', {}).get(key, thresholds['default'])
+        noise = max(current.get('spread', 0.0), base.get('spread', 0.0))
+        limit = min(max(limit, noise * NOISE_FACTOR), MAX_NOISE_WIDENING * limit)
+        if change > limit:
+            regressions.append({'metric': key, 'baseline': base['value'],
+                                'current': current['value'], 'change': change,
+                                'threshold': limit})
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('benchmarks', nargs='*',
+                        help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument('--output', help="write results as JSON")
+    parser.add_argument('--baseline', help="results JSON to check for regressions")
+    parser.add_argument('--threshold', type=float, help="default allowed regression fraction")
+    parser.add_argument('--thresholds', default=THRESHOLDS_PATH, help="thresholds JSON")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="runs per benchmark; results are the median")
+    parser.add_argument('--quick', action='store_true', help="run at a tenth of the size")
+    args = parser.parse_args(argv)
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    logging.disable(logging.CRITICAL)
+    scale = 0.1 if args.quick else 1.0
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        try:
+            check_comparable({'scale': scale}, baseline)
+        except ValueError as e:
+            parser.error(str(e))
+
+    metrics = run(args.benchmarks or None, scale, args.repeat)
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.time(),
+        'quick': args.quick,
+        'scale': scale,
+        'metrics': metrics,
+    }
+
+    print(f"{'metric':<36}{'value':>14}{'spread':>9}  unit")
+    for key, metric in metrics.items():
+        print(f"{key:<36}{metric['value']:>14.2f}{metric['spread']:>9.0%}  {metric['unit']}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if baseline is not None:
+        thresholds = load_thresholds(args.thresholds)
+        if args.threshold is not None:
+            thresholds['default'] = args.threshold
+        regressions = compare(metrics, baseline['metrics'], thresholds)
+        for regression in regressions:
+            print(f"REGRESSION {regression['metric']}: {regression['baseline']:.2f} -> "
+                  f"{regression['current']:.2f} ({regression['change']:+.0%}, "
+                  f"allowed {regression['threshold']:.0%})")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against", args.baseline)
+
+if __name__ == '__main__':
+    main()
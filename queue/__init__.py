@@ -1,6 +1,8 @@
 from .manager import QueueSystem
+from .async_manager import AsyncQueueSystem
+from .partitioned import PartitionedQueueSystem
 from .handler import FailureHandler
-from .failures import FailureType
+from .failures import FailureType, MessageFailure
 
 __version__ = "1.0.0"
-__all__ = ['QueueSystem', 'FailureHandler', 'FailureType']
\ No newline at end of file
+__all__ = ['QueueSystem', 'AsyncQueueSystem', 'PartitionedQueueSystem', 'FailureHandler', 'FailureType', 'MessageFailure']
\ No newline at end of file
@@ -0,0 +1,210 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+from .capacity import OverflowPolicy, QueueFullError
+from .manager import QueueSystem
+
+class AsyncQueueSystem(QueueSystem):
+    """asyncio front end for ``QueueSystem``.
+
+    Queue state, failure handling and the dead letter queue are shared with
+    ``QueueSystem``; this class adds awaitable ``get``/``put`` and coroutine
+    handlers so one event loop can keep thousands of messages in flight.
+    Coroutines produce with ``put``/``put_many``, which wait for space on a
+    full queue without blocking the loop; producers in other threads may
+    keep calling the synchronous ``enqueue``.
+
+    With a write-ahead log, synchronous calls made on the event loop don't
+    wait for the group commit: they return once their records are buffered
+    and leave the LSN for ``take_unsynced``, and checkpoints run on a
+    thread.  ``put``/``put_many`` await durability before returning.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._space_freed: Optional[asyncio.Event] = None
+        self._unsynced_lsn: Optional[int] = None
+        self._checkpointing = False
+
+    def _bind_loop(self) -> asyncio.Event:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._space_freed = asyncio.Event()
+        return self._wakeup
+
+    def _on_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _wake(self, event: Optional[asyncio.Event]) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        if self._on_loop():
+            event.set()
+        else:
+            # Called from a producer or consumer thread
+            loop.call_soon_threadsafe(event.set)
+
+    def _sync(self, lsn: Optional[int]) -> None:
+        if self.wal is None or not self._on_loop():
+            super()._sync(lsn)
+            return
+        if lsn is not None:
+            self._unsynced_lsn = max(lsn, self._unsynced_lsn or 0)
+        if self.wal.needs_checkpoint() and not self._checkpointing:
+            self._checkpointing = True
+            threading.Thread(target=self._checkpoint_in_background, name='queue-checkpoint',
+                             daemon=True).start()
+
+    def _checkpoint_in_background(self) -> None:
+        try:
+            self.checkpoint()
+        finally:
+            self._checkpointing = False
+
+    def take_unsynced(self) -> Optional[int]:
+        """Return and forget the last LSN logged on the loop without waiting for it"""
+        lsn, self._unsynced_lsn = self._unsynced_lsn, None
+        return lsn
+
+    async def wait_durable(self, lsn: Optional[int]) -> None:
+        """Wait for ``lsn`` to be committed without blocking the loop"""
+        if self.wal is None or lsn is None:
+            return
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def committed() -> None:
+            if not future.done():
+                future.set_result(None)
+
+        self.wal.when_durable(lsn, lambda: loop.call_soon_threadsafe(committed))
+        await future
+
+    def _notify_available(self, wake_all: bool = False) -> None:
+        super()._notify_available(wake_all)
+        self._wake(self._wakeup)
+
+    def _notify_space(self) -> None:
+        super()._notify_space()
+        self._wake(self._space_freed)
+
+    async def put(self, message: Dict[str, Any], timeout: Optional[float] = None,
+                  priority: Optional[str] = None, ttl: Optional[float] = None) -> int:
+        """Awaitable ``enqueue``; returns the message id
+
+        Under the blocking overflow policy a full queue is waited on here,
+        for up to ``timeout`` (default ``overflow_timeout``) seconds, while
+        the loop keeps running the consumers that free space.
+        """
+        return (await self.put_many([message], timeout, priority, ttl))[0]
+
+    async def put_many(self, messages: List[Dict[str, Any]], timeout: Optional[float] = None,
+                       priority: Optional[str] = None, ttl: Optional[float] = None) -> List[int]:
+        """Awaitable ``enqueue_many``; the batch is admitted whole once it fits"""
+        self._bind_loop()
+        if timeout is None:
+            timeout = self.overflow_timeout
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self._space_freed.clear()
+            try:
+                message_ids = self.enqueue_many(messages, timeout=0, priority=priority, ttl=ttl)
+            except QueueFullError:
+                if self.overflow is not OverflowPolicy.BLOCK or len(messages) > self.max_size:
+                    raise
+                wait = None if end is None else end - time.monotonic()
+                if wait is not None and wait <= 0:
+                    raise QueueFullError(f"Queue is still full after {timeout}s "
+                                         f"({len(self.queue)}/{self.max_size} pending)") from None
+            else:
+                await self.wait_durable(self.take_unsynced())
+                return message_ids
+            try:
+                await asyncio.wait_for(self._space_freed.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def get(self, timeout: Optional[float] = None,
+                  visibility_timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Wait for the next message and move it to processing
+
+        Sleeps until a message is enqueued or the earliest scheduled retry
+        falls due.  Returns ``None`` if ``timeout`` expires first.
+        """
+        wakeup = self._bind_loop()
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wakeup.clear()
+            message = self.dequeue(visibility_timeout=visibility_timeout)
+            if message is not None:
+                return message
+            wait = None
+            next_deadline = self.scheduled.next_deadline()
+            if next_deadline is not None:
+                wait = max(next_deadline - time.time(), 0)
+            if end is not None:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return None
+                wait = remaining if wait is None else min(wait, remaining)
+            try:
+                await asyncio.wait_for(wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def process(self, message: Dict[str, Any],
+                      handler: Callable[[Dict[str, Any]], Awaitable[Any]]) -> bool:
+        """Run a coroutine handler for a message and ack or fail it"""
+        if not self._begin_processing(message):
+            return False
+        started = time.perf_counter()
+        try:
+            await handler(message)
+        except Exception as e:
+            self.metrics.handler.observe(time.perf_counter() - started)
+            return self._finish_processing(message, e)
+        self.metrics.handler.observe(time.perf_counter() - started)
+        return self._finish_processing(message)
+
+    async def run(self, handler: Callable[[Dict[str, Any]], Awaitable[Any]],
+                  concurrency: int = 100, visibility_timeout: Optional[float] = None,
+                  stop_when_empty: bool = True, stop_event: Optional[asyncio.Event] = None,
+                  poll_interval: float = 0.1) -> Dict[str, int]:
+        """Consume messages with up to ``concurrency`` handlers in flight"""
+        stop_event = stop_event or asyncio.Event()
+        limit = asyncio.Semaphore(concurrency)
+        counts = {'processed': 0, 'failed': 0}
+        tasks = set()
+
+        async def dispatch(message: Dict[str, Any]) -> None:
+            try:
+                result = await self.process(message, handler)
+                counts['processed' if result else 'failed'] += 1
+            finally:
+                limit.release()
+
+        while not stop_event.is_set():
+            await limit.acquire()
+            self.requeue_expired()
+            message = await self.get(timeout=poll_interval, visibility_timeout=visibility_timeout)
+            if message is None:
+                limit.release()
+                if stop_when_empty and not tasks and self._is_idle():
+                    break
+                continue
+            task = asyncio.create_task(dispatch(message))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.gather(*tasks)
+        return counts
@@ -0,0 +1,581 @@
+"""Local socket broker: one QueueSystem shared by producers and consumers
+in other processes.
+
+Requests and responses are frames of ``length | code | request id |
+body``: a little-endian u32 byte count of the rest of the frame, one byte
+naming the operation (or the response status), a u32 request id and a
+``marshal``-encoded tuple of arguments or results.  Responses carry the
+request's id, so a client can pipeline any number of requests on one
+connection and a long-polling dequeue doesn't hold up the requests behind
+it.  Message data crosses the socket as codec payloads (see ``codec``)
+and the broker stores them without decoding.
+
+The broker only listens on loopback addresses and owner-only Unix
+sockets.  Any local user can reach a loopback port, so a TCP connection
+must first present the broker's ``token`` (``AUTH``).  Payloads the
+broker would have to unpickle to decode (the pickle codec, the binary
+codec's pickle fallback, unknown codecs) are refused, so a client can't
+run code in consumers, and malformed frames close their connection.
+"""
+import argparse
+import asyncio
+import hmac
+import ipaddress
+import marshal
+import os
+import secrets
+import socket
+import struct
+import sys
+from typing import Dict, Any, List, Optional, Tuple, Union
+from . import config
+from .async_manager import AsyncQueueSystem
+from .capacity import QueueFullError
+from .codec import CODECS, Codec, get_codec, unpickles
+from .failures import FailureType
+from .message import Message, DEAD_LETTER, FAILURE_CODES, FAILURE_TYPES, PROCESSING
+from .wal import WriteAheadLog
+
+FRAME = struct.Struct('<IBI')
+# Bytes after the length field: code + request id
+HEADER_BYTES = FRAME.size - 4
+MARSHAL_VERSION = 4
+
+# Operations
+PING, ENQUEUE, DEQUEUE, ACK, NACK, DEAD_LETTERS, REDRIVE, STATS, AUTH = range(9)
+# Response status
+OK, ERROR = 0, 1
+
+class BrokerError(Exception):
+    """Raised on the client for broker errors without a local equivalent"""
+
+# Server errors re-raised as the same type on the client
+ERRORS = {'QueueFullError': QueueFullError, 'ValueError': ValueError}
+
+def pack_frame(code: int, request_id: int, body: Any) -> bytes:
+    data = marshal.dumps(body, MARSHAL_VERSION)
+    return FRAME.pack(len(data) + HEADER_BYTES, code, request_id) + data
+
+def split_frames(buffer: bytearray, max_bytes: int) -> List[Tuple[int, int, Any]]:
+    """Remove the complete frames from ``buffer`` and return them decoded
+
+    Raises ValueError for a frame over ``max_bytes`` or one that doesn't decode.
+    """
+    frames = []
+    offset = 0
+    end = len(buffer)
+    while end - offset >= FRAME.size:
+        length, code, request_id = FRAME.unpack_from(buffer, offset)
+        if length > max_bytes:
+            raise ValueError(f"Frame of {length} bytes exceeds {max_bytes}")
+        stop = offset + 4 + length
+        if stop > end:
+            break
+        try:
+            body = marshal.loads(buffer[offset + FRAME.size:stop])
+        except (ValueError, EOFError, TypeError) as e:
+            raise ValueError(f"Malformed frame: {e}") from None
+        frames.append((code, request_id, body))
+        offset = stop
+    del buffer[:offset]
+    return frames
+
+def resolve_localhost(host: str) -> str:
+    """Map ``localhost`` to ``127.0.0.1``
+
+    asyncio resolves host names with ``getaddrinfo`` on its default thread
+    pool; an address literal is used as it is.
+    """
+    return '127.0.0.1' if host == 'localhost' else host
+
+def check_loopback(host: str) -> None:
+    try:
+        address = ipaddress.ip_address(resolve_localhost(host))
+    except ValueError:
+        address = None
+    if address is None or not address.is_loopback:
+        raise ValueError(f"The broker only listens on loopback addresses, got {host!r}")
+
+def _message_record(message: Dict[str, Any], codec: Codec) -> tuple:
+    if not isinstance(message, Message):
+        message = Message.from_dict(message)
+    return message.id, message.payload_bytes(codec), message.attempt, message.created_at
+
+def _dead_record(message: Dict[str, Any], codec: Codec) -> tuple:
+    if not isinstance(message, Message):
+        message = Message.from_dict(message)
+    code = message.last_failure_code
+    failure_type = None if code is None else FAILURE_TYPES[code].value
+    return (_message_record(message, codec)
+            + (message.error, failure_type, message.last_failure_at))
+
+class _ServerConnection(asyncio.Protocol):
+    def __init__(self, broker: 'Broker'):
+        self.broker = broker
+        self.transport: Optional[asyncio.Transport] = None
+        self.buffer = bytearray()
+        self.authenticated = broker.token is None
+        # Long-polling dequeues and responses waiting for the WAL,
+        # cancelled if the client goes away
+        self.tasks = set()
+
+    def connection_made(self, transport: asyncio.Transport) -> None:
+        self.transport = transport
+        self.broker._connections.add(self)
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self.broker._connections.discard(self)
+        for task in self.tasks:
+            task.cancel()
+
+    def data_received(self, data: bytes) -> None:
+        self.buffer += data
+        try:
+            frames = split_frames(self.buffer, self.broker.max_frame_bytes)
+        except ValueError as e:
+            self.broker.logger.warning("Closing broker connection: %s", e)
+            self.transport.close()
+            return
+        # Every response ready now goes out in one write
+        responses = []
+        for code, request_id, args in frames:
+            if not self.authenticated:
+                if not self.broker._authenticate(code, args):
+                    self.broker.logger.warning("Closing unauthenticated broker connection")
+                    self.transport.close()
+                    return
+                self.authenticated = True
+                responses.append(pack_frame(OK, request_id, ()))
+                continue
+            responses.append(self.broker._handle(self, code, request_id, args))
+        responses = b''.join(response for response in responses if response)
+        if responses:
+            self.transport.write(responses)
+
+    def send(self, frame: bytes) -> None:
+        if not self.transport.is_closing():
+            self.transport.write(frame)
+
+class Broker:
+    """Serves an ``AsyncQueueSystem`` over a local Unix or TCP socket.
+
+    With ``path`` the broker listens on a Unix socket only its owner can
+    connect to; otherwise on ``host``/``port`` (default ``BROKER_HOST``/
+    ``BROKER_PORT``), which must be a loopback address.  TCP clients must
+    authenticate with ``token`` (default ``BROKER_TOKEN``, or a random one
+    read from ``broker.token``); a Unix socket only checks a token if one
+    is configured.  Requests are
+    handled on the event loop in the order they arrive; only dequeues
+    that have to wait for a message are parked, on ``get``.  Enqueues and
+    redrives never block the loop: a full queue fails the request with
+    ``QueueFullError`` instead.  With a write-ahead log their responses
+    are sent once the group commit holding their records is durable,
+    while the loop goes on serving other requests.
+    """
+
+    def __init__(self, queue_system: Optional[AsyncQueueSystem] = None,
+                 path: Optional[str] = None, host: Optional[str] = None,
+                 port: Optional[int] = None, max_frame_bytes: Optional[int] = None,
+                 token: Optional[str] = None):
+        self.queue_system = queue_system or AsyncQueueSystem()
+        self.path = path
+        self.host = resolve_localhost(config.BROKER_HOST if host is None else host)
+        self.port = config.BROKER_PORT if port is None else port
+        if path is None:
+            check_loopback(self.host)
+        self.token = config.BROKER_TOKEN if token is None else token
+        if path is None and not self.token:
+            self.token = secrets.token_urlsafe(32)
+        self.max_frame_bytes = (config.BROKER_MAX_FRAME_BYTES if max_frame_bytes is None
+                                else max_frame_bytes)
+        # Payloads decoded in the broker (e.g. by a local handler) are
+        # re-encoded with the queue's codec
+        self.codec = self.queue_system.codec or CODECS['binary']
+        self.logger = self.queue_system.logger
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections = set()
+        self._handlers = {
+            PING: self._ping, ENQUEUE: self._enqueue, DEQUEUE: self._dequeue, ACK: self._ack,
+            NACK: self._nack, DEAD_LETTERS: self._dead_letters, REDRIVE: self._redrive,
+            STATS: self._stats, AUTH: self._auth,
+        }
+
+    @property
+    def address(self) -> Union[str, Tuple[str, int]]:
+        """The Unix socket path, or the bound ``(host, port)``"""
+        if self.path is not None:
+            return self.path
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self.path is not None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            # Created owner-only: a chmod after bind leaves the socket open meanwhile
+            umask = os.umask(0o177)
+            try:
+                sock.bind(self.path)
+            except BaseException:
+                sock.close()
+                raise
+            finally:
+                os.umask(umask)
+            self._server = await loop.create_unix_server(lambda: _ServerConnection(self), sock=sock)
+        else:
+            self._server = await loop.create_server(lambda: _ServerConnection(self),
+                                                    self.host, self.port)
+        # Calls made on this loop defer their WAL waits to ``_handle``
+        self.queue_system._bind_loop()
+        self.queue_system.start_reaper()
+        self.logger.info("Broker listening on %s", self.address)
+
+    async def serve_forever(self) -> None:
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is None:
+            return
+        self._server.close()
+        for connection in list(self._connections):
+            connection.transport.close()
+        await self._server.wait_closed()
+        self._server = None
+        self.queue_system.stop_reaper()
+        if self.path is not None and os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def __aenter__(self) -> 'Broker':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def _handle(self, connection: _ServerConnection, code: int, request_id: int,
+                args: tuple) -> Optional[bytes]:
+        """Run one request; returns its response frame, or None once parked"""
+        try:
+            handler = self._handlers.get(code)
+            if handler is None:
+                raise ValueError(f"Unknown broker operation {code}")
+            result = handler(connection, request_id, *args)
+        except Exception as e:
+            response = pack_frame(ERROR, request_id, (type(e).__name__, str(e)))
+        else:
+            if result is None:
+                return None
+            response = pack_frame(OK, request_id, result)
+        lsn = self.queue_system.take_unsynced()
+        if lsn is None:
+            return response
+        self._track(connection, self._respond_when_durable(connection, lsn, response))
+        return None
+
+    @staticmethod
+    def _track(connection: _ServerConnection, coroutine) -> None:
+        task = asyncio.ensure_future(coroutine)
+        connection.tasks.add(task)
+        task.add_done_callback(connection.tasks.discard)
+
+    async def _respond_when_durable(self, connection, lsn, response) -> None:
+        await self.queue_system.wait_durable(lsn)
+        connection.send(response)
+
+    def _authenticate(self, code: int, args: Any) -> bool:
+        return (code == AUTH and isinstance(args, tuple) and len(args) == 1
+                and isinstance(args[0], str)
+                and hmac.compare_digest(args[0].encode(), self.token.encode()))
+
+    def _auth(self, connection, request_id, token) -> tuple:
+        # Only reached once authenticated, or on a broker without a token
+        return ()
+
+    def _ping(self, connection, request_id) -> tuple:
+        return ()
+
+    def _enqueue(self, connection, request_id, payloads, priority, ttl) -> List[int]:
+        for payload, _ in payloads:
+            if not isinstance(payload, bytes) or unpickles(payload):
+                raise ValueError("Refusing a payload that would be unpickled; encode message "
+                                 "data with the marshal-backed binary codec or JSON")
+        return self.queue_system.enqueue_encoded(payloads, timeout=0, priority=priority, ttl=ttl)
+
+    def _dequeue(self, connection, request_id, max_n, timeout, visibility_timeout):
+        batch = self.queue_system.dequeue_batch(max_n, 0, visibility_timeout)
+        if batch or timeout == 0:
+            return [_message_record(message, self.codec) for message in batch]
+        self._track(connection,
+                    self._long_poll(connection, request_id, max_n, timeout, visibility_timeout))
+        return None
+
+    async def _long_poll(self, connection, request_id, max_n, timeout, visibility_timeout) -> None:
+        # Cancelled only while waiting, so no message is taken for a closed connection
+        try:
+            message = await self.queue_system.get(timeout, visibility_timeout)
+            batch = [] if message is None else [message]
+            if message is not None and max_n > 1:
+                batch += self.queue_system.dequeue_batch(max_n - 1, 0, visibility_timeout)
+            response = pack_frame(OK, request_id,
+                                  [_message_record(message, self.codec) for message in batch])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            response = pack_frame(ERROR, request_id, (type(e).__name__, str(e)))
+        connection.send(response)
+
+    def _ack(self, connection, request_id, message_ids) -> int:
+        return self.queue_system.ack_many(message_ids)
+
+    def _nack(self, connection, request_id, message_ids, error, failure_type) -> int:
+        failure_type = None if failure_type is None else FailureType(failure_type)
+        return self.queue_system.nack_many(message_ids, error, failure_type)
+
+    def _dead_letters(self, connection, request_id, failure_type, error, limit, cursor) -> tuple:
+        with self.queue_system._lock:
+            messages, cursor = self.queue_system.dead_letter_queue.query(
+                failure_type, error, limit=limit, cursor=cursor)
+            return [_dead_record(message, self.codec) for message in messages], cursor
+
+    def _redrive(self, connection, request_id, failure_type, error, limit) -> int:
+        failure_type = None if failure_type is None else FailureType(failure_type)
+        return self.queue_system.redrive(failure_type, error, limit=limit, timeout=0)
+
+    def _stats(self, connection, request_id) -> Dict[str, int]:
+        return dict(self.queue_system.monitor_health(), connections=len(self._connections))
+
+class _ClientConnection(asyncio.Protocol):
+    """One pipelined connection: requests are matched to responses by id"""
+
+    def __init__(self, max_frame_bytes: int):
+        self.max_frame_bytes = max_frame_bytes
+        self.transport: Optional[asyncio.Transport] = None
+        self.buffer = bytearray()
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.next_id = 0
+        # Frames queued this loop iteration, written together
+        self.outgoing: List[bytes] = []
+        self.writable = asyncio.Event()
+        self.writable.set()
+        self.lost: Optional[Exception] = None
+
+    def connection_made(self, transport: asyncio.Transport) -> None:
+        self.transport = transport
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self.lost = exc or ConnectionError("Broker connection closed")
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(self.lost)
+        self.pending.clear()
+        self.writable.set()
+
+    def pause_writing(self) -> None:
+        self.writable.clear()
+
+    def resume_writing(self) -> None:
+        self.writable.set()
+
+    def data_received(self, data: bytes) -> None:
+        self.buffer += data
+        try:
+            frames = split_frames(self.buffer, self.max_frame_bytes)
+        except ValueError as e:
+            self.transport.close()
+            self.connection_lost(e)
+            return
+        for status, request_id, body in frames:
+            future = self.pending.pop(request_id, None)
+            if future is None or future.done():
+                continue
+            if status == OK:
+                future.set_result(body)
+            else:
+                name, text = body
+                future.set_exception(ERRORS.get(name, BrokerError)(text if name in ERRORS
+                                                                   else f"{name}: {text}"))
+
+    def _flush(self) -> None:
+        frames, self.outgoing = self.outgoing, []
+        if self.lost is None:
+            self.transport.write(b''.join(frames))
+
+    async def request(self, code: int, args: tuple) -> Any:
+        if not self.writable.is_set():
+            await self.writable.wait()
+        if self.lost is not None:
+            raise ConnectionError("Broker connection closed") from self.lost
+        self.next_id = (self.next_id + 1) & 0xFFFFFFFF
+        future = asyncio.get_running_loop().create_future()
+        self.pending[self.next_id] = future
+        if not self.outgoing:
+            asyncio.get_running_loop().call_soon(self._flush)
+        self.outgoing.append(pack_frame(code, self.next_id, args))
+        return await future
+
+class BrokerClient:
+    """Pooled asyncio client for a ``Broker``.
+
+    Opens ``pool_size`` connections (default ``BROKER_POOL_SIZE``) and
+    sends each request on the one with the fewest requests in flight.
+    Requests are pipelined: any number may be awaited concurrently, and
+    those made in the same loop iteration go out in one write.  Data is
+    encoded with ``codec`` (default ``MESSAGE_CODEC``; ``'none'`` uses the
+    binary codec, as data must cross the socket as bytes); data it could
+    only pickle is refused by the broker.  Dequeued messages are
+    ``Message`` objects whose data is decoded on first read.  ``token``
+    (default ``BROKER_TOKEN``) authenticates each connection.
+    """
+
+    def __init__(self, path: Optional[str] = None, host: Optional[str] = None,
+                 port: Optional[int] = None, pool_size: Optional[int] = None,
+                 codec: Union[Codec, str, None] = None,
+                 dependency_key: Optional[str] = 'dependency',
+                 max_frame_bytes: Optional[int] = None, token: Optional[str] = None):
+        self.path = path
+        self.token = config.BROKER_TOKEN if token is None else token
+        self.host = resolve_localhost(config.BROKER_HOST if host is None else host)
+        self.port = config.BROKER_PORT if port is None else port
+        self.pool_size = config.BROKER_POOL_SIZE if pool_size is None else pool_size
+        self.codec = get_codec(config.MESSAGE_CODEC if codec is None else codec) or CODECS['binary']
+        self.dependency_key = dependency_key
+        self.max_frame_bytes = (config.BROKER_MAX_FRAME_BYTES if max_frame_bytes is None
+                                else max_frame_bytes)
+        self._connections: List[_ClientConnection] = []
+
+    async def connect(self) -> None:
+        loop = asyncio.get_running_loop()
+        for _ in range(self.pool_size - len(self._connections)):
+            protocol = lambda: _ClientConnection(self.max_frame_bytes)
+            if self.path is not None:
+                _, connection = await loop.create_unix_connection(protocol, self.path)
+            else:
+                _, connection = await loop.create_connection(protocol, self.host, self.port)
+            if self.token:
+                await connection.request(AUTH, (self.token,))
+            self._connections.append(connection)
+
+    async def close(self) -> None:
+        for connection in self._connections:
+            connection.transport.close()
+        self._connections = []
+
+    async def __aenter__(self) -> 'BrokerClient':
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def _request(self, code: int, *args: Any):
+        connections = [connection for connection in self._connections if connection.lost is None]
+        if not connections:
+            raise ConnectionError("BrokerClient is not connected")
+        return min(connections, key=lambda connection: len(connection.pending)).request(code, args)
+
+    def _encode(self, data: Any) -> Tuple[bytes, Any]:
+        message = Message(None, data)
+        message.encode(self.codec, self.dependency_key)
+        return message.payload, message.dependency
+
+    @staticmethod
+    def _message(record: tuple, status_code: int = PROCESSING) -> Message:
+        message_id, payload, attempt, created_at = record[:4]
+        message = Message(message_id, None, created_at, attempt, status_code)
+        message.payload = payload
+        return message
+
+    async def ping(self) -> None:
+        await self._request(PING)
+
+    async def enqueue(self, data: Any, priority: Optional[str] = None,
+                      ttl: Optional[float] = None) -> int:
+        """Add a message; returns its id"""
+        return (await self.enqueue_many([data], priority, ttl))[0]
+
+    async def enqueue_many(self, messages: List[Any], priority: Optional[str] = None,
+                           ttl: Optional[float] = None) -> List[int]:
+        """Add several messages in one request; returns their ids"""
+        return await self._request(ENQUEUE, [self._encode(data) for data in messages],
+                                   priority, ttl)
+
+    async def dequeue(self, timeout: Optional[float] = 0,
+                      visibility_timeout: Optional[float] = None) -> Optional[Message]:
+        """Lease the next message, waiting up to ``timeout`` seconds (None: forever)"""
+        batch = await self.dequeue_batch(1, timeout, visibility_timeout)
+        return batch[0] if batch else None
+
+    async def dequeue_batch(self, max_n: int, max_wait: Optional[float] = 0,
+                            visibility_timeout: Optional[float] = None) -> List[Message]:
+        """Lease up to ``max_n`` messages, waiting up to ``max_wait`` for the first"""
+        records = await self._request(DEQUEUE, max_n, max_wait, visibility_timeout)
+        return [self._message(record) for record in records]
+
+    async def ack(self, message_id: int) -> bool:
+        return await self.ack_many([message_id]) == 1
+
+    async def ack_many(self, message_ids: List[int]) -> int:
+        return await self._request(ACK, list(message_ids))
+
+    async def nack(self, message_id: int, error: str = 'Negative acknowledgement',
+                   failure_type: Optional[FailureType] = None) -> bool:
+        return await self.nack_many([message_id], error, failure_type) == 1
+
+    async def nack_many(self, message_ids: List[int], error: str = 'Negative acknowledgement',
+                        failure_type: Optional[FailureType] = None) -> int:
+        """Fail in-flight messages; they are retried or dead-lettered as in ``QueueSystem``"""
+        return await self._request(NACK, list(message_ids), error,
+                                   None if failure_type is None else FailureType(failure_type).value)
+
+    async def dead_letters(self, failure_type: Union[FailureType, str, None] = None,
+                           error: Optional[str] = None, limit: int = 100,
+                           cursor: Optional[int] = None) -> Tuple[List[Message], Optional[int]]:
+        """Page through the dead letter queue, as ``DeadLetterStore.query``"""
+        if failure_type is not None:
+            failure_type = FailureType(failure_type).value
+        records, cursor = await self._request(DEAD_LETTERS, failure_type, error, limit, cursor)
+        messages = []
+        for record in records:
+            message = self._message(record, DEAD_LETTER)
+            message.error, failure_type, message.last_failure_at = record[4:]
+            if failure_type is not None:
+                message.last_failure_code = FAILURE_CODES[failure_type]
+            messages.append(message)
+        return messages, cursor
+
+    async def redrive(self, failure_type: Union[FailureType, str, None] = None,
+                      error: Optional[str] = None, limit: Optional[int] = None) -> int:
+        """Move matching dead-lettered messages back to the pending queue"""
+        if failure_type is not None:
+            failure_type = FailureType(failure_type).value
+        return await self._request(REDRIVE, failure_type, error, limit)
+
+    async def stats(self) -> Dict[str, int]:
+        """The broker queue's ``monitor_health`` plus open connections"""
+        return await self._request(STATS)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve a queue over a local socket")
+    parser.add_argument('--path', help="Unix socket path (default: TCP on --host/--port)")
+    parser.add_argument('--host', default=config.BROKER_HOST)
+    parser.add_argument('--port', type=int, default=config.BROKER_PORT)
+    parser.add_argument('--max-size', type=int, help="pending message limit (0: unbounded)")
+    parser.add_argument('--wal', help="write-ahead log directory for a durable queue")
+    parser.add_argument('--token', help="token TCP clients must present (default: "
+                                        "BROKER_TOKEN, else a random one printed here)")
+    args = parser.parse_args(argv)
+
+    async def serve() -> None:
+        wal = WriteAheadLog(args.wal) if args.wal else None
+        async with Broker(AsyncQueueSystem(wal=wal, max_size=args.max_size), args.path, args.host,
+                          args.port, token=args.token) as broker:
+            if broker.token and not (args.token or config.BROKER_TOKEN):
+                print(f"Broker token: {broker.token}", file=sys.stderr)
+            await broker.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
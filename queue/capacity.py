@@ -0,0 +1,240 @@
+import mmap
+import os
+import pickle
+import shutil
+import struct
+import tempfile
+import weakref
+from collections import deque
+from enum import Enum
+from itertools import islice
+from typing import Deque, Dict, Any, Callable, Iterator, List, Optional
+from . import config
+
+FRAME_LENGTH = struct.Struct('<I')
+_WILLNEED = getattr(mmap, 'MADV_WILLNEED', None)
+
+class OverflowPolicy(Enum):
+    BLOCK = "block"              # wait for room, then raise QueueFullError
+    REJECT = "reject"            # raise QueueFullError immediately
+    DROP_OLDEST = "drop_oldest"  # dead-letter the oldest lowest-priority message
+    SPILL = "spill"              # keep the overflow in a file on disk
+
+class QueueFullError(Exception):
+    """Raised when a bounded queue cannot accept more messages"""
+
+class Watermarks:
+    """High/low watermark hysteresis over the pending message count.
+
+    ``on_high`` fires once when the backlog reaches ``high``; ``on_low``
+    fires once it has drained back to ``low``.  Both receive the
+    ``QueueSystem``, so producers can pause and resume.
+    """
+
+    def __init__(self, high: int, low: int,
+                 on_high: Optional[Callable[[Any], None]] = None,
+                 on_low: Optional[Callable[[Any], None]] = None):
+        if low > high:
+            raise ValueError(f"low watermark {low} is above high watermark {high}")
+        self.high = high
+        self.low = low
+        self.on_high = on_high
+        self.on_low = on_low
+        self.above = False
+
+    def update(self, size: int) -> Optional[Callable[[Any], None]]:
+        """Return the callback to fire for a backlog of ``size``, if any"""
+        if self.above:
+            if size <= self.low:
+                self.above = False
+                return self.on_low
+        elif size >= self.high:
+            self.above = True
+            return self.on_high
+        return None
+
+class _Segment:
+    """One preallocated spill file, mapped while it is written or about to be read"""
+
+    __slots__ = ('path', 'capacity', 'start', 'end', 'count', 'map')
+
+    def __init__(self, path: str, capacity: int):
+        self.path = path
+        self.capacity = capacity
+        self.start = 0   # read offset
+        self.end = 0     # write offset
+        self.count = 0
+        self.map: Optional[mmap.mmap] = None
+        with open(path, 'wb') as f:
+            # Reserve the blocks up front: running out of disk while writing
+            # through a mapping would be a SIGBUS rather than an OSError
+            if hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(f.fileno(), 0, capacity)
+            else:
+                f.truncate(capacity)
+
+    def mapped(self) -> mmap.mmap:
+        if self.map is None:
+            with open(self.path, 'r+b') as f:
+                self.map = mmap.mmap(f.fileno(), self.capacity)
+        return self.map
+
+    def unmap(self) -> None:
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+class SpillReader:
+    """The pickled frames of the messages spilled when the reader was opened.
+
+    The segment files are opened up front, so the reader stays valid while
+    the spill keeps changing: drained segments are unlinked but still
+    readable, and the spill does not rewind its tail while a reader is open.
+    Open it under whatever lock guards the spill, then iterate and close it
+    without that lock.
+    """
+
+    def __init__(self, spill: 'SpillFile'):
+        self._spill: Optional[SpillFile] = spill
+        self._segments = [(open(segment.path, 'rb'), segment.capacity, segment.start, segment.count)
+                          for segment in spill._segments]
+        spill._readers += 1
+
+    def __iter__(self) -> Iterator[bytes]:
+        for f, capacity, start, count in self._segments:
+            if not count:
+                continue
+            with mmap.mmap(f.fileno(), capacity, access=mmap.ACCESS_READ) as data:
+                offset = start
+                for _ in range(count):
+                    (length,) = FRAME_LENGTH.unpack_from(data, offset)
+                    offset += FRAME_LENGTH.size
+                    yield data[offset:offset + length]
+                    offset += length
+
+    def close(self) -> None:
+        if self._spill is None:
+            return
+        self._spill._readers -= 1
+        self._spill = None
+        for f, *_ in self._segments:
+            f.close()
+
+    def __enter__(self) -> 'SpillReader':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+class SpillFile:
+    """FIFO of messages paged out to memory-mapped segment files.
+
+    This is the disk tier behind ``overflow='spill'``: the queue keeps
+    ``max_size`` messages in memory and the cold tail here.  Messages are
+    written as length-prefixed pickles into preallocated segment files of
+    ``segment_bytes`` through ``mmap``, and decoded from the mapping, so
+    neither side makes a system call per message.  Only the segment being
+    written and the head segment plus the next ``prefetch`` are mapped;
+    the rest are plain files, so resident memory stays flat however deep
+    the backlog.  Segments entering the read-ahead window are advised
+    ``MADV_WILLNEED``, so the kernel pages them in before consumers get
+    there.  Drained segments are deleted, and a drained tail segment is
+    rewound and reused.
+    """
+
+    def __init__(self, directory: Optional[str] = None, segment_bytes: Optional[int] = None,
+                 prefetch: Optional[int] = None):
+        self.directory = tempfile.mkdtemp(prefix='queue-spill-', dir=directory)
+        self.segment_bytes = config.SPILL_SEGMENT_BYTES if segment_bytes is None else segment_bytes
+        self.prefetch = config.SPILL_PREFETCH_SEGMENTS if prefetch is None else prefetch
+        self._segments: Deque[_Segment] = deque()
+        self._next_segment = 0
+        self._count = 0
+        self._readers = 0
+        self._cleanup = weakref.finalize(self, shutil.rmtree, self.directory, True)
+
+    def _new_segment(self, size: int) -> _Segment:
+        if self._segments and len(self._segments) > self.prefetch + 1:
+            # The finished tail is not in the read-ahead window yet
+            self._segments[-1].unmap()
+        path = os.path.join(self.directory, f"{self._next_segment:08d}.seg")
+        self._next_segment += 1
+        segment = _Segment(path, max(self.segment_bytes, size))
+        self._segments.append(segment)
+        return segment
+
+    def _read_ahead(self) -> None:
+        """Map the head segment and advise the kernel to load the next ``prefetch``"""
+        for index, segment in enumerate(islice(self._segments, self.prefetch + 1)):
+            if segment.map is None:
+                segment.mapped()
+                if index and _WILLNEED is not None:
+                    segment.map.madvise(_WILLNEED)
+
+    def append(self, message: Dict[str, Any]) -> None:
+        body = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+        size = FRAME_LENGTH.size + len(body)
+        segment = self._segments[-1] if self._segments else None
+        if segment is None or segment.end + size > segment.capacity:
+            segment = self._new_segment(size)
+        data = segment.mapped()
+        FRAME_LENGTH.pack_into(data, segment.end, len(body))
+        data[segment.end + FRAME_LENGTH.size:segment.end + size] = body
+        segment.end += size
+        segment.count += 1
+        self._count += 1
+
+    def pop_many(self, n: int) -> List[Dict[str, Any]]:
+        """Remove and return up to ``n`` messages from the head"""
+        messages: List[Dict[str, Any]] = []
+        while self._count and len(messages) < n:
+            segment = self._segments[0]
+            if segment.map is None:
+                self._read_ahead()
+            data = segment.map
+            offset = segment.start
+            for _ in range(min(n - len(messages), segment.count)):
+                (length,) = FRAME_LENGTH.unpack_from(data, offset)
+                offset += FRAME_LENGTH.size
+                messages.append(pickle.loads(data[offset:offset + length]))
+                offset += length
+                segment.count -= 1
+                self._count -= 1
+            segment.start = offset
+            if segment.count:
+                continue
+            if len(self._segments) == 1 and not self._readers:
+                segment.start = segment.end = 0
+            else:
+                self._segments.popleft()
+                segment.unmap()
+                os.unlink(segment.path)
+                self._read_ahead()
+        return messages
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Read the spilled messages without removing them"""
+        with self.reader() as frames:
+            for body in frames:
+                yield pickle.loads(body)
+
+    def reader(self) -> SpillReader:
+        """Return a reader over the raw frames of the messages spilled so far"""
+        return SpillReader(self)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __bool__(self) -> bool:
+        return self._count > 0
+
+    def segments(self) -> int:
+        """Return the number of segment files on disk"""
+        return len(self._segments)
+
+    def close(self) -> None:
+        for segment in self._segments:
+            segment.unmap()
+        self._segments.clear()
+        self._count = 0
+        self._cleanup()
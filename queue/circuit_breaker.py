@@ -0,0 +1,168 @@
+import threading
+import time
+from enum import Enum
+from typing import Dict, Callable, Optional
+from . import config
+
+class CircuitState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker over a sliding window of outcomes.
+
+    Outcomes are counted in a ring of ``window_seconds / bucket_seconds``
+    time buckets with running totals, so recording a call and reading the
+    failure rate are O(1); expired buckets are cleared lazily as the ring
+    advances.  The breaker opens once at least ``minimum_calls`` outcomes
+    are in the window and the failure rate reaches ``failure_threshold``.
+    After ``open_seconds`` it lets ``half_open_max_calls`` trial calls
+    through: if they all succeed it closes, any failure re-opens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: float = 0.5, minimum_calls: int = 20,
+                 window_seconds: float = 60, bucket_seconds: float = 1,
+                 open_seconds: float = 30, half_open_max_calls: int = 5,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.minimum_calls = minimum_calls
+        self.bucket_seconds = bucket_seconds
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        self._buckets = max(1, int(window_seconds / bucket_seconds))
+        self._successes = [0] * self._buckets
+        self._failures = [0] * self._buckets
+        self._current = int(clock() // bucket_seconds)
+        self._total_successes = 0
+        self._total_failures = 0
+
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._trial_calls = 0
+        self._trial_successes = 0
+
+    def _advance(self, now: float) -> None:
+        bucket = int(now // self.bucket_seconds)
+        if bucket <= self._current:
+            return
+        # Clear every bucket the window slid past, at most one full lap
+        for index in range(self._current + 1, min(bucket, self._current + self._buckets) + 1):
+            slot = index % self._buckets
+            self._total_successes -= self._successes[slot]
+            self._total_failures -= self._failures[slot]
+            self._successes[slot] = 0
+            self._failures[slot] = 0
+        self._current = bucket
+
+    def _reset_window(self) -> None:
+        self._successes = [0] * self._buckets
+        self._failures = [0] * self._buckets
+        self._total_successes = 0
+        self._total_failures = 0
+
+    def _update_state(self, now: float) -> None:
+        if self._state is CircuitState.OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = CircuitState.HALF_OPEN
+            self._trial_calls = 0
+            self._trial_successes = 0
+
+    def _open(self, now: float) -> None:
+        self._state = CircuitState.OPEN
+        self._opened_at = now
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            self._update_state(self._clock())
+            return self._state
+
+    def allow_request(self) -> bool:
+        """Return whether a call may proceed; counts half-open trial calls"""
+        with self._lock:
+            self._update_state(self._clock())
+            if self._state is CircuitState.CLOSED:
+                return True
+            if self._state is CircuitState.HALF_OPEN and self._trial_calls < self.half_open_max_calls:
+                self._trial_calls += 1
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        """Seconds until an open breaker will allow trial calls"""
+        with self._lock:
+            now = self._clock()
+            self._update_state(now)
+            if self._state is not CircuitState.OPEN:
+                return 0.0
+            return max(self._opened_at + self.open_seconds - now, 0.0)
+
+    def record_success(self, admitted: bool = True) -> None:
+        """Count a successful call
+
+        ``admitted=False`` is for a call this breaker didn't let through:
+        it only adds to the failure-rate window while the breaker is closed,
+        and never counts as a half-open trial.
+        """
+        with self._lock:
+            now = self._clock()
+            self._advance(now)
+            self._update_state(now)
+            if not admitted and self._state is not CircuitState.CLOSED:
+                return
+            self._successes[self._current % self._buckets] += 1
+            self._total_successes += 1
+            if self._state is CircuitState.HALF_OPEN:
+                self._trial_successes += 1
+                if self._trial_successes >= self.half_open_max_calls:
+                    self._state = CircuitState.CLOSED
+                    self._reset_window()
+
+    def record_failure(self) -> None:
+        with self._lock:
+            now = self._clock()
+            self._advance(now)
+            self._update_state(now)
+            self._failures[self._current % self._buckets] += 1
+            self._total_failures += 1
+            if self._state is CircuitState.HALF_OPEN:
+                self._open(now)
+            elif self._state is CircuitState.CLOSED:
+                total = self._total_successes + self._total_failures
+                if total >= self.minimum_calls and \
+                        self._total_failures / total >= self.failure_threshold:
+                    self._open(now)
+
+    def failure_rate(self) -> float:
+        with self._lock:
+            self._advance(self._clock())
+            total = self._total_successes + self._total_failures
+            return self._total_failures / total if total else 0.0
+
+class CircuitBreakerRegistry:
+    """Lazily created circuit breakers, one per dependency name"""
+
+    def __init__(self, settings: Optional[Dict[str, Dict]] = None):
+        self.settings = config.CIRCUIT_BREAKER if settings is None else settings
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, dependency: str) -> CircuitBreaker:
+        breaker = self._breakers.get(dependency)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(dependency)
+                if breaker is None:
+                    options = dict(self.settings.get('default', {}))
+                    options.update(self.settings.get(dependency, {}))
+                    breaker = CircuitBreaker(dependency, **options)
+                    self._breakers[dependency] = breaker
+        return breaker
+
+    def states(self) -> Dict[str, str]:
+        """Return the current state of every breaker"""
+        return {name: breaker.state.value for name, breaker in list(self._breakers.items())}
@@ -0,0 +1,129 @@
+import json
+import marshal
+import pickle
+from typing import Dict, Any, Optional, Union
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+# marshal format version; 4 has been current since Python 3.4
+MARSHAL_VERSION = 4
+
+class Codec:
+    """Encodes message data to bytes and back.
+
+    Subclasses set ``name`` and a one-byte ``codec_id`` that prefixes every
+    payload they encode, so a payload can be decoded without knowing which
+    codec the producer used.  ``decode`` must accept ``bytes`` or a
+    ``memoryview`` slice.
+    """
+
+    name = ''
+    codec_id = 0
+
+    def encode(self, value: Any) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, buffer: Buffer) -> Any:
+        raise NotImplementedError
+
+    def unpickles(self, buffer: Buffer) -> bool:
+        """Whether decoding ``buffer`` would run ``pickle`` on it"""
+        return False
+
+class BinaryCodec(Codec):
+    """Compact binary encoding: ``marshal`` with a ``pickle`` fallback.
+
+    ``marshal`` covers the JSON types plus bytes, tuples and sets, runs in
+    C and stores numbers and bytes unexpanded.  Values it refuses
+    (datetimes, custom classes) are pickled behind a one-byte tag.  Like
+    ``pickle``, only decode payloads from trusted producers.
+    """
+
+    name = 'binary'
+    codec_id = 1
+    _MARSHAL = b'M'
+    _PICKLE = b'P'
+
+    def encode(self, value: Any) -> bytes:
+        try:
+            return self._MARSHAL + marshal.dumps(value, MARSHAL_VERSION)
+        except ValueError:
+            return self._PICKLE + pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def decode(self, buffer: Buffer) -> Any:
+        if buffer[0] == self._MARSHAL[0]:
+            return marshal.loads(buffer[1:])
+        return pickle.loads(buffer[1:])
+
+    def unpickles(self, buffer: Buffer) -> bool:
+        return not buffer or buffer[0] != self._MARSHAL[0]
+
+class JsonCodec(Codec):
+    """Compact JSON, for payloads read by other languages"""
+
+    name = 'json'
+    codec_id = 2
+
+    def encode(self, value: Any) -> bytes:
+        return json.dumps(value, separators=(',', ':')).encode()
+
+    def decode(self, buffer: Buffer) -> Any:
+        return json.loads(bytes(buffer))
+
+class PickleCodec(Codec):
+    name = 'pickle'
+    codec_id = 3
+
+    def encode(self, value: Any) -> bytes:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def decode(self, buffer: Buffer) -> Any:
+        return pickle.loads(buffer)
+
+    def unpickles(self, buffer: Buffer) -> bool:
+        return True
+
+CODECS: Dict[str, Codec] = {}
+_BY_ID: Dict[int, Codec] = {}
+
+def register_codec(codec: Codec) -> Codec:
+    """Make a codec available by name and for decoding its payloads"""
+    existing = _BY_ID.get(codec.codec_id)
+    if existing is not None and existing.name != codec.name:
+        raise ValueError(f"Codec id {codec.codec_id} is taken by {existing.name!r}")
+    CODECS[codec.name] = codec
+    _BY_ID[codec.codec_id] = codec
+    return codec
+
+for _codec in (BinaryCodec(), JsonCodec(), PickleCodec()):
+    register_codec(_codec)
+
+def get_codec(codec: Union[Codec, str, None]) -> Optional[Codec]:
+    """Resolve a codec or codec name; ``None`` and ``'none'`` mean no encoding"""
+    if codec is None or isinstance(codec, Codec):
+        return codec
+    if codec == 'none':
+        return None
+    try:
+        return CODECS[codec]
+    except KeyError:
+        raise ValueError(f"Unknown codec {codec!r}") from None
+
+def encode_payload(value: Any, codec: Codec) -> bytes:
+    """Encode ``value`` as a payload: the codec id, then the codec's bytes"""
+    return bytes((codec.codec_id,)) + codec.encode(value)
+
+def decode_payload(payload: Buffer) -> Any:
+    """Decode a payload with the codec named by its first byte"""
+    codec = _BY_ID.get(payload[0])
+    if codec is None:
+        raise ValueError(f"Unknown codec id {payload[0]}")
+    # A memoryview slice, so the body isn't copied before decoding
+    return codec.decode(memoryview(payload)[1:])
+
+def unpickles(payload: Buffer) -> bool:
+    """Whether decoding ``payload`` would unpickle it; unknown codecs count as unsafe"""
+    if not payload:
+        return True
+    codec = _BY_ID.get(payload[0])
+    return codec is None or codec.unpickles(memoryview(payload)[1:])
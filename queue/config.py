@@ -3,6 +3,44 @@ import logging
 # Queue Configuration
 MAX_QUEUE_SIZE = 10000
 PROCESSING_TIMEOUT = 30  # seconds
+MESSAGE_TTL = None       # seconds a message may wait; None never expires
+EXPIRED_POLICY = 'drop'  # 'drop' or 'dead_letter' expired messages
+MESSAGE_CODEC = 'none'    # 'binary', 'json' or 'pickle' to encode data; 'none' keeps objects
+MESSAGE_NODE_ID = None    # 0-1023, unique per producing process; None picks one at random
+
+# Dead Letter Configuration
+DEAD_LETTER_MAX_SIZE = 100000          # oldest messages are evicted beyond this
+DEAD_LETTER_MAX_AGE = 7 * 24 * 3600    # seconds; 0 keeps messages forever
+DEAD_LETTER_BUCKET_SECONDS = 3600      # granularity of the time index
+DEAD_LETTER_ARCHIVE = None             # JSON lines file for evicted messages
+
+# Priority Configuration
+# Levels from highest to lowest; weights are each level's share of
+# dequeues while several levels have messages waiting
+PRIORITY_WEIGHTS = {
+    'critical': 8,
+    'high': 4,
+    'normal': 2,
+    'low': 1
+}
+DEFAULT_PRIORITY = 'normal'
+
+# Backpressure Configuration
+OVERFLOW_POLICY = 'block'  # 'block', 'reject', 'drop_oldest' or 'spill'
+OVERFLOW_TIMEOUT = 30      # seconds a blocked producer waits before QueueFullError
+HIGH_WATERMARK = 0.8       # fraction of MAX_QUEUE_SIZE that fires on_high
+LOW_WATERMARK = 0.5        # fraction of MAX_QUEUE_SIZE that fires on_low
+SPILL_DIRECTORY = None     # None uses the system temp directory
+SPILL_SEGMENT_BYTES = 16 * 1024 * 1024  # size of each spill segment file
+SPILL_PREFETCH_SEGMENTS = 1             # segments read ahead of consumers
+
+# Broker Configuration
+# The socket broker only listens on loopback addresses or Unix sockets
+BROKER_HOST = '127.0.0.1'
+BROKER_PORT = 7650
+BROKER_MAX_FRAME_BYTES = 64 * 1024 * 1024  # larger frames close the connection
+BROKER_POOL_SIZE = 4                       # client connections per BrokerClient
+BROKER_TOKEN = None                        # TCP clients must send it; None: random per broker
 
 # Retry Configuration
 MAX_RETRIES = {
@@ -18,19 +56,73 @@ MAX_RETRIES = {
 BASE_RETRY_DELAY = 5   # seconds
 MAX_RETRY_DELAY = 300  # seconds
 
+# Retry Policy Configuration
+# Per failure type: strategy, backoff ('exponential' doubles the delay per
+# failure up to max_delay, 'fixed' always waits base_delay) and jitter
+# ('none', 'full', 'equal' or 'decorrelated'). Delays default to
+# BASE_RETRY_DELAY/MAX_RETRY_DELAY and retry limits to MAX_RETRIES.
+RETRY_POLICIES = {
+    'TIMEOUT': {'strategy': 'retry_with_timeout', 'jitter': 'full'},
+    'NETWORK': {'strategy': 'retry_with_backoff', 'base_delay': 10, 'max_delay': 600,
+                'jitter': 'equal'},
+    'DATABASE': {'strategy': 'retry_with_circuit_breaker', 'backoff': 'fixed',
+                 'base_delay': 300, 'jitter': 'full'},
+    'RESOURCE': {'strategy': 'retry_when_available', 'backoff': 'fixed',
+                 'base_delay': 60, 'jitter': 'full'},
+    'VALIDATION': {'strategy': 'dead_letter'},
+    'BUSINESS': {'strategy': 'dead_letter'}
+}
+
+# Circuit Breaker Configuration
+# 'default' applies to every dependency; per-dependency entries override it
+CIRCUIT_BREAKER = {
+    'default': {
+        'failure_threshold': 0.5,   # failure rate that opens the breaker
+        'minimum_calls': 20,        # outcomes needed before it can open
+        'window_seconds': 60,       # sliding window length
+        'bucket_seconds': 1,        # window granularity
+        'open_seconds': 30,         # time open before trial calls
+        'half_open_max_calls': 5    # successful trials needed to close
+    }
+}
+
+# Metrics Configuration
+# Histogram bucket upper bounds in seconds
+METRICS_LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300
+)
+
 # Logging Configuration
+# Keep 1 in N records of high-volume events
+LOG_SAMPLE_EVERY = {
+    'enqueued': 100,
+    'acked': 100
+}
+# Cap records per second of events that spike during outages
+LOG_MAX_PER_SECOND = {
+    'retry_scheduled': 100,
+    'requeued': 100,
+    'dead_lettered': 100,
+    'lease_expired': 100,
+    'circuit_parked': 10
+}
+
 LOGGING_CONFIG = {
     'version': 1,
     'formatters': {
         'standard': {
             'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
         },
+        'json': {
+            '()': 'queue.log.JsonFormatter'
+        },
     },
     'handlers': {
         'file': {
             'class': 'logging.FileHandler',
             'filename': 'queue.log',
-            'formatter': 'standard',
+            'formatter': 'json',
             'level': logging.INFO,
         },
         'console': {
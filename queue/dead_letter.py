@@ -0,0 +1,267 @@
+import json
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Dict, Any, Callable, Iterator, List, Optional, Hashable, Tuple, Union
+from . import config
+from .failures import FailureType
+
+class DeadLetterArchive:
+    """Appends evicted dead letters to a JSON lines file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, messages: List[Dict[str, Any]]) -> None:
+        lines = [json.dumps(dict(message), default=str) + '\n' for message in messages]
+        with self._lock, open(self.path, 'a') as f:
+            f.writelines(lines)
+
+class _SequenceIndex:
+    """Sequence numbers of the live messages under one index key, ascending.
+
+    Removing a message only lowers ``live``; its number stays behind as a
+    tombstone until tombstones outnumber live entries and the list is
+    compacted.  ``after`` finds a cursor with ``bisect``, so a page costs
+    O(limit) rather than a walk from the start.
+    """
+
+    COMPACT_MIN = 64
+
+    __slots__ = ('sequences', 'live')
+
+    def __init__(self):
+        self.sequences: List[int] = []
+        self.live = 0
+
+    def add(self, sequence: int) -> None:
+        self.sequences.append(sequence)
+        self.live += 1
+
+    def remove(self, alive: Dict[int, Hashable]) -> None:
+        """Count one removal; ``alive`` maps the live sequence numbers to ids"""
+        self.live -= 1
+        if len(self.sequences) > self.COMPACT_MIN and len(self.sequences) > 2 * self.live:
+            self.sequences = [sequence for sequence in self.sequences if sequence in alive]
+
+    def after(self, cursor: Optional[int], alive: Dict[int, Hashable]) -> Iterator[Hashable]:
+        """Yield the ids of live messages with a sequence above ``cursor``"""
+        sequences = self.sequences
+        start = 0 if cursor is None else bisect_right(sequences, cursor)
+        for position in range(start, len(sequences)):
+            message_id = alive.get(sequences[position])
+            if message_id is not None:
+                yield message_id
+
+    def __len__(self) -> int:
+        return self.live
+
+_EMPTY = _SequenceIndex()
+
+class DeadLetterStore:
+    """Dead-lettered messages with secondary indexes.
+
+    Messages are kept in dead-letter order and indexed by failure type,
+    error string and ``bucket_seconds`` time bucket, so ``query`` only
+    walks the smallest matching index instead of the whole store.  Results
+    are paginated with an opaque cursor, and each page resumes where the
+    last one stopped.
+
+    Once the store holds ``max_size`` messages, or its oldest message is
+    older than ``max_age`` seconds, the oldest messages are evicted and
+    passed to ``archive`` (e.g. a ``DeadLetterArchive``) if one is set.
+    The list-style helpers keep ``QueueSystem.dead_letter_queue`` callers
+    working unchanged.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, max_age: Optional[float] = None,
+                 bucket_seconds: Optional[float] = None,
+                 archive: Optional[Callable[[List[Dict[str, Any]]], None]] = None):
+        self.max_size = config.DEAD_LETTER_MAX_SIZE if max_size is None else max_size
+        self.max_age = config.DEAD_LETTER_MAX_AGE if max_age is None else max_age
+        self.bucket_seconds = bucket_seconds or config.DEAD_LETTER_BUCKET_SECONDS
+        if archive is None and config.DEAD_LETTER_ARCHIVE:
+            archive = DeadLetterArchive(config.DEAD_LETTER_ARCHIVE)
+        self.archive = archive
+        self.evicted = 0
+        # id -> [sequence, dead-letter time, message]
+        self._entries: "OrderedDict[Hashable, list]" = OrderedDict()
+        # sequence -> id, for the messages still stored
+        self._alive: Dict[int, Hashable] = {}
+        self._all = _SequenceIndex()
+        self._by_type: Dict[Optional[str], _SequenceIndex] = {}
+        self._by_error: Dict[Optional[str], _SequenceIndex] = {}
+        self._by_bucket: Dict[int, _SequenceIndex] = {}
+        self._sequence = 0
+
+    @staticmethod
+    def _failure_type(message: Dict[str, Any]) -> Optional[str]:
+        last_failure = message.get('last_failure')
+        return last_failure['type'] if last_failure else None
+
+    def _keys(self, message: Dict[str, Any], dead_at: float):
+        return ((self._by_type, self._failure_type(message)),
+                (self._by_error, message.get('error')),
+                (self._by_bucket, int(dead_at // self.bucket_seconds)))
+
+    # Adding and removing
+
+    def append(self, message: Dict[str, Any], dead_at: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Add a message; returns the messages evicted to make room"""
+        dead_at = time.time() if dead_at is None else dead_at
+        message_id = message['id']
+        self.discard(message_id)
+        self._sequence += 1
+        self._entries[message_id] = [self._sequence, dead_at, message]
+        self._alive[self._sequence] = message_id
+        self._all.add(self._sequence)
+        for index, key in self._keys(message, dead_at):
+            members = index.get(key)
+            if members is None:
+                members = index[key] = _SequenceIndex()
+            members.add(self._sequence)
+        return self._evict(dead_at)
+
+    def extend(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        evicted = []
+        for message in messages:
+            evicted.extend(self.append(message))
+        return evicted
+
+    def discard(self, message_id: Hashable) -> Optional[Dict[str, Any]]:
+        """Remove a message by id, returning it if it was dead-lettered"""
+        entry = self._entries.pop(message_id, None)
+        if entry is None:
+            return None
+        sequence, dead_at, message = entry
+        del self._alive[sequence]
+        self._all.remove(self._alive)
+        for index, key in self._keys(message, dead_at):
+            members = index[key]
+            members.remove(self._alive)
+            if not members:
+                del index[key]
+        return message
+
+    def remove(self, message: Dict[str, Any]) -> None:
+        if self.discard(message['id']) is None:
+            raise ValueError(f"Message {message['id']} is not dead-lettered")
+
+    def _evict(self, now: float) -> List[Dict[str, Any]]:
+        """Drop the oldest messages while over size or age; O(1) when neither"""
+        evicted = []
+        while self._entries:
+            message_id, (_, dead_at, message) = next(iter(self._entries.items()))
+            over_size = self.max_size and len(self._entries) > self.max_size
+            too_old = self.max_age and now - dead_at > self.max_age
+            if not (over_size or too_old):
+                break
+            evicted.append(self.discard(message_id))
+        if evicted:
+            self.evicted += len(evicted)
+            if self.archive is not None:
+                self.archive(evicted)
+        return evicted
+
+    def evict_expired(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Evict messages older than ``max_age``"""
+        return self._evict(time.time() if now is None else now)
+
+    # Queries
+
+    def query(self, failure_type: Union[FailureType, str, None] = None,
+              error: Optional[str] = None, since: Optional[float] = None,
+              until: Optional[float] = None, limit: int = 100,
+              cursor: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Return up to ``limit`` matching messages and the cursor for the next page
+
+        ``since``/``until`` are epoch seconds of the dead-letter time.
+        The returned cursor is None once there are no more matches.
+        """
+        if isinstance(failure_type, FailureType):
+            failure_type = failure_type.value
+        candidates = []
+        if failure_type is not None:
+            candidates.append(self._by_type.get(failure_type, _EMPTY))
+        if error is not None:
+            candidates.append(self._by_error.get(error, _EMPTY))
+        if candidates:
+            ids = min(candidates, key=len).after(cursor, self._alive)
+        elif since is not None or until is not None:
+            ids = self._ids_in_range(since, until, cursor)
+        else:
+            ids = self._all.after(cursor, self._alive)
+
+        results = []
+        for message_id in ids:
+            _, dead_at, message = self._entries[message_id]
+            if (failure_type is not None and self._failure_type(message) != failure_type) \
+                    or (error is not None and message.get('error') != error) \
+                    or (since is not None and dead_at < since) \
+                    or (until is not None and dead_at > until):
+                continue
+            if len(results) == limit:
+                return results, self._entries[results[-1]['id']][0] if results else cursor
+            results.append(message)
+        return results, None
+
+    def _ids_in_range(self, since: Optional[float], until: Optional[float],
+                      cursor: Optional[int]) -> Iterator[Hashable]:
+        low = None if since is None else int(since // self.bucket_seconds)
+        high = None if until is None else int(until // self.bucket_seconds)
+        buckets = sorted(bucket for bucket in self._by_bucket
+                         if (low is None or bucket >= low) and (high is None or bucket <= high))
+        for bucket in buckets:
+            yield from self._by_bucket[bucket].after(cursor, self._alive)
+
+    def counts(self) -> Dict[str, Dict[Any, int]]:
+        """Return message counts per failure type and per error"""
+        return {
+            'failure_type': {key: len(ids) for key, ids in self._by_type.items()},
+            'error': {key: len(ids) for key, ids in self._by_error.items()},
+        }
+
+    # List compatibility
+
+    def get(self, message_id: Hashable) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(message_id)
+        return None if entry is None else entry[2]
+
+    def __contains__(self, message: Any) -> bool:
+        if isinstance(message, Mapping):
+            message = message.get('id')
+        return message in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __bool__(self) -> bool:
+        return bool(self._entries)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter([entry[2] for entry in self._entries.values()])
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, list):
+            return list(self) == other
+        return self is other
+
+    __hash__ = None
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        """Positional access in dead-letter order; O(1) for the ends"""
+        size = len(self._entries)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("dead letter index out of range")
+        if index == 0:
+            return next(iter(self._entries.values()))[2]
+        if index == size - 1:
+            return next(reversed(self._entries.values()))[2]
+        for position, entry in enumerate(self._entries.values()):
+            if position == index:
+                return entry[2]
@@ -12,6 +12,12 @@ class FailureType(Enum):
     RESOURCE = "resource"
     BUSINESS = "business"
 
+class MessageFailure(Exception):
+    """Raised by message handlers to report a failure of a specific type"""
+    def __init__(self, message: str, failure_type: FailureType):
+        super().__init__(message)
+        self.failure_type = failure_type
+
 class FailureHandler:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
@@ -1,23 +1,41 @@
 from enum import Enum
 from datetime import datetime, timedelta, UTC
 import logging
-from typing import Dict, Any
+import random
+import time
+from typing import Dict, Any, List, Optional, Sequence, Union
+from . import config
 from .failures import FailureType
+from .circuit_breaker import CircuitBreakerRegistry, CircuitState
+from .message import Message, FAILURE_TYPES, FAILURE_CODES, RETRY, to_isoformat
+from .log import EventLogger
+from .retry_policy import RetryPolicy, compile_policies
+
+# Failures that point at an unhealthy downstream dependency
+DEPENDENCY_FAILURES = frozenset({
+    FailureType.TIMEOUT, FailureType.NETWORK, FailureType.DATABASE, FailureType.RESOURCE
+})
 
 class FailureHandler:
-    def __init__(self):
+    def __init__(self, circuit_breakers: Optional[CircuitBreakerRegistry] = None,
+                 dependency_key: str = 'dependency',
+                 policies: Optional[Dict[FailureType, RetryPolicy]] = None,
+                 rng: Optional[random.Random] = None):
         self.logger = logging.getLogger(__name__)
+        self.events = EventLogger(self.logger)
+        # Breakers are keyed by message['data'][dependency_key], falling
+        # back to the failure type for messages that don't name one
+        self.circuit_breakers = circuit_breakers or CircuitBreakerRegistry()
+        self.dependency_key = dependency_key
         # Configure failure thresholds
-        self.timeout_threshold = 30  # seconds
-        self.max_retries = {
-            FailureType.TIMEOUT: 3,
-            FailureType.NETWORK: 5,
-            FailureType.DATABASE: 3,
-            FailureType.VALIDATION: 1,
-            FailureType.RESOURCE: 2,
-            FailureType.BUSINESS: 0
-        }
-        
+        self.timeout_threshold = config.PROCESSING_TIMEOUT  # seconds
+        # Retry strategy and delay table per failure type, from
+        # config.RETRY_POLICIES unless given
+        self.policies = compile_policies() if policies is None else policies
+        self.max_retries = {failure_type: policy.max_retries
+                            for failure_type, policy in self.policies.items()}
+        self.random = (rng or random.Random()).random
+
     def handle_message_failure(self, message: Dict[str, Any], failure_type: FailureType) -> Dict[str, Any]:
         """Handle different types of message failures"""
         failure_count = message.get('failure_count', {})
@@ -32,71 +50,183 @@ class FailureHandler:
             'failure_count': failure_count
         })
 
+        message.pop('admitted_by', None)
+        dependency = self.dependency_of(message, failure_type)
+        if dependency is not None:
+            self.circuit_breakers.get(dependency).record_failure()
+
         strategy = self._get_failure_strategy(message, failure_type)
-        return self._apply_failure_strategy(message, strategy)
+        return self._apply_failure_strategy(message, strategy, self.policies[failure_type])
 
     def _get_failure_strategy(self, message: Dict[str, Any], failure_type: FailureType) -> str:
         """Determine how to handle the failure based on type and history"""
-        failure_count = message['failure_count'][failure_type.value]
-        max_retries = self.max_retries[failure_type]
+        return self.policies[failure_type].strategy_for(message['failure_count'][failure_type.value])
 
-        if failure_count > max_retries:
-            return 'dead_letter'
-        
-        if failure_type in [FailureType.VALIDATION, FailureType.BUSINESS]:
-            return 'dead_letter'
-            
-        if failure_type == FailureType.TIMEOUT:
-            return 'retry_with_timeout'
-            
-        if failure_type == FailureType.NETWORK:
-            return 'retry_with_backoff'
-            
-        if failure_type == FailureType.DATABASE:
-            return 'retry_with_circuit_breaker'
-            
-        if failure_type == FailureType.RESOURCE:
-            return 'retry_when_available'
-            
-        return 'retry'
-
-    def _apply_failure_strategy(self, message: Dict[str, Any], strategy: str) -> Dict[str, Any]:
+    def _apply_failure_strategy(self, message: Dict[str, Any], strategy: str,
+                                policy: RetryPolicy) -> Dict[str, Any]:
         """Apply the chosen failure handling strategy"""
         if strategy == 'dead_letter':
             message['status'] = 'dead_letter'
             message.pop('next_process_time', None)  # Remove next_process_time for dead letter
-            self.logger.error(f"Message {message['id']} moved to dead letter queue")
-            
-        elif strategy == 'retry_with_timeout':
-            delay = min(5 * (2 ** (message['failure_count']['timeout'] - 1)), 300)
-            message['next_process_time'] = datetime.now(UTC) + timedelta(seconds=delay)
-            message['status'] = 'retry'
-            self.logger.info(f"Message {message['id']} scheduled for retry with {delay}s timeout")
-            
-        elif strategy == 'retry_with_backoff':
-            delay = min(10 * (2 ** (message['failure_count']['network'] - 1)), 600)
-            message['next_process_time'] = datetime.now(UTC) + timedelta(seconds=delay)
-            message['status'] = 'retry'
-            self.logger.info(f"Message {message['id']} scheduled for retry with {delay}s backoff")
-            
-        elif strategy == 'retry_with_circuit_breaker':
-            if self._check_circuit_breaker():
-                message['next_process_time'] = datetime.now(UTC) + timedelta(minutes=5)
-                message['status'] = 'retry'
-                self.logger.info(f"Message {message['id']} scheduled for retry after circuit breaker")
+            self.events.error('dead_lettered', "Message %(message_id)s moved to dead letter queue",
+                              message_id=message['id'])
+            return message
+
+        failure_count = message['last_failure']['attempt']
+        previous = message.get('retry_delay') if policy.jitter == 'decorrelated' else None
+        delay = policy.delay(failure_count, previous, self.random)
+        if policy.jitter == 'decorrelated':
+            message['retry_delay'] = delay
+        if policy.resource_check:
+            message['requires_resource_check'] = True
+        message['status'] = 'retry'
+        if policy.circuit_breaker:
+            dependency = self.dependency_of(message) or FailureType.DATABASE.value
+            if not self._check_circuit_breaker(dependency):
+                # Park the message until the breaker lets trial calls through
+                delay = self.circuit_breakers.get(dependency).retry_after()
+                message['next_process_time'] = datetime.now(UTC) + timedelta(seconds=delay)
+                self.events.warning(
+                    'circuit_parked',
+                    "Message %(message_id)s parked for %(delay).0fs: circuit breaker for "
+                    "%(dependency)s is open",
+                    message_id=message['id'], delay=delay, dependency=dependency
+                )
+                return message
+        message['next_process_time'] = datetime.now(UTC) + timedelta(seconds=delay)
+        self.events.info('retry_scheduled', policy.log_message,
+                         message_id=message['id'], delay=delay)
+        return message
+
+    def handle_failures_batch(self, messages: List[Dict[str, Any]],
+                              failure_types: Union[FailureType, Sequence[FailureType]]) -> List[Dict[str, Any]]:
+        """Handle many failures at once, with the same results as ``handle_message_failure``
+
+        ``failure_types`` is one type for every message or one per message.
+        The clock is read once for the whole batch and each type's policy
+        is looked up once per call.  Jitter draws come from the handler's
+        random source in message order, so a seeded handler gives the same
+        delays as calling ``handle_message_failure`` per message.  Retries
+        and dead letters are logged as one record each.
+        """
+        if isinstance(failure_types, FailureType):
+            failure_types = [failure_types] * len(messages)
+        now = time.time()
+        timestamp = None
+        # failure type -> (code, policy)
+        tables = {failure_type: (FAILURE_CODES[failure_type.value], policy)
+                  for failure_type, policy in self.policies.items()}
+        rand = self.random
+        breakers = {}
+        dead_lettered = retried = parked = 0
+
+        for message, failure_type in zip(messages, failure_types):
+            code, policy = tables[failure_type]
+            if isinstance(message, Message):
+                counts = message.failure_counts or [0] * len(FAILURE_TYPES)
+                counts[code] += 1
+                failure_count = counts[code]
+                message.failure_counts = counts
+                message.last_failure_code = code
+                message.last_failure_at = now
+                message.last_failure_attempt = failure_count
             else:
+                if timestamp is None:
+                    timestamp = to_isoformat(now)
+                counts = message.get('failure_count', {})
+                failure_count = counts[failure_type.value] = counts.get(failure_type.value, 0) + 1
+                message['last_failure'] = {'type': failure_type.value, 'timestamp': timestamp,
+                                           'attempt': failure_count}
+                message['failure_count'] = counts
+
+            message.pop('admitted_by', None)
+            dependency = self.dependency_of(message, failure_type)
+            if dependency is not None:
+                breaker = breakers.get(dependency)
+                if breaker is None:
+                    breaker = breakers[dependency] = self.circuit_breakers.get(dependency)
+                breaker.record_failure()
+
+            if failure_count > len(policy.delays):
                 message['status'] = 'dead_letter'
                 message.pop('next_process_time', None)
-                self.logger.error(f"Message {message['id']} failed due to open circuit breaker")
-                
-        elif strategy == 'retry_when_available':
-            message['next_process_time'] = datetime.now(UTC) + timedelta(minutes=1)
-            message['status'] = 'retry'
-            message['requires_resource_check'] = True
-            self.logger.info(f"Message {message['id']} waiting for resource availability")
-            
-        return message
+                dead_lettered += 1
+                continue
+            if policy.jitter == 'decorrelated':
+                delay = message['retry_delay'] = policy.delay(
+                    failure_count, message.get('retry_delay'), rand)
+            else:
+                delay = policy.delay(failure_count, None, rand)
+            if policy.circuit_breaker:
+                dependency = dependency or FailureType.DATABASE.value
+                breaker = breakers.get(dependency) or self.circuit_breakers.get(dependency)
+                if breaker.state is CircuitState.OPEN:
+                    delay = breaker.retry_after()
+                    parked += 1
+            if policy.resource_check:
+                message['requires_resource_check'] = True
+            if isinstance(message, Message):
+                message.next_process_at = now + delay
+                message.status_code = RETRY
+            else:
+                message['next_process_time'] = datetime.fromtimestamp(now + delay, UTC)
+                message['status'] = 'retry'
+            retried += 1
 
-    def _check_circuit_breaker(self) -> bool:
+        if retried:
+            self.events.info('retry_scheduled', "%(count)s messages scheduled for retry "
+                             "(%(parked)s parked behind open circuit breakers)",
+                             count=retried, parked=parked)
+        if dead_lettered:
+            self.events.error('dead_lettered', "%(count)s messages moved to dead letter queue",
+                              count=dead_lettered)
+        return messages
+
+    def _check_circuit_breaker(self, dependency: str = FailureType.DATABASE.value) -> bool:
         """Check if circuit breaker allows retries"""
-        return True  # Simplified version always allows retries
\ No newline at end of file
+        return self.circuit_breakers.get(dependency).state is not CircuitState.OPEN
+
+    def _named_dependency(self, message: Dict[str, Any]) -> Optional[str]:
+        if isinstance(message, Message) and message.payload is not None:
+            # Read when the data was encoded, so dispatch doesn't decode it
+            return message.dependency
+        data = message.get('data')
+        return data.get(self.dependency_key) if isinstance(data, dict) else None
+
+    def dependency_of(self, message: Dict[str, Any],
+                      failure_type: Optional[FailureType] = None) -> Optional[str]:
+        """Name the dependency a message's outcome is attributed to, if any"""
+        dependency = self._named_dependency(message)
+        if dependency is not None:
+            return dependency
+        if failure_type is None:
+            if isinstance(message, Message):
+                code = message.last_failure_code
+                failure_type = None if code is None else FAILURE_TYPES[code]
+            else:
+                last_failure = message.get('last_failure')
+                failure_type = FailureType(last_failure['type']) if last_failure else None
+        if failure_type in DEPENDENCY_FAILURES:
+            return failure_type.value
+        return None
+
+    def record_success(self, message: Dict[str, Any]) -> None:
+        """Count a successful call on the breakers it tells something about
+
+        The breaker that admitted the message at dispatch counts it in full,
+        half-open trials included.  Otherwise no breaker gated the call: a
+        message naming no dependency would have failed under its failure
+        type's breaker, so the success goes into the failure-rate window of
+        each closed type breaker (or of its named dependency's breaker), but
+        never closes a breaker that is testing its dependency.
+        """
+        admitted_by = message.pop('admitted_by', None)
+        if admitted_by is not None:
+            self.circuit_breakers.get(admitted_by).record_success()
+            return
+        dependency = self._named_dependency(message)
+        if dependency is not None:
+            self.circuit_breakers.get(dependency).record_success(admitted=False)
+            return
+        for failure_type in DEPENDENCY_FAILURES:
+            self.circuit_breakers.get(failure_type.value).record_success(admitted=False)
\ No newline at end of file
@@ -0,0 +1,172 @@
+import json
+import logging
+import logging.config
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional
+from . import config
+
+class EventLogger:
+    """Structured, sampled logging for per-message events.
+
+    ``info('enqueued', "Message %(message_id)s enqueued", message_id=...)``
+    logs one event: the keyword fields are both the lazy ``%`` arguments
+    of the text and the fields of the JSON line, and nothing is formatted
+    unless a handler writes the record.  Disabled levels return after a
+    single ``isEnabledFor`` check.
+
+    ``sample_every`` keeps 1 in N records of an event (e.g. successes) and
+    ``max_per_second`` caps how many records of an event are written per
+    second (e.g. failures during an outage); records dropped either way
+    are counted in ``suppressed``.
+    """
+
+    def __init__(self, logger: logging.Logger, sample_every: Optional[Dict[str, int]] = None,
+                 max_per_second: Optional[Dict[str, int]] = None):
+        self.logger = logger
+        self.sample_every = config.LOG_SAMPLE_EVERY if sample_every is None else sample_every
+        self.max_per_second = config.LOG_MAX_PER_SECOND if max_per_second is None else max_per_second
+        self.suppressed: Dict[str, int] = {}
+        self._seen: Dict[str, int] = {}
+        self._windows: Dict[str, List[float]] = {}
+
+    def _allow(self, event: str) -> bool:
+        every = self.sample_every.get(event)
+        if every and every > 1:
+            seen = self._seen[event] = self._seen.get(event, 0) + 1
+            if seen % every:
+                self.suppressed[event] = self.suppressed.get(event, 0) + 1
+                return False
+        limit = self.max_per_second.get(event)
+        if limit:
+            now = time.monotonic()
+            window = self._windows.get(event)
+            if window is None or now - window[0] >= 1:
+                window = self._windows[event] = [now, 0]
+            if window[1] >= limit:
+                self.suppressed[event] = self.suppressed.get(event, 0) + 1
+                return False
+            window[1] += 1
+        return True
+
+    def log(self, level: int, event: str, msg: str, **fields: Any) -> None:
+        if not self.logger.isEnabledFor(level) or not self._allow(event):
+            return
+        if fields:
+            # A single mapping argument is used for %(name)s formatting
+            self.logger.log(level, msg, fields, extra={'event': event})
+        else:
+            self.logger.log(level, msg, extra={'event': event})
+
+    def debug(self, event: str, msg: str, **fields: Any) -> None:
+        self.log(logging.DEBUG, event, msg, **fields)
+
+    def info(self, event: str, msg: str, **fields: Any) -> None:
+        self.log(logging.INFO, event, msg, **fields)
+
+    def warning(self, event: str, msg: str, **fields: Any) -> None:
+        self.log(logging.WARNING, event, msg, **fields)
+
+    def error(self, event: str, msg: str, **fields: Any) -> None:
+        self.log(logging.ERROR, event, msg, **fields)
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'event': getattr(record, 'event', None),
+            'message': record.getMessage(),
+        }
+        if isinstance(record.args, dict):
+            entry.update(record.args)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class BackgroundHandler(logging.Handler):
+    """Hands records to a writer thread so logging never waits on I/O.
+
+    ``emit`` appends the record to a bounded deque and returns; a daemon
+    thread formats and writes it through ``handlers``.  Formatting is
+    deferred to that thread, so the caller pays only for the record.
+    When the backlog reaches ``capacity`` the oldest records are
+    discarded and counted in ``dropped`` rather than blocking producers.
+    (``logging.handlers.QueueHandler`` formats in the caller and its
+    listener needs the standard library ``queue`` module, which this
+    package shadows.)
+    """
+
+    def __init__(self, handlers: List[logging.Handler], capacity: int = 100_000):
+        super().__init__()
+        self.handlers = list(handlers)
+        self.capacity = capacity
+        self.dropped = 0
+        self._records: deque = deque()
+        self._wakeup = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name='queue-log-writer',
+                                        daemon=True)
+        self._writer.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        records = self._records
+        if len(records) >= self.capacity:
+            records.popleft()
+            self.dropped += 1
+        records.append(record)
+        if not self._wakeup.is_set():
+            self._idle.clear()
+            self._wakeup.set()
+
+    def _write_loop(self) -> None:
+        records = self._records
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            while records:
+                record = records.popleft()
+                for handler in self.handlers:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+            for handler in self.handlers:
+                handler.flush()
+            if not records:
+                self._idle.set()
+            if self._closed and not records:
+                return
+
+    def flush(self) -> None:
+        """Block until every record emitted so far has been written"""
+        while not self._closed and (self._records or not self._idle.is_set()):
+            self._wakeup.set()
+            self._idle.wait(0.1)
+
+    def close(self) -> None:
+        self._closed = True
+        self._wakeup.set()
+        self._writer.join()
+        for handler in self.handlers:
+            handler.close()
+        super().close()
+
+def setup_logging(logging_config: Optional[Dict[str, Any]] = None,
+                  background: bool = True) -> Optional[BackgroundHandler]:
+    """Apply ``LOGGING_CONFIG`` and move the root handlers behind a writer thread
+
+    Returns the ``BackgroundHandler`` (None with ``background=False``);
+    close it, or call ``logging.shutdown()``, to flush on exit.
+    """
+    logging.config.dictConfig(logging_config or config.LOGGING_CONFIG)
+    if not background:
+        return None
+    root = logging.getLogger()
+    handler = BackgroundHandler(root.handlers)
+    root.handlers = [handler]
+    return handler
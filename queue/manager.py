@@ -1,90 +1,1056 @@
-from datetime import datetime, UTC
+from collections import OrderedDict
+from itertools import chain
+import gc
 import logging
-from typing import Dict, Any, List, Tuple
+import pickle
+import threading
 import time
-from .failures import FailureType
+from typing import Dict, Any, List, Optional, Callable, Tuple, Union
+from . import config
+from .capacity import OverflowPolicy, QueueFullError, SpillFile, Watermarks
+from .codec import Codec, get_codec
+from .dead_letter import DeadLetterStore
+from .log import EventLogger
+from .metrics import QueueMetrics
+from .profiling import Hook, install_hooks, uninstall_hooks
+from .failures import FailureType, MessageFailure
 from .handler import FailureHandler
+from .store import PriorityPendingQueue
+from .scheduler import RetryScheduler
+from .message import Message
+from .utils import generate_message_id
+from .wal import WriteAheadLog
+
+# Stands for the snapshot's spilled backlog while the log is replayed
+_SPILLED_BACKLOG = object()
 
 class QueueSystem:
-    def __init__(self):
-        self.queue: List[Dict[str, Any]] = []
-        self.processing: Dict[str, Dict[str, Any]] = {}
-        self.dead_letter_queue: List[Dict[str, Any]] = []
+    def __init__(self, wal: Optional[WriteAheadLog] = None, max_size: Optional[int] = None,
+                 overflow: Union[OverflowPolicy, str, None] = None,
+                 overflow_timeout: Optional[float] = config.OVERFLOW_TIMEOUT,
+                 spill_directory: Optional[str] = None,
+                 processing_timeout: Optional[float] = None,
+                 metrics: Optional[QueueMetrics] = None,
+                 ttl: Optional[float] = None, expired_policy: Optional[str] = None,
+                 codec: Union[Codec, str, None] = None):
+        self.queue: PriorityPendingQueue = PriorityPendingQueue()
+        self.processing: Dict[int, Dict[str, Any]] = {}
+        self.dead_letter_queue: DeadLetterStore = DeadLetterStore()
+        self.scheduled: RetryScheduler = RetryScheduler()
+        self.leases: RetryScheduler = RetryScheduler()
         self.max_retries = 3
         self.failure_handler = FailureHandler()
+        # Message data is encoded on enqueue and decoded when a handler
+        # reads it; None keeps data as Python objects
+        self.codec = get_codec(config.MESSAGE_CODEC if codec is None else codec)
+
+        # One lock guards queue/processing/dead_letter_queue; the condition
+        # wakes blocked consumers when messages become available
+        self._lock = threading.RLock()
+        self._available = threading.Condition(self._lock)
+        # Wakes producers blocked on a full queue
+        self._space = threading.Condition(self._lock)
+        # Collects WAL records while a batch operation holds the lock
+        self._log_batch: Optional[List[Tuple[str, Any]]] = None
         
         # Configure logging
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
+        self.events = EventLogger(self.logger)
+
+        # Lock-free counters and histograms; several queues may share one
+        self.metrics = metrics or QueueMetrics()
+        self.metrics.sources.append(self.monitor_health)
+        # Instrumentation hooks; the methods are only wrapped while any are set
+        self._hooks: List[Hook] = []
+
+        # Bounded capacity: producers see backpressure once max_size
+        # messages are pending (0 means unbounded)
+        self.max_size = config.MAX_QUEUE_SIZE if max_size is None else max_size
+        self.overflow = OverflowPolicy(overflow or config.OVERFLOW_POLICY)
+        self.overflow_timeout = overflow_timeout
+        self.spill: Optional[SpillFile] = None
+        if self.max_size and self.overflow is OverflowPolicy.SPILL:
+            self.spill = SpillFile(spill_directory or config.SPILL_DIRECTORY)
+        self.watermarks: Optional[Watermarks] = None
+        if self.max_size:
+            self.watermarks = Watermarks(int(self.max_size * config.HIGH_WATERMARK),
+                                         int(self.max_size * config.LOW_WATERMARK))
+
+        # In-flight messages are leased for processing_timeout seconds (0
+        # disables leases); expired leases fail as FailureType.TIMEOUT
+        self.processing_timeout = (config.PROCESSING_TIMEOUT if processing_timeout is None
+                                   else processing_timeout)
+        self._reaper: Optional[threading.Thread] = None
+        self._reaper_stop = threading.Event()
+
+        # Messages with a TTL, ordered by expiry deadline; expire_due only
+        # touches the messages whose deadline has passed
+        self.expiry: RetryScheduler = RetryScheduler()
+        self.ttl = config.MESSAGE_TTL if ttl is None else ttl
+        self.expired_policy = expired_policy or config.EXPIRED_POLICY
+        if self.expired_policy not in ('drop', 'dead_letter'):
+            raise ValueError(f"expired_policy must be 'drop' or 'dead_letter', "
+                             f"got {self.expired_policy!r}")
+
+        # Durable state: replay the write-ahead log before accepting work
+        self.wal = wal
+        if wal is not None:
+            # Replay allocates millions of long-lived dicts; cyclic GC passes
+            # over them would dominate startup time
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                self._restore()
+            finally:
+                if gc_enabled:
+                    gc.enable()
+
+    def _wrap(self, message: Dict[str, Any], priority: Optional[str] = None,
+              ttl: Optional[float] = None, encode: bool = True) -> Message:
+        if priority is not None and priority not in self.queue.weights:
+            raise ValueError(f"Unknown priority {priority!r}")
+        wrapper = Message(generate_message_id(), message, priority=priority)
+        ttl = self.ttl if ttl is None else ttl
+        if ttl is not None:
+            wrapper.expires_at = wrapper.created_at + ttl
+        if encode and self.codec is not None:
+            wrapper.encode(self.codec, self.failure_handler.dependency_key)
+        return wrapper
+
+    def enqueue(self, message: Dict[str, Any], timeout: Optional[float] = None,
+                priority: Optional[str] = None, ttl: Optional[float] = None) -> None:
+        """Add message to queue with metadata
+
+        ``priority`` names a level in ``config.PRIORITY_WEIGHTS`` (default
+        ``DEFAULT_PRIORITY``).  A message not dispatched within ``ttl``
+        seconds (default ``MESSAGE_TTL``) expires.  On a full queue the
+        ``overflow`` policy applies; ``timeout`` overrides
+        ``overflow_timeout`` for the blocking policy.
+        """
+        message_wrapper = self._wrap(message, priority, ttl)
+        with self._lock:
+            self._track_expiry(self._admit([message_wrapper], timeout))
+            lsn = self._log('enqueue', message_wrapper)
+            self._notify_available()
+            crossed = self._watermark_crossed()
+        self._sync(lsn)
+        self._fire(crossed)
+        self.metrics.enqueued.inc()
+        self.events.info('enqueued', "Message %(message_id)s enqueued", message_id=message_wrapper.id)
+
+    def enqueue_many(self, messages: List[Dict[str, Any]], timeout: Optional[float] = None,
+                     priority: Optional[str] = None, ttl: Optional[float] = None) -> List[int]:
+        """Add several messages under one lock acquisition and WAL write
+
+        Under the blocking and rejecting policies the batch is admitted
+        whole or not at all.
+        """
+        return self._enqueue_wrappers([self._wrap(message, priority, ttl) for message in messages],
+                                      timeout)
+
+    def enqueue_encoded(self, payloads: List[Tuple[bytes, Any]], timeout: Optional[float] = None,
+                        priority: Optional[str] = None, ttl: Optional[float] = None) -> List[int]:
+        """Add messages whose data is already encoded, as ``(payload, dependency)`` pairs
+
+        Payloads (see ``codec.encode_payload``) are stored as they are and
+        decoded only when a handler reads the data, whatever this queue's
+        ``codec``; ``dependency`` is the data's dependency name, if any.
+        """
+        wrappers = []
+        for payload, dependency in payloads:
+            message_wrapper = self._wrap(None, priority, ttl, encode=False)
+            message_wrapper.payload = payload
+            message_wrapper.dependency = dependency
+            wrappers.append(message_wrapper)
+        return self._enqueue_wrappers(wrappers, timeout)
+
+    def _enqueue_wrappers(self, wrappers: List[Message], timeout: Optional[float]) -> List[int]:
+        if not wrappers:
+            return []
+        with self._lock:
+            self._track_expiry(self._admit(wrappers, timeout))
+            lsn = self._log_many([('enqueue', message_wrapper) for message_wrapper in wrappers])
+            self._notify_available(wake_all=True)
+            crossed = self._watermark_crossed()
+        self._sync(lsn)
+        self._fire(crossed)
+        self.metrics.enqueued.inc(len(wrappers))
+        self.events.info('enqueued', "%(count)s messages enqueued", count=len(wrappers))
+        return [message_wrapper['id'] for message_wrapper in wrappers]
+
+    def _admit(self, wrappers: List[Message], timeout: Optional[float]) -> List[Message]:
+        """Add new messages within capacity; called with the lock held
+
+        The capacity check is a length comparison, so bounded enqueues stay
+        O(1).  Retries and recovered messages bypass it: they are already
+        accounted for and must not be lost or block a consumer.  Returns
+        the messages kept in memory, i.e. not spilled to disk.
+        """
+        limit = self.max_size
+        if not limit:
+            for message_wrapper in wrappers:
+                self.queue.append(message_wrapper)
+            return wrappers
+        if self.overflow is OverflowPolicy.SPILL:
+            admitted = []
+            for message_wrapper in wrappers:
+                # Once anything is on disk, newer messages queue behind it
+                if self.spill or len(self.queue) >= limit:
+                    self.spill.append(message_wrapper)
+                else:
+                    self.queue.append(message_wrapper)
+                    admitted.append(message_wrapper)
+            return admitted
+        if self.overflow is OverflowPolicy.DROP_OLDEST:
+            for message_wrapper in wrappers:
+                if len(self.queue) >= limit:
+                    oldest = self.queue.pop_lowest()
+                    oldest['error'] = 'Dropped: queue full'
+                    self._move_to_dead_letter(oldest, oldest['error'])
+                self.queue.append(message_wrapper)
+            return wrappers
+        self._wait_for_space(len(wrappers), timeout)
+        for message_wrapper in wrappers:
+            self.queue.append(message_wrapper)
+        return wrappers
+
+    def _wait_for_space(self, needed: int, timeout: Optional[float]) -> None:
+        """Wait until ``needed`` more messages fit, or raise QueueFullError
+
+        Only the blocking and rejecting policies refuse messages; called
+        with the lock held.
+        """
+        limit = self.max_size
+        if not limit or self.overflow not in (OverflowPolicy.BLOCK, OverflowPolicy.REJECT) \
+                or limit - len(self.queue) >= needed:
+            return
+        if self.overflow is OverflowPolicy.REJECT or needed > limit:
+            raise QueueFullError(f"Queue is full ({len(self.queue)}/{limit} pending)")
+        if timeout is None:
+            timeout = self.overflow_timeout
+        if not self._space.wait_for(lambda: limit - len(self.queue) >= needed, timeout):
+            raise QueueFullError(
+                f"Queue is still full after {timeout}s ({len(self.queue)}/{limit} pending)"
+            )
+
+    def _track_expiry(self, wrappers: List[Message]) -> None:
+        for message_wrapper in wrappers:
+            if message_wrapper.expires_at is not None:
+                self.expiry.schedule(message_wrapper, message_wrapper.expires_at)
+
+    def expire_due(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Drop or dead-letter pending and scheduled messages whose TTL has passed
+
+        Due messages are popped off the expiry heap, so a sweep costs time
+        proportional to the number expired, not the queue depth.  In-flight
+        and spilled messages are left alone; they are expired if they come
+        up for dispatch after their deadline.  The lease reaper sweeps on
+        every tick.
+        """
+        expired = []
+        with self._lock:
+            for due in self.expiry.dequeue_ready(now):
+                # The pending or scheduled copy; refilled spill messages are new objects
+                message = self.queue.discard(due['id']) or self.scheduled.cancel(due['id'])
+                if message is None:
+                    continue
+                if self.max_size:
+                    self._notify_space()
+                self._expire(message)
+                expired.append(message)
+        if expired:
+            self._sync(None)
+            self.events.info('expired', "%(count)s messages expired", count=len(expired))
+        return expired
+
+    def _expire(self, message: Dict[str, Any]) -> None:
+        """Retire a message whose TTL has passed; called with the lock held"""
+        self.expiry.cancel(message['id'])
+        self.metrics.expired.inc()
+        if self.expired_policy == 'dead_letter':
+            message['error'] = 'Expired'
+            self._move_to_dead_letter(message, 'Expired')
+        else:
+            message['status'] = 'expired'
+            self._log('expire', message['id'])
+
+    def _refill(self) -> None:
+        """Move spilled messages back into memory as room frees up
+
+        Spilled messages are not in the expiry index, which would keep
+        them in memory; they join it as they come back.
+        """
+        room = self.max_size - len(self.queue)
+        messages = self.spill.pop_many(room)
+        for message in messages:
+            self.queue.append(message)
+        self._track_expiry(messages)
+
+    def _backlog(self) -> int:
+        return len(self.queue) + (len(self.spill) if self.spill is not None else 0)
+
+    def _watermark_crossed(self) -> Optional[Callable[[Any], None]]:
+        if self.watermarks is None:
+            return None
+        return self.watermarks.update(self._backlog())
+
+    def _fire(self, callback: Optional[Callable[[Any], None]]) -> None:
+        """Run a watermark callback outside the lock"""
+        if callback is not None:
+            callback(self)
+
+    def _wait_available(self, block: bool, end: Optional[float]) -> bool:
+        """Wait until ``end`` (monotonic) for a pending message; called with the lock held"""
+        while True:
+            self.dequeue_ready()
+            if self.queue or self.spill:
+                return True
+            if not block:
+                return False
+            wait = None
+            next_deadline = self.scheduled.next_deadline()
+            if next_deadline is not None:
+                wait = max(next_deadline - time.time(), 0)
+            if end is not None:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = remaining if wait is None else min(wait, remaining)
+            self._available.wait(wait)
+
+    def _take(self, visibility_timeout: Optional[float]) -> Optional[Dict[str, Any]]:
+        """Pop the next message that may be dispatched now
+
+        Messages whose dependency has an open circuit breaker are parked in
+        the scheduler until the breaker allows trial calls, rather than
+        being handed out only to fail again.
+        """
+        while True:
+            if self.spill and len(self.queue) < self.max_size:
+                self._refill()
+            if not self.queue:
+                return None
+            message = self.queue.popleft()
+            if self.max_size:
+                self._notify_space()
+            now = time.time()
+            if message.expires_at is not None and message.expires_at <= now:
+                self._expire(message)
+                continue
+            if not self._dependency_allows(message):
+                continue
+            message['status'] = 'processing'
+            self.processing[message['id']] = message
+            self.metrics.wait.observe(now - message.created_at)
+            if visibility_timeout is None:
+                visibility_timeout = self.processing_timeout
+            if visibility_timeout:
+                self.leases.schedule(message, now + visibility_timeout)
+            return message
+
+    def _dependency_allows(self, message: Dict[str, Any]) -> bool:
+        dependency = self.failure_handler.dependency_of(message)
+        if dependency is None:
+            return True
+        breaker = self.failure_handler.circuit_breakers.get(dependency)
+        if breaker.allow_request():
+            # Only this breaker hears about the outcome as a call it let through
+            message['admitted_by'] = dependency
+            return True
+        delay = breaker.retry_after()
+        message['status'] = 'retry'
+        message['next_process_time'] = time.time() + delay
+        self.scheduled.schedule(message)
+        self._log('schedule', message)
+        self.events.warning(
+            'circuit_parked',
+            "Message %(message_id)s parked for %(delay).0fs: circuit breaker for %(dependency)s is open",
+            message_id=message['id'], delay=delay, dependency=dependency
+        )
+        return False
+
+    def dequeue(self, block: bool = False, timeout: Optional[float] = None,
+                visibility_timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Pop the next pending message and move it to processing
+
+        With ``block`` the call waits up to ``timeout`` seconds for a message,
+        waking for new enqueues and for scheduled retries falling due.  The
+        message is leased for ``visibility_timeout`` seconds (default
+        ``processing_timeout``): if it is neither acked nor nacked in time,
+        the reaper fails it as a timeout so it is retried.
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        message = None
+        with self._lock:
+            while self._wait_available(block, end):
+                message = self._take(visibility_timeout)
+                if message is not None:
+                    self._log('dequeue', message['id'])
+                    break
+            crossed = self._watermark_crossed()
+        self._fire(crossed)
+        return message
+
+    def dequeue_batch(self, max_n: int, max_wait: float = 0,
+                      visibility_timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Pop up to ``max_n`` messages, waiting up to ``max_wait`` for the first
+
+        Returns as soon as at least one message is available rather than
+        waiting for the batch to fill.
+        """
+        end = time.monotonic() + max_wait
+        batch = []
+        with self._lock:
+            while not batch and self._wait_available(max_wait > 0, end):
+                while len(batch) < max_n:
+                    message = self._take(visibility_timeout)
+                    if message is None:
+                        break
+                    batch.append(message)
+            self._log_many([('dequeue', message['id']) for message in batch])
+            crossed = self._watermark_crossed()
+        self._fire(crossed)
+        return batch
+
+    def ack(self, message_id: int) -> bool:
+        """Mark an in-flight or pending message as completed"""
+        with self._lock:
+            if not self._complete(message_id):
+                return False
+            self._log('ack', message_id)
+        self._sync(None)
+        self.events.info('acked', "Message %(message_id)s processed successfully", message_id=message_id)
+        return True
+
+    def ack_many(self, message_ids: List[int]) -> int:
+        """Acknowledge several messages at once; returns how many were known"""
+        now = time.time()
+        with self._lock:
+            acked = [message_id for message_id in message_ids if self._complete(message_id, now)]
+            self._log_many([('ack', message_id) for message_id in acked])
+        self._sync(None)
+        if acked:
+            self.events.info('acked', "%(count)s messages processed successfully", count=len(acked))
+        return len(acked)
+
+    def _complete(self, message_id: int, now: Optional[float] = None) -> bool:
+        message = self.processing.pop(message_id, None)
+        pending = self.queue.discard(message_id)
+        self.leases.cancel(message_id)
+        if message is None and pending is None:
+            # Acked after its lease expired: drop the timeout retry
+            pending = self.scheduled.cancel(message_id)
+        if pending is not None and self.max_size:
+            self._notify_space()
+        if message is None:
+            message = pending
+        if message is None:
+            return False
+        message['status'] = 'completed'
+        if message.expires_at is not None:
+            self.expiry.cancel(message_id)
+        self.failure_handler.record_success(message)
+        self.metrics.latency.observe((now or time.time()) - message.created_at)
+        return True
+
+    def nack(self, message_id: int, error: str = 'Negative acknowledgement',
+             failure_type: Optional[FailureType] = None) -> bool:
+        """Report an in-flight message as failed so it is retried or dead-lettered"""
+        with self._lock:
+            message = self.processing.get(message_id)
+            if message is None:
+                return False
+            self._handle_failure(message, error, failure_type)
+        self._sync(None)
+        return True
+
+    def nack_many(self, message_ids: List[int], error: str = 'Negative acknowledgement',
+                  failure_type: Optional[FailureType] = None) -> int:
+        """Fail several in-flight messages under one lock and WAL write"""
+        with self._lock:
+            self._log_batch = []
+            try:
+                messages = {message_id: self.processing[message_id] for message_id in message_ids
+                            if message_id in self.processing}
+                self._handle_failures(list(messages.values()), error, failure_type)
+                nacked = len(messages)
+            finally:
+                records, self._log_batch = self._log_batch, None
+            self._log_many(records)
+        self._sync(None)
+        return nacked
+
+    def extend_lease(self, message_id: int, seconds: Optional[float] = None) -> bool:
+        """Heartbeat: push an in-flight message's lease ``seconds`` from now
+
+        Defaults to ``processing_timeout``; 0 lets the lease expire now.
+        Returns False if the message is no longer in flight, e.g. because
+        its lease already expired.
+        """
+        if seconds is None:
+            seconds = self.processing_timeout
+        elif seconds < 0:
+            raise ValueError(f"Lease extension must not be negative, got {seconds!r}")
+        with self._lock:
+            message = self.processing.get(message_id)
+            if message is None:
+                return False
+            self.leases.schedule(message, time.time() + seconds)
+            return True
+
+    def requeue_expired(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Fail in-flight messages whose lease has passed as timeouts"""
+        return self._expire_leases(self.leases.dequeue_ready(now))
+
+    def _expire_leases(self, expired: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        failed = []
+        with self._lock:
+            for message in expired:
+                # Skip messages acked, nacked or re-leased since they were popped
+                if message['id'] in self.processing and message['id'] not in self.leases:
+                    self.events.warning('lease_expired', "Lease on message %(message_id)s expired",
+                                        message_id=message['id'])
+                    failed.append(message)
+            self._handle_failures(failed, 'Visibility timeout expired', FailureType.TIMEOUT)
+        if failed:
+            self._sync(None)
+        return failed
+
+    def start_reaper(self) -> None:
+        """Start a daemon thread that fails messages whose lease expires
 
-    def enqueue(self, message: Dict[str, Any]) -> None:
-        """Add message to queue with metadata"""
-        message_wrapper = {
-            'id': str(time.time()),
-            'data': message,
-            'attempt': 0,
-            'timestamp': datetime.now(UTC).isoformat(),
-            'status': 'pending'
-        }
-        self.queue.append(message_wrapper)
-        self.logger.info(f"Message {message_wrapper['id']} enqueued")
-
-    def process_message(self, message: Dict[str, Any]) -> bool:
-        """Process a message from the queue"""
+        The thread sleeps until the earliest lease deadline rather than
+        scanning ``processing``, so each tick only touches expired leases.
+        """
+        with self._lock:
+            if self._reaper is not None:
+                return
+            self._reaper_stop.clear()
+            self._reaper = threading.Thread(target=self._reap, name='queue-lease-reaper',
+                                            daemon=True)
+            self._reaper.start()
+
+    def stop_reaper(self) -> None:
+        with self._lock:
+            reaper, self._reaper = self._reaper, None
+        if reaper is None:
+            return
+        self._reaper_stop.set()
+        self.leases.wake()
+        reaper.join()
+
+    def _reap(self) -> None:
+        while not self._reaper_stop.is_set():
+            # The timeout only bounds how long a missed wake() can delay shutdown
+            expired = self.leases.wait_next(timeout=1.0)
+            if expired:
+                self._expire_leases(expired)
+            self.expire_due()
+
+    def add_hook(self, hook: Hook) -> None:
+        """Call ``hook.before``/``hook.after`` around each instrumented phase
+
+        See ``queue.profiling.PHASES``.  The first hook wraps the phase
+        methods on this instance; with no hooks the plain methods run and
+        instrumentation costs nothing.
+        """
+        with self._lock:
+            if not self._hooks:
+                install_hooks(self, self._hooks)
+            self._hooks.append(hook)
+
+    def remove_hook(self, hook: Hook) -> None:
+        with self._lock:
+            if hook in self._hooks:
+                self._hooks.remove(hook)
+                if not self._hooks:
+                    uninstall_hooks(self)
+
+    def process_message(self, message: Dict[str, Any],
+                        handler: Optional[Callable[[Dict[str, Any]], Any]] = None) -> bool:
+        """Process a message from the queue
+
+        ``handler`` receives the message wrapper; raising ``MessageFailure``
+        routes the failure through ``FailureHandler`` by its failure type.
+        """
+        if not self._begin_processing(message):
+            return False
+        started = time.perf_counter()
         try:
+            (handler or self._simulate_processing)(message)
+        except Exception as e:
+            self.metrics.handler.observe(time.perf_counter() - started)
+            return self._finish_processing(message, e)
+        self.metrics.handler.observe(time.perf_counter() - started)
+        return self._finish_processing(message)
+
+    def _begin_processing(self, message: Dict[str, Any]) -> bool:
+        with self._lock:
+            if message.get('status') == 'dead_letter':
+                return False
+            # Messages from ``dequeue`` are in processing and logged already
+            dispatched = self.processing.get(message['id']) is message
             # Move to processing state
             message['status'] = 'processing'
             self.processing[message['id']] = message
-            
-            # Simulate processing - in real system, this would be business logic
-            if message.get('data', {}).get('force_fail'):
-                raise Exception("Forced failure for testing")
-            
-            # Successfully processed
-            message['status'] = 'completed'
-            self.queue.remove(message)  # Remove from main queue
-            del self.processing[message['id']]  # Remove from processing
-            self.logger.info(f"Message {message['id']} processed successfully")
+            if self.processing_timeout and message['id'] not in self.leases:
+                self.leases.schedule(message, time.time() + self.processing_timeout)
+            if not dispatched:
+                self._log('dequeue', message['id'])
             return True
-            
-        except Exception as e:
-            self.handle_failure(message, str(e))
-            return False
 
-    def handle_failure(self, message: Dict[str, Any], error: str) -> None:
-        """Handle failed message processing"""
+    def _finish_processing(self, message: Dict[str, Any], error: Optional[Exception] = None) -> bool:
+        if error is None:
+            # Successfully processed
+            return self.ack(message['id'])
+        failure_type = error.failure_type if isinstance(error, MessageFailure) else None
+        self.handle_failure(message, str(error), failure_type)
+        return False
+
+    def _simulate_processing(self, message: Dict[str, Any]) -> None:
+        # Simulate processing - in real system, this would be business logic
+        if message.get('data', {}).get('force_fail'):
+            raise Exception("Forced failure for testing")
+
+    def run(self, handler: Callable[[Dict[str, Any]], Any], workers: int = 4,
+            visibility_timeout: Optional[float] = None, stop_when_empty: bool = True,
+            stop_event: Optional[threading.Event] = None,
+            poll_interval: float = 0.1) -> Dict[str, int]:
+        """Consume messages with a pool of ``workers`` threads
+
+        Each worker blocks in ``dequeue`` and calls ``process_message`` with
+        ``handler``, so I/O-bound handlers run concurrently while queue state
+        changes stay under the lock.  The lease reaper runs alongside the
+        workers if it was not already started.  Returns once ``stop_event`` is set, or
+        when nothing is pending, in flight or scheduled if ``stop_when_empty``.
+        """
+        stop_event = stop_event or threading.Event()
+        counts = {'processed': 0, 'failed': 0}
+        counts_lock = threading.Lock()
+
+        def worker() -> None:
+            while not stop_event.is_set():
+                message = self.dequeue(block=True, timeout=poll_interval,
+                                       visibility_timeout=visibility_timeout)
+                if message is None:
+                    if stop_when_empty and self._is_idle():
+                        stop_event.set()
+                    continue
+                result = 'processed' if self.process_message(message, handler) else 'failed'
+                with counts_lock:
+                    counts[result] += 1
+
+        threads = [
+            threading.Thread(target=worker, name=f"queue-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        owns_reaper = self._reaper is None
+        self.start_reaper()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if owns_reaper:
+            self.stop_reaper()
+        return counts
+
+    def _notify_space(self) -> None:
+        """Wake a producer blocked on a full queue; called with the lock held"""
+        self._space.notify()
+
+    def _notify_available(self, wake_all: bool = False) -> None:
+        """Wake consumers blocked in dequeue; called with the lock held"""
+        if wake_all:
+            self._available.notify_all()
+        else:
+            self._available.notify()
+
+    def run_processes(self, handler: Callable[[Dict[str, Any]], Any],
+                      processes: Optional[int] = None, batch_size: int = 64,
+                      stop_when_empty: bool = True) -> Dict[str, int]:
+        """Consume messages with CPU-bound ``handler`` in worker processes
+
+        See ``ProcessWorkerPool``; ``handler`` must be picklable unless the
+        platform forks.  Handlers receive ``id``, ``data`` and ``attempt``.
+        """
+        from .process_pool import ProcessWorkerPool
+        pool = ProcessWorkerPool(self, handler, processes=processes, batch_size=batch_size)
+        return pool.run(stop_when_empty=stop_when_empty)
+
+    def _is_idle(self) -> bool:
+        with self._lock:
+            return not (self.queue or self.spill or self.processing or len(self.scheduled))
+
+    def dequeue_ready(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Move retries whose deadline has passed back to the pending queue"""
+        with self._lock:
+            ready = self.scheduled.dequeue_ready(now)
+            for message in ready:
+                self._requeue(message)
+            return ready
+
+    def wait_next(self, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Sleep until the earliest scheduled retry is due, then requeue it"""
+        ready = self.scheduled.wait_next(timeout)
+        with self._lock:
+            for message in ready:
+                self._requeue(message)
+        return ready
+
+    def _requeue(self, message: Dict[str, Any]) -> None:
+        message['status'] = 'pending'
+        message.pop('next_process_time', None)
+        message.pop('next_retry', None)
+        if message not in self.queue:
+            self.queue.append(message)
+            self._notify_available()
+
+    def handle_failure(self, message: Dict[str, Any], error: str,
+                       failure_type: Optional[FailureType] = None) -> None:
+        """Handle failed message processing
+
+        Without a ``failure_type`` the message is retried immediately until
+        ``max_retries``.  With one, ``FailureHandler`` picks the strategy and
+        retries are parked in the scheduler until ``next_process_time``.
+        """
+        with self._lock:
+            self._handle_failure(message, error, failure_type)
+        self._sync(None)
+
+    def _handle_failures(self, messages: List[Dict[str, Any]], error: str,
+                         failure_type: Optional[FailureType]) -> None:
+        """Fail several messages with one pass of the failure strategy
+
+        Called with the lock held.  Typed failures go through
+        ``FailureHandler.handle_failures_batch``, so a mass failure reads
+        the clock once rather than once per message.
+        """
+        if failure_type is None or len(messages) < 2:
+            for message in messages:
+                self._handle_failure(message, error, failure_type)
+            return
+        for message in messages:
+            self._mark_failed(message, error)
+        self.metrics.failures.inc(len(messages), failure_type.value)
+        self.failure_handler.handle_failures_batch(messages, failure_type)
+        for message in messages:
+            self._route_failure(message, error, failure_type.value)
+
+    def _mark_failed(self, message: Dict[str, Any], error: str) -> None:
         message['status'] = 'failed'
         message['error'] = error
         message['attempt'] += 1
+        self.processing.pop(message['id'], None)
+        self.leases.cancel(message['id'])
+
+    def _route_failure(self, message: Dict[str, Any], error: str, failure_label: str) -> None:
+        """Dead-letter or schedule a message after the failure strategy ran"""
+        if message['status'] == 'dead_letter':
+            self._move_to_dead_letter(message, error)
+            return
+        self.metrics.retries.inc(1, failure_label)
+        self.queue.discard(message['id'])
+        self.scheduled.schedule(message)
+        self._log('schedule', message)
+        # Blocked consumers re-arm their wait for the new deadline
+        self._notify_available(wake_all=True)
+
+    def _handle_failure(self, message: Dict[str, Any], error: str,
+                        failure_type: Optional[FailureType]) -> None:
+        self._mark_failed(message, error)
+        failure_label = failure_type.value if failure_type is not None else 'untyped'
+        self.metrics.failures.inc(1, failure_label)
+
+        if failure_type is not None:
+            self.failure_handler.handle_message_failure(message, failure_type)
+            self._route_failure(message, error, failure_label)
+            return
         
         if message['attempt'] >= self.max_retries:
-            self.dead_letter_queue.append(message)
-            if message['id'] in self.processing:
-                del self.processing[message['id']]
-            if message in self.queue:
-                self.queue.remove(message)
-            self.logger.error(
-                f"Message {message['id']} failed permanently after {self.max_retries} attempts. "
-                f"Moved to dead letter queue. Error: {error}"
-            )
+            self._move_to_dead_letter(message, error)
         else:
-            self.logger.warning(
-                f"Message {message['id']} failed, attempt {message['attempt']}/{self.max_retries}. "
-                f"Retrying in 5 seconds"
+            self.metrics.retries.inc(1, failure_label)
+            if message not in self.queue:
+                self.queue.append(message)
+                self._notify_available()
+            self._log('requeue', message)
+            self.events.warning(
+                'requeued',
+                "Message %(message_id)s failed, attempt %(attempt)s/%(max_retries)s. Retrying",
+                message_id=message['id'], attempt=message['attempt'], max_retries=self.max_retries
             )
 
-    def recover_processing_messages(self) -> None:
-        """Recover messages that were being processed during a crash"""
-        processing_items = list(self.processing.values())  # Create a copy of values
-        for message in processing_items:
-            message['status'] = 'failed'
-            message['error'] = 'System crash recovery'
-            self.handle_failure(message, 'System crash recovery')
+    def _move_to_dead_letter(self, message: Dict[str, Any], error: str) -> None:
+        message['status'] = 'dead_letter'
+        if message.expires_at is not None:
+            self.expiry.cancel(message['id'])
+        last_failure = message.get('last_failure')
+        self.metrics.dead_lettered.inc(1, last_failure['type'] if last_failure else 'untyped')
+        evicted = self.dead_letter_queue.append(message)
+        self.queue.discard(message['id'])
+        self.scheduled.cancel(message['id'])
+        self._log('dead_letter', message)
+        for old in evicted:
+            self._log('evict', old['id'])
+        self.events.error(
+            'dead_lettered',
+            "Message %(message_id)s failed permanently after %(attempt)s attempts. "
+            "Moved to dead letter queue. Error: %(error)s",
+            message_id=message['id'], attempt=message['attempt'], error=error
+        )
+
+    def redrive(self, failure_type: Optional[FailureType] = None, error: Optional[str] = None,
+                since: Optional[float] = None, until: Optional[float] = None,
+                limit: Optional[int] = None, rate_limit: Optional[float] = None,
+                batch_size: int = 100, timeout: Optional[float] = None) -> int:
+        """Move matching dead-lettered messages back to the pending queue
+
+        Filters are those of ``DeadLetterStore.query``, applied once when
+        the redrive starts: messages dead-lettered meanwhile stay put.
+        Messages are moved in batches of ``batch_size`` under one lock and
+        WAL write each, with a fresh retry budget.  ``rate_limit`` caps redriven messages per
+        second so a large redrive doesn't swamp consumers.  ``timeout``
+        overrides ``overflow_timeout`` for a full queue.  Returns the
+        number of messages redriven.
+        """
+        if rate_limit:
+            batch_size = max(1, min(batch_size, int(rate_limit)))
+        # Pick the messages up front: admitting a batch may dead-letter
+        # others (overflow='drop_oldest'), which must not be redriven in turn
+        with self._lock:
+            matches, _ = self.dead_letter_queue.query(
+                failure_type, error, since, until,
+                len(self.dead_letter_queue) if limit is None else limit)
+            message_ids = [message['id'] for message in matches]
+        redriven = 0
+        for start in range(0, len(message_ids), batch_size):
+            started = time.monotonic()
+            with self._lock:
+                batch = [message for message in map(self.dead_letter_queue.get,
+                                                    message_ids[start:start + batch_size])
+                         if message is not None]
+                if not batch:
+                    continue
+                # A full queue raises before anything leaves the DLQ
+                self._wait_for_space(len(batch), timeout)
+                for message in batch:
+                    self.dead_letter_queue.discard(message['id'])
+                    message['status'] = 'pending'
+                    message['attempt'] = 0
+                    message.pop('error', None)
+                    message.pop('failure_count', None)
+                    message.pop('last_failure', None)
+                    message.pop('next_process_time', None)
+                # Reset before admitting: a spilling queue writes them to disk as they are
+                self._admit(batch, timeout)
+                lsn = self._log_many([('requeue', message) for message in batch])
+                self._notify_available(wake_all=True)
+            self._sync(lsn)
+            redriven += len(batch)
+            if rate_limit:
+                time.sleep(max(len(batch) / rate_limit - (time.monotonic() - started), 0))
+        if redriven:
+            self.events.info('redriven', "Redrove %(count)s messages from the dead letter queue",
+                             count=redriven)
+        return redriven
+
+    def recover_processing_messages(self, message_ids: Optional[List[int]] = None) -> None:
+        """Recover messages that were being processed during a crash
+
+        ``message_ids`` limits recovery to the messages a single crashed
+        consumer held; by default everything in processing is recovered.
+        """
+        with self._lock:
+            if message_ids is None:
+                processing_items = list(self.processing.values())  # Create a copy of values
+            else:
+                processing_items = [self.processing[message_id] for message_id in message_ids
+                                    if message_id in self.processing]
+            for message in processing_items:
+                message['status'] = 'failed'
+                message['error'] = 'System crash recovery'
+                self._handle_failure(message, 'System crash recovery', None)
+
+    def _log(self, op: str, payload: Any) -> Optional[int]:
+        """Record a state transition in the WAL; called with the lock held"""
+        if self.wal is None:
+            return None
+        if self._log_batch is not None:
+            self._log_batch.append((op, payload))
+            return None
+        return self.wal.append(op, payload)
+
+    def _log_many(self, records: List[Tuple[str, Any]]) -> Optional[int]:
+        if self.wal is None or not records:
+            return None
+        return self.wal.append_many(records)
+
+    def _sync(self, lsn: Optional[int]) -> None:
+        """Wait for durability and compact the log; called without the lock"""
+        if self.wal is None:
+            return
+        self.wal.wait(lsn)
+        if self.wal.needs_checkpoint():
+            self.checkpoint()
+
+    def checkpoint(self) -> None:
+        """Snapshot the queue state and drop the WAL segments it covers"""
+        if self.wal is None:
+            return
+        with self._lock:
+            snapshot = pickle.dumps({
+                'pending': list(self.queue),
+                'processing': list(self.processing.values()),
+                'scheduled': self.scheduled.messages(),
+                'dead_letter': list(self.dead_letter_queue),
+            }, protocol=pickle.HIGHEST_PROTOCOL)
+            # The spilled backlog follows the snapshot in the same file,
+            # copied frame by frame from its segments once the lock is released
+            spilled = self.spill.reader() if self.spill else None
+            segment_no = self.wal.rotate()
+        if spilled is None:
+            self.wal.write_snapshot(snapshot, segment_no)
+            return
+        with spilled:
+            self.wal.write_snapshot(snapshot, segment_no, spilled)
+
+    def _restore(self) -> None:
+        """Rebuild state from the latest snapshot plus the WAL records after it
+
+        The snapshot's spilled backlog is streamed back into the spill file.
+        With a spill file, messages the log leaves pending are kept as record
+        numbers and read in a second pass over the log, so only the
+        in-memory window is ever resident.
+        """
+        snapshot, spilled, start_segment = self.wal.load_snapshot()
+        pending = OrderedDict()
+        processing = {}
+        scheduled = {}
+        dead_letter = {}
+        if snapshot is not None:
+            for state, messages in ((pending, snapshot['pending']),
+                                    (processing, snapshot['processing']),
+                                    (scheduled, snapshot['scheduled']),
+                                    (dead_letter, snapshot['dead_letter'])):
+                for message in messages:
+                    state[message['id']] = message
+        # The spilled backlog's place in pending order
+        pending[_SPILLED_BACKLOG] = None
+        # Spilled copies of the messages the log touches are stale
+        touched = set()
+        deferred = self.spill is not None
+
+        records = 0
+        for op, payload in self.wal.replay(start_segment):
+            records += 1
+            if op == 'dequeue':
+                touched.add(payload)
+                message = pending.pop(payload, None)
+                if message is None:
+                    message = scheduled.pop(payload, None)
+                if message is None and payload not in processing:
+                    # Refilled from the spilled backlog after the snapshot
+                    message = _SPILLED_BACKLOG
+                if message is not None:
+                    if message is not _SPILLED_BACKLOG and not isinstance(message, int):
+                        message['status'] = 'processing'
+                    processing[payload] = message
+                continue
+            message_id = payload if op in ('ack', 'evict', 'expire') else payload['id']
+            touched.add(message_id)
+            value = records if deferred else payload
+            processing.pop(message_id, None)
+            scheduled.pop(message_id, None)
+            if op != 'dead_letter':
+                dead_letter.pop(message_id, None)
+            if op in ('ack', 'expire'):
+                pending.pop(message_id, None)
+            elif op in ('enqueue', 'requeue'):
+                # Moved to the end, so pending order is log order
+                pending.pop(message_id, None)
+                pending[message_id] = value
+            elif op == 'schedule':
+                pending.pop(message_id, None)
+                scheduled[message_id] = value
+            elif op == 'dead_letter':
+                pending.pop(message_id, None)
+                dead_letter[message_id] = value
+
+        resident = []
+        restored = 0
+
+        def restore_pending(message: Dict[str, Any]) -> None:
+            nonlocal restored
+            restored += 1
+            # Past the hot window the backlog goes back to disk
+            if self.spill is not None and (self.spill or len(self.queue) >= self.max_size):
+                self.spill.append(message)
+            else:
+                self.queue.append(message)
+                resident.append(message)
+
+        entries = iter(pending.items())
+        for message_id, message in entries:
+            if message_id is _SPILLED_BACKLOG:
+                break
+            restore_pending(message)
+        for message in spilled:
+            message_id = message['id']
+            if message_id not in touched:
+                restore_pending(message)
+            elif processing.get(message_id) is _SPILLED_BACKLOG:
+                message['status'] = 'processing'
+                processing[message_id] = message
+        for message_id in [message_id for message_id, message in processing.items()
+                           if message is _SPILLED_BACKLOG]:
+            del processing[message_id]
+
+        if not deferred:
+            for _, message in entries:
+                restore_pending(message)
+        else:
+            # Record numbers still pending ascend, as each insert went to the end
+            wanted = {record: (state, message_id)
+                      for state in (processing, scheduled, dead_letter)
+                      for message_id, record in state.items() if isinstance(record, int)}
+            backlog = [record for _, record in entries]
+            position = 0
+            if backlog or wanted:
+                for record, (_, payload) in enumerate(self.wal.replay(start_segment), 1):
+                    if position < len(backlog) and backlog[position] == record:
+                        restore_pending(payload)
+                        position += 1
+                        continue
+                    target = wanted.get(record)
+                    if target is not None:
+                        state, message_id = target
+                        if state is processing:
+                            payload['status'] = 'processing'
+                        state[message_id] = payload
+        self.processing.update(processing)
+        for message in scheduled.values():
+            self.scheduled.schedule(message)
+        self._track_expiry([*resident, *processing.values(), *scheduled.values()])
+        self.dead_letter_queue.extend(dead_letter.values())
+        self.events.info(
+            'restored',
+            "Restored %(pending)s pending, %(processing)s processing, %(scheduled)s scheduled "
+            "and %(dead_letter)s dead-lettered messages from %(records)s WAL records",
+            pending=restored, processing=len(processing), scheduled=len(scheduled),
+            dead_letter=len(dead_letter), records=records
+        )
+        # Compact what was just replayed, then retry work lost mid-flight
+        self.checkpoint()
+        self.recover_processing_messages()
 
     def monitor_health(self) -> Dict[str, int]:
         """Return queue health metrics"""
-        return {
-            'pending': len(self.queue),
-            'processing': len(self.processing),
-            'dead_letter': len(self.dead_letter_queue)
-        }
\ No newline at end of file
+        with self._lock:
+            return {
+                'pending': len(self.queue),
+                'spilled': len(self.spill) if self.spill is not None else 0,
+                'processing': len(self.processing),
+                'scheduled': len(self.scheduled),
+                'dead_letter': len(self.dead_letter_queue)
+            }
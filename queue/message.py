@@ -0,0 +1,290 @@
+import time
+from collections.abc import MutableMapping
+from datetime import datetime, UTC
+from typing import Dict, Any, Iterator, Optional, Hashable
+from .codec import Codec, decode_payload, encode_payload
+from .failures import FailureType
+
+# Integer codes for message status; index into STATUS_NAMES
+STATUS_NAMES = ('pending', 'processing', 'completed', 'failed', 'retry', 'dead_letter', 'expired')
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+PENDING, PROCESSING, COMPLETED, FAILED, RETRY, DEAD_LETTER, EXPIRED = range(len(STATUS_NAMES))
+
+# Integer codes for failure types; index into FAILURE_TYPES
+FAILURE_TYPES = tuple(FailureType)
+FAILURE_CODES = {failure_type.value: code for code, failure_type in enumerate(FAILURE_TYPES)}
+
+def to_epoch(value: Any) -> Optional[float]:
+    """Convert a datetime, ISO string or number to epoch seconds"""
+    if value is None or isinstance(value, float):
+        return value
+    if isinstance(value, int):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    return value.timestamp()
+
+def to_isoformat(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, UTC).isoformat()
+
+class Message(MutableMapping):
+    """Compact queue message record.
+
+    Fields live in ``__slots__`` with integer-coded status and failure
+    types and epoch-float timestamps, instead of a dict per message plus
+    nested dicts and ISO strings.  The ``MutableMapping`` interface
+    presents the same keys the dict wrappers had (``'status'`` as a
+    string, ``'timestamp'`` as ISO text, ``'next_process_time'`` as a
+    datetime, ...), converting on access, so existing callers and
+    ``FailureHandler`` keep working.  Unknown keys go to a lazily created
+    ``extra`` dict.
+
+    After ``encode`` the data is held as a ``payload`` (see ``codec``) and
+    only decoded when ``data`` is first read, so storing, pickling or
+    shipping the message moves the encoded bytes as they are.
+    ``dependency`` keeps the data's dependency name readable without
+    decoding.
+    """
+
+    __slots__ = ('id', '_data', 'attempt', 'created_at', 'status_code', 'error',
+                 'failure_counts', 'last_failure_code', 'last_failure_at',
+                 'last_failure_attempt', 'next_process_at', 'requires_resource_check',
+                 'priority', 'expires_at', 'payload', 'dependency', 'extra')
+
+    def __init__(self, message_id: Hashable, data: Any, created_at: Optional[float] = None,
+                 attempt: int = 0, status_code: int = PENDING, priority: Optional[str] = None):
+        self.id = message_id
+        self._data = data
+        self.attempt = attempt
+        self.created_at = time.time() if created_at is None else created_at
+        self.status_code = status_code
+        self.error = None
+        self.failure_counts = None
+        self.last_failure_code = None
+        self.last_failure_at = None
+        self.last_failure_attempt = None
+        self.next_process_at = None
+        self.requires_resource_check = None
+        self.priority = priority
+        self.expires_at = None
+        self.payload = None
+        self.dependency = None
+        self.extra = None
+
+    @classmethod
+    def from_dict(cls, values: Dict[str, Any]) -> 'Message':
+        """Build a Message from a dict wrapper"""
+        message = cls(values['id'], values.get('data'))
+        for key, value in values.items():
+            if key not in ('id', 'data'):
+                message[key] = value
+        return message
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.items())
+
+    @property
+    def data(self) -> Any:
+        if self.payload is not None:
+            # The caller may mutate the decoded data, so the bytes are stale
+            self._data = decode_payload(self.payload)
+            self.payload = None
+        return self._data
+
+    @data.setter
+    def data(self, value: Any) -> None:
+        self._data = value
+        self.payload = None
+
+    def encode(self, codec: Codec, dependency_key: Optional[str] = 'dependency') -> None:
+        """Replace the data with its encoded payload until it is next read
+
+        ``data[dependency_key]`` is kept in ``dependency`` first.
+        """
+        if self.payload is not None:
+            return
+        data = self._data
+        if dependency_key is not None and isinstance(data, dict):
+            self.dependency = data.get(dependency_key)
+        self.payload = encode_payload(data, codec)
+        self._data = None
+
+    def payload_bytes(self, codec: Codec) -> bytes:
+        """Return the encoded data, encoding it with ``codec`` if it was decoded"""
+        if self.payload is not None:
+            return self.payload
+        return encode_payload(self._data, codec)
+
+    @property
+    def status(self) -> str:
+        return STATUS_NAMES[self.status_code]
+
+    @status.setter
+    def status(self, name: str) -> None:
+        self.status_code = STATUS_CODES[name]
+
+    # Mapping view
+
+    def __getitem__(self, key: str) -> Any:
+        getter = _GETTERS.get(key)
+        if getter is not None:
+            value = getter(self)
+            if value is not None:
+                return value
+        elif self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        getter = _GETTERS.get(key)
+        if getter is not None:
+            value = getter(self)
+            return default if value is None else value
+        if self.extra is not None:
+            return self.extra.get(key, default)
+        return default
+
+    def __contains__(self, key: object) -> bool:
+        present = _PRESENT.get(key)
+        if present is not None:
+            return present(self)
+        return self.extra is not None and key in self.extra
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        setter = _SETTERS.get(key)
+        if setter is not None:
+            setter(self, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        if key in _SETTERS:
+            _SETTERS[key](self, None)
+        else:
+            del self.extra[key]
+
+    def pop(self, key: str, *default: Any) -> Any:
+        if key in self:
+            value = self[key]
+            del self[key]
+            return value
+        if default:
+            return default[0]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        for key, present in _PRESENT.items():
+            if present(self):
+                yield key
+        if self.extra:
+            yield from list(self.extra)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __bool__(self) -> bool:
+        return True
+
+    def __eq__(self, other: object) -> bool:
+        # Messages are entities: compare by identity, not by field values
+        return self is other
+
+    __hash__ = object.__hash__
+
+    def __repr__(self) -> str:
+        return f"Message(id={self.id!r}, status={self.status!r}, attempt={self.attempt})"
+
+    def __reduce__(self):
+        return _restore_message, tuple(getattr(self, slot) for slot in Message.__slots__)
+
+def _restore_message(*values: Any) -> Message:
+    message = Message.__new__(Message)
+    # Records pickled before a slot was added lack its value
+    values = values[:-1] + (None,) * (len(Message.__slots__) - len(values)) + values[-1:]
+    for slot, value in zip(Message.__slots__, values):
+        setattr(message, slot, value)
+    return message
+
+def _get_failure_count(message: Message) -> Optional[Dict[str, int]]:
+    counts = message.failure_counts
+    if counts is None:
+        return None
+    return {FAILURE_TYPES[code].value: count for code, count in enumerate(counts) if count}
+
+def _set_failure_count(message: Message, value: Optional[Dict[str, int]]) -> None:
+    if not value:
+        message.failure_counts = None
+        return
+    counts = [0] * len(FAILURE_TYPES)
+    for name, count in value.items():
+        counts[FAILURE_CODES[name]] = count
+    message.failure_counts = counts
+
+def _get_last_failure(message: Message) -> Optional[Dict[str, Any]]:
+    if message.last_failure_code is None:
+        return None
+    return {
+        'type': FAILURE_TYPES[message.last_failure_code].value,
+        'timestamp': to_isoformat(message.last_failure_at),
+        'attempt': message.last_failure_attempt,
+    }
+
+def _set_last_failure(message: Message, value: Optional[Dict[str, Any]]) -> None:
+    if value is None:
+        message.last_failure_code = message.last_failure_at = message.last_failure_attempt = None
+        return
+    message.last_failure_code = FAILURE_CODES[value['type']]
+    message.last_failure_at = to_epoch(value.get('timestamp')) or time.time()
+    message.last_failure_attempt = value.get('attempt')
+
+def _get_next_process_time(message: Message) -> Optional[datetime]:
+    if message.next_process_at is None:
+        return None
+    return datetime.fromtimestamp(message.next_process_at, UTC)
+
+def _set_attr(name: str, convert=None):
+    if convert is None:
+        return lambda message, value: setattr(message, name, value)
+    return lambda message, value: setattr(message, name, None if value is None else convert(value))
+
+_GETTERS = {
+    'id': lambda message: message.id,
+    'data': lambda message: message.data,
+    'attempt': lambda message: message.attempt,
+    'timestamp': lambda message: to_isoformat(message.created_at),
+    'status': lambda message: STATUS_NAMES[message.status_code],
+    'error': lambda message: message.error,
+    'failure_count': _get_failure_count,
+    'last_failure': _get_last_failure,
+    'next_process_time': _get_next_process_time,
+    'requires_resource_check': lambda message: message.requires_resource_check,
+    'priority': lambda message: message.priority,
+    'expires_at': lambda message: message.expires_at,
+}
+
+# Presence checks for ``in``, iteration and ``len``; 'data' is checked
+# without decoding the payload
+_PRESENT = {key: (lambda message, getter=getter: getter(message) is not None)
+            for key, getter in _GETTERS.items()}
+_PRESENT['data'] = lambda message: message.payload is not None or message._data is not None
+
+_SETTERS = {
+    'id': _set_attr('id'),
+    'data': _set_attr('data'),
+    'attempt': _set_attr('attempt'),
+    'timestamp': lambda message, value: setattr(message, 'created_at', to_epoch(value) or time.time()),
+    'status': lambda message, value: setattr(message, 'status_code', STATUS_CODES[value]),
+    'error': _set_attr('error'),
+    'failure_count': _set_failure_count,
+    'last_failure': _set_last_failure,
+    'next_process_time': _set_attr('next_process_at', to_epoch),
+    'requires_resource_check': _set_attr('requires_resource_check'),
+    'priority': _set_attr('priority'),
+    'expires_at': _set_attr('expires_at', to_epoch),
+}
@@ -0,0 +1,260 @@
+import http.server
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Any, Callable, List, Optional, Sequence, Tuple
+from . import config
+
+class _Sharded:
+    """Per-thread storage, so recording never takes a lock.
+
+    Each thread updates its own shard and readers sum the shards, instead
+    of every thread contending on one lock-protected value.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[Any] = []
+
+    def _new_shard(self) -> Any:
+        raise NotImplementedError
+
+    def _shard(self) -> Any:
+        shard = self._new_shard()
+        self._local.shard = shard
+        self._shards.append(shard)
+        return shard
+
+class Counter(_Sharded):
+    """Monotonic count, optionally split by one label"""
+
+    def __init__(self, name: str, help: str, label: Optional[str] = None):
+        super().__init__()
+        self.name = name
+        self.help = help
+        self.label = label
+
+    def _new_shard(self) -> Dict[Optional[str], float]:
+        return {}
+
+    def inc(self, amount: float = 1, label_value: Optional[str] = None) -> None:
+        local = self._local
+        try:
+            shard = local.shard
+        except AttributeError:
+            shard = self._shard()
+        shard[label_value] = shard.get(label_value, 0) + amount
+
+    def values(self) -> Dict[Optional[str], float]:
+        totals: Dict[Optional[str], float] = {} if self.label else {None: 0}
+        for shard in list(self._shards):
+            for key, value in list(shard.items()):
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+class Histogram(_Sharded):
+    """Fixed-bucket histogram of durations in seconds.
+
+    ``observe`` is one bisect over the bucket bounds plus two additions
+    on the calling thread's shard.
+    """
+
+    def __init__(self, name: str, help: str, buckets: Optional[Sequence[float]] = None):
+        super().__init__()
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets or config.METRICS_LATENCY_BUCKETS))
+
+    def _new_shard(self) -> List[float]:
+        # One count per bucket, then +Inf, then the sum of observations
+        return [0] * (len(self.buckets) + 2)
+
+    def observe(self, value: float) -> None:
+        local = self._local
+        try:
+            shard = local.shard
+        except AttributeError:
+            shard = self._shard()
+        shard[bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+
+    def totals(self) -> Tuple[List[int], float]:
+        """Return non-cumulative counts per bucket (last is +Inf) and the sum"""
+        counts = [0] * (len(self.buckets) + 1)
+        total = 0.0
+        for shard in list(self._shards):
+            shard = list(shard)
+            for i in range(len(counts)):
+                counts[i] += shard[i]
+            total += shard[-1]
+        return counts, total
+
+    def snapshot(self) -> Dict[str, Any]:
+        counts, total = self.totals()
+        count = sum(counts)
+        return {
+            'count': count,
+            'sum': total,
+            'mean': total / count if count else 0.0,
+            'p50': self.quantile(0.5, counts),
+            'p99': self.quantile(0.99, counts),
+            'buckets': dict(zip([*self.buckets, float('inf')], counts)),
+        }
+
+    def quantile(self, q: float, counts: Optional[List[int]] = None) -> float:
+        """Upper bound of the bucket holding the ``q`` quantile"""
+        if counts is None:
+            counts, _ = self.totals()
+        target = q * sum(counts)
+        seen = 0
+        for bound, count in zip([*self.buckets, float('inf')], counts):
+            seen += count
+            if count and seen >= target:
+                return bound
+        return 0.0
+
+class Metrics:
+    """Registry of counters, histograms and gauges with exporters.
+
+    Gauges are read from ``sources`` (callables returning name -> value,
+    e.g. ``QueueSystem.monitor_health``) when a snapshot is taken, and
+    summed when several queues share one registry.
+    """
+
+    def __init__(self, prefix: str = 'queue'):
+        self.prefix = prefix
+        self.started_at = time.time()
+        self.counters: List[Counter] = []
+        self.histograms: List[Histogram] = []
+        self.sources: List[Callable[[], Dict[str, float]]] = []
+
+    def counter(self, name: str, help: str, label: Optional[str] = None) -> Counter:
+        counter = Counter(f"{self.prefix}_{name}", help, label)
+        self.counters.append(counter)
+        return counter
+
+    def histogram(self, name: str, help: str,
+                  buckets: Optional[Sequence[float]] = None) -> Histogram:
+        histogram = Histogram(f"{self.prefix}_{name}", help, buckets)
+        self.histograms.append(histogram)
+        return histogram
+
+    def gauges(self) -> Dict[str, float]:
+        totals: Dict[str, float] = {}
+        for source in self.sources:
+            for name, value in source().items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return every metric as plain values"""
+        counters = {}
+        for counter in self.counters:
+            values = counter.values()
+            counters[counter.name] = values[None] if counter.label is None else values
+        return {
+            'time': time.time(),
+            'uptime': time.time() - self.started_at,
+            'counters': counters,
+            'histograms': {histogram.name: histogram.snapshot() for histogram in self.histograms},
+            'gauges': self.gauges(),
+        }
+
+    @staticmethod
+    def throughput(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, float]:
+        """Per-second rate of each unlabelled counter between two snapshots"""
+        elapsed = after['time'] - before['time']
+        if elapsed <= 0:
+            return {}
+        return {name: (value - before['counters'].get(name, 0)) / elapsed
+                for name, value in after['counters'].items() if not isinstance(value, dict)}
+
+    def to_prometheus(self) -> str:
+        """Render the metrics in the Prometheus text exposition format"""
+        lines = []
+        for counter in self.counters:
+            lines.append(f"# HELP {counter.name} {counter.help}")
+            lines.append(f"# TYPE {counter.name} counter")
+            for label_value, value in sorted(counter.values().items(), key=lambda item: str(item[0])):
+                labels = '' if label_value is None else f'{{{counter.label}="{_escape(label_value)}"}}'
+                lines.append(f"{counter.name}{labels} {_number(value)}")
+        for histogram in self.histograms:
+            counts, total = histogram.totals()
+            lines.append(f"# HELP {histogram.name} {histogram.help}")
+            lines.append(f"# TYPE {histogram.name} histogram")
+            cumulative = 0
+            for bound, count in zip([*histogram.buckets, '+Inf'], counts):
+                cumulative += count
+                lines.append(f'{histogram.name}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f"{histogram.name}_sum {_number(total)}")
+            lines.append(f"{histogram.name}_count {cumulative}")
+        for name, value in self.gauges().items():
+            name = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str) -> None:
+        """Write the text format atomically, e.g. for node_exporter's textfile collector"""
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(temporary, path)
+
+    def serve(self, port: int = 0, host: str = '127.0.0.1') -> http.server.ThreadingHTTPServer:
+        """Serve ``GET /metrics`` from a daemon thread; returns the server
+
+        ``port=0`` picks a free port (``server.server_address``); call
+        ``server.shutdown()`` to stop.
+        """
+        metrics = self
+
+        class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        server = http.server.ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        threading.Thread(target=server.serve_forever, name='queue-metrics-http',
+                         daemon=True).start()
+        return server
+
+class QueueMetrics(Metrics):
+    """The metrics recorded by ``QueueSystem``.
+
+    Dispatch and ack record the time since the message was enqueued, so
+    each costs one histogram observation; message counts come from the
+    histogram counts rather than separate counters.
+    """
+
+    def __init__(self, buckets: Optional[Sequence[float]] = None, prefix: str = 'queue'):
+        super().__init__(prefix)
+        self.enqueued = self.counter('enqueued_total', 'Messages enqueued')
+        self.failures = self.counter('failures_total', 'Failed deliveries by failure type',
+                                     'failure_type')
+        self.retries = self.counter('retries_total', 'Retries scheduled by failure type',
+                                    'failure_type')
+        self.expired = self.counter('expired_total', 'Messages whose TTL passed before dispatch')
+        self.dead_lettered = self.counter('dead_lettered_total',
+                                          'Messages moved to the dead letter queue by failure type',
+                                          'failure_type')
+        self.wait = self.histogram('wait_seconds', 'Time from enqueue to dispatch', buckets)
+        self.latency = self.histogram('ack_latency_seconds', 'Time from enqueue to ack', buckets)
+        self.handler = self.histogram('handler_seconds', 'Handler run time', buckets)
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
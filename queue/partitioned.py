@@ -0,0 +1,256 @@
+import itertools
+import logging
+import threading
+import time
+import zlib
+from collections.abc import Mapping
+from typing import Dict, Any, List, Optional, Callable, Hashable
+from .failures import FailureType
+from .manager import QueueSystem
+from .metrics import QueueMetrics
+
+class PartitionedQueueSystem:
+    """Messages spread over independent ``QueueSystem`` shards by key.
+
+    ``message[key]`` (e.g. ``user_id``) is hashed with CRC32 onto one of
+    ``partitions`` shards, so every message for a key lands on the same
+    shard, in order, and the hash is stable across restarts.  Messages
+    without the key are spread round robin.  Each shard has its own lock,
+    processing map, scheduler and dead letter queue.
+
+    Consumers ``join`` to be assigned a set of shards and ``leave`` to
+    hand them back; every membership change rebalances the shards over
+    the current consumers.  Per-key order holds while each shard has a
+    single consumer working one message at a time, as ``run`` does; a
+    shard that moves during a rebalance is only picked up once its
+    previous owner has finished the message it was working on.  Retried
+    messages go back through their shard's retry schedule and may be
+    overtaken.
+
+    Shards built by the default factory share one ``QueueMetrics``,
+    exposed as ``metrics``.
+    """
+
+    def __init__(self, partitions: int = 4, key: str = 'user_id',
+                 shard_factory: Optional[Callable[[int], QueueSystem]] = None,
+                 **queue_options: Any):
+        if partitions < 1:
+            raise ValueError(f"partitions must be at least 1, got {partitions}")
+        if shard_factory is None:
+            # Shards record into one registry; its gauges sum over them
+            queue_options.setdefault('metrics', QueueMetrics())
+            shard_factory = lambda index: QueueSystem(**queue_options)
+        self.key = key
+        self.shards: List[QueueSystem] = [shard_factory(index) for index in range(partitions)]
+        self.metrics = self.shards[0].metrics
+        self.logger = logging.getLogger(__name__)
+        self._round_robin = itertools.count()
+        # Held by the run() worker with a message in flight from the shard
+        self._shard_locks = [threading.Lock() for _ in self.shards]
+
+        # Consumer group membership; generation bumps on every rebalance
+        self._group_lock = threading.Lock()
+        self._consumers: List[Hashable] = []
+        self._assignments: Dict[Hashable, List[int]] = {}
+        self.generation = 0
+
+    # Routing
+
+    def partition_for(self, data: Any) -> int:
+        """Return the shard index for a message payload"""
+        value = data.get(self.key) if isinstance(data, Mapping) else None
+        if value is None:
+            return next(self._round_robin) % len(self.shards)
+        return zlib.crc32(str(value).encode()) % len(self.shards)
+
+    def shard_of(self, message_id: int) -> Optional[QueueSystem]:
+        """Return the shard holding a pending, in-flight or scheduled message"""
+        for shard in self.shards:
+            if message_id in shard.processing or message_id in shard.queue \
+                    or message_id in shard.scheduled:
+                return shard
+        return None
+
+    # Producers
+
+    def enqueue(self, message: Dict[str, Any], **options: Any) -> None:
+        """Add a message to its key's shard; options go to ``QueueSystem.enqueue``"""
+        self.shards[self.partition_for(message)].enqueue(message, **options)
+
+    def enqueue_many(self, messages: List[Dict[str, Any]], **options: Any) -> List[int]:
+        """Add messages with one batch per shard; returns ids in input order"""
+        groups: Dict[int, List[int]] = {}
+        for position, message in enumerate(messages):
+            groups.setdefault(self.partition_for(message), []).append(position)
+        ids: List[Optional[int]] = [None] * len(messages)
+        for index, positions in groups.items():
+            shard_ids = self.shards[index].enqueue_many([messages[p] for p in positions], **options)
+            for position, message_id in zip(positions, shard_ids):
+                ids[position] = message_id
+        return ids
+
+    # Consumer group
+
+    def join(self, consumer_id: Hashable) -> List[int]:
+        """Add a consumer and return the shard indexes it now owns"""
+        with self._group_lock:
+            if consumer_id not in self._assignments:
+                self._consumers.append(consumer_id)
+                self._rebalance()
+            return list(self._assignments[consumer_id])
+
+    def leave(self, consumer_id: Hashable) -> None:
+        """Remove a consumer and hand its shards to the others"""
+        with self._group_lock:
+            if consumer_id in self._assignments:
+                self._consumers.remove(consumer_id)
+                self._rebalance()
+
+    def assignment(self, consumer_id: Hashable) -> List[int]:
+        """Return the shard indexes currently owned by a consumer"""
+        with self._group_lock:
+            return list(self._assignments.get(consumer_id, ()))
+
+    def _rebalance(self) -> None:
+        self.generation += 1
+        self._assignments = {consumer_id: [] for consumer_id in self._consumers}
+        if self._consumers:
+            for index in range(len(self.shards)):
+                owner = self._consumers[index % len(self._consumers)]
+                self._assignments[owner].append(index)
+        self.logger.info(
+            f"Rebalanced {len(self.shards)} partitions over {len(self._consumers)} consumers "
+            f"(generation {self.generation})"
+        )
+
+    # Consumers
+
+    def dequeue(self, consumer_id: Optional[Hashable] = None, block: bool = False,
+                timeout: Optional[float] = None,
+                visibility_timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Take the next message from the consumer's shards (all shards by default)
+
+        Shards are tried in rotating order so one busy shard cannot starve
+        the rest.  With ``block`` the call waits up to ``timeout`` on the
+        first shard when all of them are empty.
+        """
+        indexes = self.assignment(consumer_id) if consumer_id is not None \
+            else list(range(len(self.shards)))
+        if not indexes:
+            return None
+        start = next(self._round_robin) % len(indexes)
+        for index in indexes[start:] + indexes[:start]:
+            message = self.shards[index].dequeue(visibility_timeout=visibility_timeout)
+            if message is not None:
+                return message
+        if not block:
+            return None
+        return self.shards[indexes[start]].dequeue(block=True, timeout=timeout,
+                                                   visibility_timeout=visibility_timeout)
+
+    def ack(self, message_id: int) -> bool:
+        shard = self.shard_of(message_id)
+        return shard is not None and shard.ack(message_id)
+
+    def nack(self, message_id: int, error: str = 'Negative acknowledgement',
+             failure_type: Optional[FailureType] = None) -> bool:
+        shard = self.shard_of(message_id)
+        return shard is not None and shard.nack(message_id, error, failure_type)
+
+    def extend_lease(self, message_id: int, seconds: Optional[float] = None) -> bool:
+        shard = self.shard_of(message_id)
+        return shard is not None and shard.extend_lease(message_id, seconds)
+
+    def run(self, handler: Callable[[Dict[str, Any]], Any], workers: Optional[int] = None,
+            stop_when_empty: bool = True, stop_event: Optional[threading.Event] = None,
+            poll_interval: float = 0.1) -> Dict[str, int]:
+        """Consume with ``workers`` threads (default one per shard)
+
+        Each worker joins the consumer group and processes one message at a
+        time from the shards it owns, which keeps per-key order.  Workers
+        leave the group on exit so their shards are rebalanced.
+        """
+        workers = workers or len(self.shards)
+        stop_event = stop_event or threading.Event()
+        counts = {'processed': 0, 'failed': 0}
+        counts_lock = threading.Lock()
+
+        def worker(consumer_id: str) -> None:
+            self.join(consumer_id)
+            try:
+                while not stop_event.is_set():
+                    index, message = self._next_message(self.assignment(consumer_id),
+                                                        poll_interval)
+                    if message is None:
+                        if stop_when_empty and self._is_idle():
+                            stop_event.set()
+                        continue
+                    try:
+                        succeeded = self.shards[index].process_message(message, handler)
+                    finally:
+                        self._shard_locks[index].release()
+                    result = 'processed' if succeeded else 'failed'
+                    with counts_lock:
+                        counts[result] += 1
+            finally:
+                self.leave(consumer_id)
+
+        started = [shard for shard in self.shards if shard._reaper is None]
+        for shard in started:
+            shard.start_reaper()
+        threads = [
+            threading.Thread(target=worker, args=(f"partition-worker-{i}",),
+                             name=f"partition-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for shard in started:
+            shard.stop_reaper()
+        return counts
+
+    def _next_message(self, indexes: List[int], wait: float):
+        """Return ``(shard index, message)`` from the owned shards
+
+        Polls each shard whose lock is free, then waits on the first free
+        one for up to ``wait``.  The shard lock stays held when a message
+        is returned; the caller releases it once the message is processed.
+        """
+        free = []
+        for index in indexes:
+            lock = self._shard_locks[index]
+            if not lock.acquire(blocking=False):
+                continue
+            message = self.shards[index].dequeue()
+            if message is not None:
+                return index, message
+            lock.release()
+            free.append(index)
+        if not free:
+            time.sleep(wait)
+            return None, None
+        index = free[0]
+        lock = self._shard_locks[index]
+        if not lock.acquire(timeout=wait):
+            return None, None
+        message = self.shards[index].dequeue(block=True, timeout=wait)
+        if message is None:
+            lock.release()
+        return index, message
+
+    def _is_idle(self) -> bool:
+        return all(shard._is_idle() for shard in self.shards)
+
+    def monitor_health(self) -> Dict[str, int]:
+        """Return queue health metrics summed over every shard"""
+        totals: Dict[str, int] = {}
+        for shard in self.shards:
+            for name, value in shard.monitor_health().items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    def partition_health(self) -> List[Dict[str, int]]:
+        """Return each shard's health metrics"""
+        return [shard.monitor_health() for shard in self.shards]
@@ -0,0 +1,209 @@
+import logging
+import multiprocessing
+import pickle
+from multiprocessing.connection import wait
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from . import utils
+from .failures import FailureType, MessageFailure
+from .message import Message
+
+PICKLE_PROTOCOL = 5
+# Encoded payloads at least this large travel as raw frames beside the pickle;
+# smaller ones are cheaper inline than as an extra send per message
+OUT_OF_BAND_BYTES = 4096
+
+def send_frames(conn, obj: Any) -> None:
+    """Pickle ``obj`` with protocol 5 and send it over a pipe.
+
+    Objects that support out-of-band pickling (``pickle.PickleBuffer``,
+    NumPy arrays, ...) are sent as separate raw frames straight from their
+    memory instead of being copied into the pickle stream.  Plain ``bytes``
+    are always pickled inline, so callers wrap large ones in
+    ``pickle.PickleBuffer``; they arrive as ``bytes`` again.
+    """
+    buffers = []
+    header = pickle.dumps(obj, protocol=PICKLE_PROTOCOL, buffer_callback=buffers.append)
+    conn.send_bytes(len(buffers).to_bytes(4, 'little') + header)
+    for buffer in buffers:
+        conn.send_bytes(buffer.raw())
+
+def recv_frames(conn) -> Any:
+    """Receive an object sent by ``send_frames``"""
+    frame = conn.recv_bytes()
+    count = int.from_bytes(frame[:4], 'little')
+    buffers = [conn.recv_bytes() for _ in range(count)]
+    return pickle.loads(memoryview(frame)[4:], buffers=buffers)
+
+def _batch_records(batch: List[Message]) -> List[Tuple[Any, ...]]:
+    """The ``(id, data, payload, attempt)`` tuples ``_worker_main`` expects.
+
+    Encoded payloads go as they are, without decoding; large ones are
+    wrapped in ``pickle.PickleBuffer`` so ``send_frames`` sends them
+    out-of-band.
+    """
+    records = []
+    for message in batch:
+        payload = message.payload
+        if payload is None:
+            records.append((message.id, message.data, None, message.attempt))
+            continue
+        if len(payload) >= OUT_OF_BAND_BYTES:
+            payload = pickle.PickleBuffer(payload)
+        records.append((message.id, None, payload, message.attempt))
+    return records
+
+def _worker_main(conn, handler: Callable[[Dict[str, Any]], Any], node_id: int) -> None:
+    """Worker process loop: run batches and report per-message outcomes"""
+    # Messages a handler enqueues locally must not reuse another process's ids
+    utils._id_generator.reseed(node_id)
+    while True:
+        try:
+            batch = recv_frames(conn)
+        except EOFError:
+            return
+        if batch is None:
+            return
+        results = []
+        for message_id, data, payload, attempt in batch:
+            message = Message(message_id, data, attempt=attempt)
+            # Decoded here only if the handler reads message['data']
+            message.payload = payload
+            try:
+                handler(message)
+            except MessageFailure as e:
+                results.append((message_id, str(e), e.failure_type.value))
+            except Exception as e:
+                results.append((message_id, str(e), None))
+            else:
+                results.append((message_id, None, None))
+        send_frames(conn, results)
+
+class ProcessWorkerPool:
+    """Runs a ``QueueSystem``'s messages through CPU-bound handlers in worker processes.
+
+    The parent keeps all queue state.  It sends each idle worker a batch of
+    ``(id, data, payload, attempt)`` tuples, leaving encoded data encoded,
+    and feeds the results back through ``QueueSystem.ack``/
+    ``handle_failure``, so retries, ``FailureType`` strategies and the DLQ
+    behave exactly as in thread mode.  If a worker dies, the messages it
+    held are recovered with ``recover_processing_messages`` and a
+    replacement is started.
+    """
+
+    def __init__(self, queue_system, handler: Callable[[Dict[str, Any]], Any],
+                 processes: Optional[int] = None, batch_size: int = 64,
+                 context: Optional[str] = None):
+        self.queue_system = queue_system
+        self.handler = handler
+        self.processes = processes or multiprocessing.cpu_count()
+        self.batch_size = batch_size
+        self._context = multiprocessing.get_context(context)
+        self._workers: List[Tuple[Any, Any]] = []
+        self._in_flight: Dict[int, List[Any]] = {}
+        self.logger = logging.getLogger(__name__)
+
+    def _spawn(self, index: int) -> Tuple[Any, Any]:
+        parent_conn, child_conn = self._context.Pipe()
+        # Distinct from this process's node id and from every other worker's
+        node_id = ((utils._id_generator.node_id + 1 + index)
+                   % (utils.MessageIdGenerator.MAX_NODE + 1))
+        process = self._context.Process(
+            target=_worker_main, args=(child_conn, self.handler, node_id), daemon=True
+        )
+        process.start()
+        child_conn.close()
+        return process, parent_conn
+
+    def _replace_worker(self, index: int) -> None:
+        process, conn = self._workers[index]
+        conn.close()
+        process.join(timeout=1)
+        self._workers[index] = self._spawn(index)
+
+    def _dispatch(self, index: int) -> bool:
+        """Send the next batch to an idle worker; False if nothing is pending"""
+        batch = self.queue_system.dequeue_batch(self.batch_size)
+        if not batch:
+            return False
+        self._in_flight[index] = [message['id'] for message in batch]
+        send_frames(self._workers[index][1], _batch_records(batch))
+        return True
+
+    def _complete(self, index: int) -> int:
+        results = recv_frames(self._workers[index][1])
+        del self._in_flight[index]
+        succeeded = [message_id for message_id, error, _ in results if error is None]
+        self.queue_system.ack_many(succeeded)
+        for message_id, error, failure_type in results:
+            if error is not None:
+                self.queue_system.nack(
+                    message_id, error, FailureType(failure_type) if failure_type else None
+                )
+        return len(succeeded)
+
+    def _recover(self, index: int) -> None:
+        message_ids = self._in_flight.pop(index, [])
+        self.logger.error(
+            f"Worker process {self._workers[index][0].pid} died with "
+            f"{len(message_ids)} messages in flight; recovering"
+        )
+        self.queue_system.recover_processing_messages(message_ids)
+        self._replace_worker(index)
+
+    def run(self, stop_when_empty: bool = True, poll_interval: float = 0.1) -> Dict[str, int]:
+        """Process messages until the queue is idle; returns outcome counts"""
+        counts = {'processed': 0, 'failed': 0, 'crashed_workers': 0}
+        self._workers = [self._spawn(index) for index in range(self.processes)]
+        try:
+            while True:
+                for index in range(len(self._workers)):
+                    if index not in self._in_flight:
+                        self._dispatch(index)
+                if not self._in_flight:
+                    if stop_when_empty and self.queue_system._is_idle():
+                        break
+                    self.queue_system.wait_next(timeout=poll_interval)
+                    continue
+
+                busy = {}
+                for index in self._in_flight:
+                    process, conn = self._workers[index]
+                    busy[conn] = index
+                    busy[process.sentinel] = index
+                for ready in wait(list(busy), timeout=poll_interval):
+                    index = busy[ready]
+                    if index not in self._in_flight:
+                        continue
+                    process, conn = self._workers[index]
+                    if ready is conn:
+                        try:
+                            size = len(self._in_flight[index])
+                            succeeded = self._complete(index)
+                        except (EOFError, OSError):
+                            counts['crashed_workers'] += 1
+                            self._recover(index)
+                            continue
+                        counts['processed'] += succeeded
+                        counts['failed'] += size - succeeded
+                    elif not process.is_alive():
+                        counts['crashed_workers'] += 1
+                        self._recover(index)
+        finally:
+            self.close()
+        return counts
+
+    def close(self) -> None:
+        """Stop all worker processes"""
+        for process, conn in self._workers:
+            try:
+                send_frames(conn, None)
+            except (OSError, ValueError):
+                pass
+        for process, conn in self._workers:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+            conn.close()
+        self._workers = []
+        self._in_flight = {}
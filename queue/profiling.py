@@ -0,0 +1,233 @@
+import os
+import sys
+import threading
+import time
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+# Instrumented phase -> (attribute holding the methods, method names).
+# 'handler' wraps the handler passed to process_message.
+PHASES: Dict[str, Tuple[Optional[str], Tuple[str, ...]]] = {
+    'enqueue': (None, ('enqueue', 'enqueue_many')),
+    'dispatch': (None, ('_take',)),
+    'handler': (None, ()),
+    'ack': (None, ('_complete',)),
+    'failure': (None, ('_handle_failure', '_handle_failures')),
+    'failure_strategy': ('failure_handler', ('handle_message_failure', 'handle_failures_batch')),
+    'dead_letter': (None, ('_move_to_dead_letter',)),
+    'logging': ('events', ('log',)),
+}
+
+class Hook:
+    """Base class for instrumentation hooks.
+
+    ``before`` runs as a phase starts and ``after`` once it returns or
+    raises, with the wall time it took.  ``args`` are the arguments of the
+    instrumented call (e.g. the message for ``dead_letter``).  Phases nest:
+    ``enqueue`` includes its ``logging``, ``failure`` its
+    ``failure_strategy`` and ``dead_letter``.
+    """
+
+    def before(self, phase: str, args: Tuple[Any, ...]) -> None:
+        pass
+
+    def after(self, phase: str, args: Tuple[Any, ...], elapsed: float) -> None:
+        pass
+
+def _call(hooks: List[Hook], phase: str, function: Callable, args: Tuple[Any, ...],
+          kwargs: Dict[str, Any]) -> Any:
+    for hook in hooks:
+        hook.before(phase, args)
+    start = time.perf_counter()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        for hook in hooks:
+            hook.after(phase, args, elapsed)
+
+def _wrap(function: Callable, phase: str, hooks: List[Hook]) -> Callable:
+    def instrumented(*args: Any, **kwargs: Any) -> Any:
+        return _call(hooks, phase, function, args, kwargs)
+    return instrumented
+
+def install_hooks(queue_system: Any, hooks: List[Hook]) -> None:
+    """Shadow the instrumented methods with timing wrappers on the instance
+
+    Uninstrumented queues keep calling the plain class methods, so hooks
+    cost nothing until one is added.  ``hooks`` is read on every call, so
+    hooks may be added to or removed from the list afterwards.
+    """
+    for phase, (owner, names) in PHASES.items():
+        target = queue_system if owner is None else getattr(queue_system, owner)
+        for name in names:
+            setattr(target, name, _wrap(getattr(target, name), phase, hooks))
+
+    process_message = queue_system.process_message
+    def instrumented_process_message(message: Dict[str, Any],
+                                     handler: Optional[Callable] = None) -> bool:
+        inner = handler or queue_system._simulate_processing
+        return process_message(message, _wrap(inner, 'handler', hooks))
+    queue_system.process_message = instrumented_process_message
+
+def uninstall_hooks(queue_system: Any) -> None:
+    """Restore the plain methods"""
+    for phase, (owner, names) in PHASES.items():
+        target = queue_system if owner is None else getattr(queue_system, owner)
+        for name in names:
+            target.__dict__.pop(name, None)
+    queue_system.__dict__.pop('process_message', None)
+
+class _PhaseStacks(Hook):
+    """Tracks the phases each thread is currently inside"""
+
+    def __init__(self):
+        self._stacks: Dict[int, List[list]] = {}
+
+    def _stack(self) -> List[list]:
+        ident = threading.get_ident()
+        stack = self._stacks.get(ident)
+        if stack is None:
+            stack = self._stacks[ident] = []
+        return stack
+
+    def current_phase(self, ident: int) -> Optional[str]:
+        stack = self._stacks.get(ident)
+        try:
+            return stack[-1][0] if stack else None
+        except IndexError:
+            return None
+
+    def before(self, phase: str, args: Tuple[Any, ...]) -> None:
+        # [phase, time spent in nested phases]
+        self._stack().append([phase, 0.0])
+
+class PhaseTimer(_PhaseStacks):
+    """Aggregates call counts and timings per phase.
+
+    ``total`` is inclusive wall time; ``self`` excludes nested phases, so
+    the ``self`` column answers where the time goes (handler, failure
+    strategy, logging, or the queue's own bookkeeping).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self.stats: Dict[str, List[float]] = {}  # phase -> [calls, total, self, max]
+
+    def after(self, phase: str, args: Tuple[Any, ...], elapsed: float) -> None:
+        stack = self._stack()
+        if not stack:
+            return  # the phase started before this hook was added
+        _, nested = stack.pop()
+        if stack:
+            stack[-1][1] += elapsed
+        with self._lock:
+            stats = self.stats.get(phase)
+            if stats is None:
+                stats = self.stats[phase] = [0, 0.0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] += elapsed - nested
+            if elapsed > stats[3]:
+                stats[3] = elapsed
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                phase: {'calls': calls, 'total': total, 'self': own, 'max': longest,
+                        'mean': total / calls if calls else 0.0}
+                for phase, (calls, total, own, longest) in self.stats.items()
+            }
+
+    def report(self) -> str:
+        """Format the timings as a table, largest self time first"""
+        rows = sorted(self.snapshot().items(), key=lambda item: item[1]['self'], reverse=True)
+        lines = [f"{'phase':<18}{'calls':>10}{'total s':>12}{'self s':>12}{'mean us':>12}"]
+        for phase, stats in rows:
+            lines.append(f"{phase:<18}{stats['calls']:>10}{stats['total']:>12.4f}"
+                         f"{stats['self']:>12.4f}{stats['mean'] * 1e6:>12.1f}")
+        return '\n'.join(lines)
+
+class SamplingProfiler(_PhaseStacks):
+    """Samples every thread's stack on a timer while a queue is instrumented.
+
+    Each sample is tagged with the phase the thread was in (``idle`` for
+    none), so samples aggregate per phase, and the stacks are written in
+    the collapsed format ``flamegraph.pl`` and speedscope read
+    (``phase;outer;...;inner count``).  Sampling costs the profiled
+    threads one ``before``/``after`` pair per phase plus a GIL hand-off
+    per ``interval``.
+    """
+
+    def __init__(self, queue_system: Any = None, interval: float = 0.005):
+        super().__init__()
+        self.queue_system = queue_system
+        self.interval = interval
+        self.samples: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def after(self, phase: str, args: Tuple[Any, ...], elapsed: float) -> None:
+        stack = self._stack()
+        if stack:
+            stack.pop()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        if self.queue_system is not None:
+            self.queue_system.add_hook(self)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample_loop, name='queue-profiler',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join()
+        if self.queue_system is not None:
+            self.queue_system.remove_hook(self)
+
+    def __enter__(self) -> 'SamplingProfiler':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def _sample_loop(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self.sample(ident, frame)
+
+    def sample(self, ident: int, frame: Any) -> None:
+        """Record one stack for thread ``ident``"""
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        frames.append(self.current_phase(ident) or 'idle')
+        key = ';'.join(reversed(frames))
+        self.samples[key] = self.samples.get(key, 0) + 1
+
+    def phase_samples(self) -> Dict[str, int]:
+        """Return sample counts per phase; multiply by ``interval`` for seconds"""
+        totals: Dict[str, int] = {}
+        for key, count in self.samples.items():
+            phase = key.split(';', 1)[0]
+            totals[phase] = totals.get(phase, 0) + count
+        return totals
+
+    def collapsed(self) -> str:
+        return ''.join(f"{key} {count}\n" for key, count in sorted(self.samples.items()))
+
+    def dump(self, path: str) -> None:
+        """Write the collapsed stacks, e.g. for ``flamegraph.pl path > queue.svg``"""
+        with open(path, 'w') as f:
+            f.write(self.collapsed())
@@ -0,0 +1,115 @@
+import random
+from typing import Dict, Any, Callable, Optional, Tuple
+from . import config
+from .failures import FailureType
+
+# strategy -> (checks the circuit breaker, sets requires_resource_check, retry log message)
+STRATEGIES: Dict[str, Tuple[bool, bool, str]] = {
+    'retry': (False, False, "Message %(message_id)s scheduled for retry in %(delay).1fs"),
+    'retry_with_timeout': (False, False,
+                           "Message %(message_id)s scheduled for retry with %(delay).1fs timeout"),
+    'retry_with_backoff': (False, False,
+                           "Message %(message_id)s scheduled for retry with %(delay).1fs backoff"),
+    'retry_with_circuit_breaker': (True, False,
+                                   "Message %(message_id)s scheduled for retry after circuit breaker"),
+    'retry_when_available': (False, True,
+                             "Message %(message_id)s waiting for resource availability"),
+    'dead_letter': (False, False, ""),
+}
+
+def _decorrelated(delay: float, policy: 'RetryPolicy', previous: Optional[float],
+                  rand: Callable[[], float]) -> float:
+    # [base, 3 * previous delay), capped; grows from the last delay, not the count
+    high = max(policy.base_delay, (previous or policy.base_delay) * 3)
+    return min(policy.max_delay, policy.base_delay + (high - policy.base_delay) * rand())
+
+# Jitter spreads retries that failed together over a window instead of
+# firing them all at one deadline.  Each takes (delay, policy, previous
+# delay, rand) and returns the delay to use.
+JITTER: Dict[str, Callable[[float, 'RetryPolicy', Optional[float], Callable[[], float]], float]] = {
+    'none': lambda delay, policy, previous, rand: delay,
+    # [0, delay)
+    'full': lambda delay, policy, previous, rand: delay * rand(),
+    # [delay / 2, delay): each retry still waits longer than the last
+    'equal': lambda delay, policy, previous, rand: delay * (0.5 + 0.5 * rand()),
+    'decorrelated': _decorrelated,
+}
+
+class RetryPolicy:
+    """Retry schedule for one failure type, compiled to a table of delays.
+
+    ``delays[n - 1]`` is the un-jittered delay after the n-th failure:
+    ``base_delay`` doubling per failure up to ``max_delay`` for
+    ``exponential`` backoff, ``base_delay`` every time for ``fixed``.
+    Delays default to ``config.BASE_RETRY_DELAY`` and ``MAX_RETRY_DELAY``.
+    Failures past ``max_retries`` (or any failure under the
+    ``dead_letter`` strategy) dead-letter the message.
+    """
+
+    __slots__ = ('strategy', 'max_retries', 'base_delay', 'max_delay', 'backoff', 'jitter',
+                 'delays', 'circuit_breaker', 'resource_check', 'log_message', '_jitter')
+
+    def __init__(self, strategy: str = 'retry', max_retries: int = 3,
+                 base_delay: Optional[float] = None, max_delay: Optional[float] = None,
+                 backoff: str = 'exponential', jitter: str = 'full'):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown retry strategy: {strategy}")
+        if backoff not in ('exponential', 'fixed'):
+            raise ValueError(f"Unknown backoff: {backoff}")
+        if jitter not in JITTER:
+            raise ValueError(f"Unknown jitter: {jitter}")
+        if base_delay is None:
+            base_delay = config.BASE_RETRY_DELAY
+        if max_delay is None:
+            max_delay = config.MAX_RETRY_DELAY
+        self.strategy = strategy
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max(base_delay, max_delay)
+        self.backoff = backoff
+        self.jitter = jitter
+        self.circuit_breaker, self.resource_check, self.log_message = STRATEGIES[strategy]
+        self._jitter = JITTER[jitter]
+        if strategy == 'dead_letter':
+            self.delays: Tuple[float, ...] = ()
+        elif backoff == 'fixed':
+            self.delays = (base_delay,) * max_retries
+        else:
+            self.delays = tuple(min(base_delay * 2 ** n, self.max_delay) for n in range(max_retries))
+
+    def strategy_for(self, failure_count: int) -> str:
+        """Return the strategy for a message that has failed ``failure_count`` times"""
+        return self.strategy if failure_count <= len(self.delays) else 'dead_letter'
+
+    def delay(self, failure_count: int, previous: Optional[float] = None,
+              rand: Callable[[], float] = random.random) -> float:
+        """Return the jittered delay before retry ``failure_count``
+
+        ``previous`` is the delay used last time; only ``decorrelated``
+        jitter reads it.  ``rand`` returns floats in [0, 1).
+        """
+        # Counts below 1 get the first delay rather than indexing from the end
+        delay = self.delays[max(min(failure_count, len(self.delays)), 1) - 1]
+        return self._jitter(delay, self, previous, rand)
+
+    def __repr__(self) -> str:
+        return (f"RetryPolicy({self.strategy!r}, max_retries={self.max_retries}, "
+                f"delays={self.delays}, jitter={self.jitter!r})")
+
+def compile_policies(policies: Optional[Dict[str, Dict[str, Any]]] = None,
+                     max_retries: Optional[Dict[str, int]] = None) -> Dict[FailureType, RetryPolicy]:
+    """Build a ``RetryPolicy`` per ``FailureType`` from config-style dicts
+
+    Both are keyed by failure type name (``'NETWORK'``); they default to
+    ``config.RETRY_POLICIES`` and ``config.MAX_RETRIES``.  A ``max_retries``
+    entry inside a policy overrides the ``MAX_RETRIES`` one.  Types
+    missing from ``policies`` use the plain ``retry`` strategy.
+    """
+    policies = config.RETRY_POLICIES if policies is None else policies
+    max_retries = config.MAX_RETRIES if max_retries is None else max_retries
+    compiled = {}
+    for failure_type in FailureType:
+        options = dict(policies.get(failure_type.name, {}))
+        options.setdefault('max_retries', max_retries.get(failure_type.name, 0))
+        compiled[failure_type] = RetryPolicy(**options)
+    return compiled
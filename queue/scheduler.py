@@ -0,0 +1,157 @@
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime, UTC
+from typing import Dict, Any, List, Optional, Hashable
+from .message import Message
+
+def message_deadline(message: Dict[str, Any]) -> Optional[float]:
+    """Return the epoch time a message is due for retry, if it has one.
+
+    Understands both ``next_process_time`` (a datetime set by
+    ``FailureHandler``) and ``next_retry`` (epoch seconds set by the
+    legacy ``queue_manager.QueueSystem``).
+    """
+    if isinstance(message, Message):
+        if message.next_process_at is not None:
+            return message.next_process_at
+        next_retry = message.get('next_retry')
+        return None if next_retry is None else float(next_retry)
+    next_time = message.get('next_process_time')
+    if isinstance(next_time, datetime):
+        if next_time.tzinfo is None:
+            next_time = next_time.replace(tzinfo=UTC)
+        return next_time.timestamp()
+    if isinstance(next_time, (int, float)):
+        return float(next_time)
+    next_retry = message.get('next_retry')
+    if next_retry is not None:
+        return float(next_retry)
+    return None
+
+class RetryScheduler:
+    """Min-heap of messages waiting for their retry deadline.
+
+    Scheduling and popping a due message are O(log n); cancelled entries
+    are dropped lazily when they reach the top of the heap.  Once they
+    make up more than half of it, the heap is rebuilt without them, so
+    cancelling stays amortized O(1) and the heap never grows beyond twice
+    the scheduled messages (leases are cancelled on every ack).
+    """
+
+    # Heaps smaller than this are never compacted
+    COMPACT_MIN = 64
+
+    def __init__(self):
+        self._heap: List[list] = []
+        self._entries: Dict[Hashable, list] = {}
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._wakeups = 0
+
+    def schedule(self, message: Dict[str, Any], deadline: Optional[float] = None) -> None:
+        """Park a message until ``deadline`` (epoch seconds)"""
+        if deadline is None:
+            deadline = message_deadline(message)
+        if deadline is None:
+            deadline = time.time()
+        with self._condition:
+            self._cancel(message['id'])
+            entry = [deadline, next(self._counter), message]
+            self._entries[message['id']] = entry
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] is entry:
+                # New earliest deadline: wake sleepers so they re-arm
+                self._condition.notify_all()
+
+    def cancel(self, message_id: Hashable) -> Optional[Dict[str, Any]]:
+        """Remove a scheduled message by id"""
+        with self._condition:
+            return self._cancel(message_id)
+
+    def _cancel(self, message_id: Hashable) -> Optional[Dict[str, Any]]:
+        entry = self._entries.pop(message_id, None)
+        if entry is None:
+            return None
+        message = entry[2]
+        entry[2] = None
+        self._discard_cancelled()
+        heap = self._heap
+        if len(heap) > self.COMPACT_MIN and len(heap) > 2 * len(self._entries):
+            heap[:] = [entry for entry in heap if entry[2] is not None]
+            heapq.heapify(heap)
+        return message
+
+    def _discard_cancelled(self) -> None:
+        while self._heap and self._heap[0][2] is None:
+            heapq.heappop(self._heap)
+
+    def next_deadline(self) -> Optional[float]:
+        """Return the earliest outstanding deadline"""
+        with self._condition:
+            self._discard_cancelled()
+            return self._heap[0][0] if self._heap else None
+
+    def dequeue_ready(self, now: Optional[float] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Pop and return the messages whose deadline is at or before ``now``"""
+        with self._condition:
+            return self._pop_due(time.time() if now is None else now, limit)
+
+    def _pop_due(self, now: float, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        ready = []
+        heap = self._heap
+        while heap and (limit is None or len(ready) < limit):
+            deadline, _, message = heap[0]
+            if message is None:
+                heapq.heappop(heap)
+                continue
+            if deadline > now:
+                break
+            heapq.heappop(heap)
+            del self._entries[message['id']]
+            ready.append(message)
+        return ready
+
+    def wait_next(self, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Block until the earliest deadline passes and return the due messages.
+
+        Sleeps on a condition variable rather than polling; scheduling an
+        earlier message wakes the sleeper so it re-arms its timer.  Returns
+        an empty list if ``timeout`` expires first or ``wake`` is called.
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            wakeups = self._wakeups
+            while True:
+                if self._wakeups != wakeups:
+                    return []
+                now = time.time()
+                ready = self._pop_due(now)
+                if ready:
+                    return ready
+                self._discard_cancelled()
+                wait = None if not self._heap else max(self._heap[0][0] - now, 0)
+                if end is not None:
+                    remaining = end - time.monotonic()
+                    if remaining <= 0:
+                        return []
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._condition.wait(wait)
+
+    def wake(self) -> None:
+        """Make threads blocked in ``wait_next`` return early"""
+        with self._condition:
+            self._wakeups += 1
+            self._condition.notify_all()
+
+    def messages(self) -> List[Dict[str, Any]]:
+        """Return the scheduled messages in no particular order"""
+        with self._condition:
+            return [entry[2] for entry in self._entries.values()]
+
+    def __contains__(self, message_id: Hashable) -> bool:
+        return message_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
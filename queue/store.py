@@ -0,0 +1,234 @@
+from collections import OrderedDict
+from collections.abc import Mapping
+from itertools import islice
+from typing import Dict, Any, Iterator, List, Optional, Hashable
+from . import config
+
+class PendingQueue:
+    """FIFO store of pending messages indexed by message id.
+
+    Backed by an ``OrderedDict`` (a hash map threaded through a doubly
+    linked list), so append, pop from the head, and removal by id are all
+    O(1).  The list-style helpers (``append``, ``remove``, ``[0]``) keep
+    existing callers of ``QueueSystem.queue`` working unchanged.
+    """
+
+    def __init__(self):
+        self._messages: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+
+    def append(self, message: Dict[str, Any]) -> None:
+        """Add a message to the tail of the queue"""
+        message_id = message['id']
+        if message_id in self._messages:
+            raise ValueError(f"Message {message_id} is already pending")
+        self._messages[message_id] = message
+
+    def appendleft(self, message: Dict[str, Any]) -> None:
+        """Add a message to the head of the queue"""
+        self.append(message)
+        self._messages.move_to_end(message['id'], last=False)
+
+    def popleft(self) -> Dict[str, Any]:
+        """Remove and return the message at the head of the queue"""
+        if not self._messages:
+            raise IndexError("pop from an empty queue")
+        return self._messages.popitem(last=False)[1]
+
+    def peek(self) -> Optional[Dict[str, Any]]:
+        """Return the message at the head of the queue without removing it"""
+        if not self._messages:
+            return None
+        return next(iter(self._messages.values()))
+
+    def get(self, message_id: Hashable) -> Optional[Dict[str, Any]]:
+        """Look up a pending message by id"""
+        return self._messages.get(message_id)
+
+    def discard(self, message_id: Hashable) -> Optional[Dict[str, Any]]:
+        """Remove a message by id, returning it if it was pending"""
+        return self._messages.pop(message_id, None)
+
+    def remove(self, message: Dict[str, Any]) -> None:
+        """Remove a message, raising ValueError if it is not pending"""
+        if self._messages.pop(message['id'], None) is None:
+            raise ValueError(f"Message {message['id']} is not pending")
+
+    def clear(self) -> None:
+        self._messages.clear()
+
+    def __contains__(self, message: Any) -> bool:
+        if isinstance(message, Mapping):
+            return message.get('id') in self._messages
+        return message in self._messages
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __bool__(self) -> bool:
+        return bool(self._messages)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(list(self._messages.values()))
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        """Positional access; O(1) for the head and tail, O(n) otherwise"""
+        size = len(self._messages)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("queue index out of range")
+        if index == size - 1:
+            return next(reversed(self._messages.values()))
+        return next(islice(self._messages.values(), index, None))
+
+class PriorityPendingQueue:
+    """Pending messages bucketed by priority level, dequeued by weight.
+
+    Each level (``message['priority']``, default ``default_priority``) is
+    its own ``PendingQueue``.  ``popleft`` picks a level by smooth weighted
+    round robin over the non-empty levels: with weights 8/4/2/1 the top
+    level gets 8 of every 15 dequeues under contention, while the lowest
+    still gets 1, so nothing starves.  The number of levels is fixed, so
+    every operation stays O(1).  Iteration and indexing run from the
+    highest level to the lowest, FIFO within a level.
+    """
+
+    def __init__(self, weights: Optional[Dict[str, int]] = None,
+                 default_priority: Optional[str] = None):
+        self.weights = dict(config.PRIORITY_WEIGHTS if weights is None else weights)
+        self.default_priority = default_priority or config.DEFAULT_PRIORITY
+        if self.default_priority not in self.weights:
+            raise ValueError(f"Default priority {self.default_priority!r} has no weight")
+        self._names = list(self.weights)
+        self._index = {name: index for index, name in enumerate(self._names)}
+        self._weights = [self.weights[name] for name in self._names]
+        self._levels: List[PendingQueue] = [PendingQueue() for _ in self._names]
+        self._credit = [0] * len(self._names)
+        self._size = 0
+
+    def _level(self, message: Dict[str, Any]) -> PendingQueue:
+        priority = message.get('priority') or self.default_priority
+        index = self._index.get(priority)
+        if index is None:
+            raise ValueError(f"Unknown priority {priority!r}")
+        return self._levels[index]
+
+    def level_sizes(self) -> Dict[str, int]:
+        """Return the number of pending messages per priority level"""
+        return {name: len(level) for name, level in zip(self._names, self._levels)}
+
+    def append(self, message: Dict[str, Any]) -> None:
+        """Add a message to the tail of its priority level"""
+        self._level(message).append(message)
+        self._size += 1
+
+    def appendleft(self, message: Dict[str, Any]) -> None:
+        """Add a message to the head of its priority level"""
+        self._level(message).appendleft(message)
+        self._size += 1
+
+    def _select(self, commit: bool) -> int:
+        """Pick the level to serve next by smooth weighted round robin"""
+        credit = self._credit
+        best = -1
+        total = 0
+        active = 0
+        for index, level in enumerate(self._levels):
+            if not level:
+                continue
+            active += 1
+            total += self._weights[index]
+            if best < 0 or credit[index] + self._weights[index] > credit[best] + self._weights[best]:
+                best = index
+        if commit and active > 1:
+            for index, level in enumerate(self._levels):
+                if level:
+                    credit[index] += self._weights[index]
+            credit[best] -= total
+        return best
+
+    def popleft(self) -> Dict[str, Any]:
+        """Remove and return the next message by weighted fair order"""
+        if not self._size:
+            raise IndexError("pop from an empty queue")
+        index = self._select(commit=True)
+        level = self._levels[index]
+        message = level.popleft()
+        self._size -= 1
+        if not level:
+            # An emptied level starts its next busy period without debt
+            self._credit[index] = 0
+        return message
+
+    def pop_lowest(self) -> Dict[str, Any]:
+        """Remove and return the oldest message of the lowest non-empty level"""
+        for index in range(len(self._levels) - 1, -1, -1):
+            level = self._levels[index]
+            if level:
+                self._size -= 1
+                message = level.popleft()
+                if not level:
+                    self._credit[index] = 0
+                return message
+        raise IndexError("pop from an empty queue")
+
+    def peek(self) -> Optional[Dict[str, Any]]:
+        """Return the message ``popleft`` would return, without removing it"""
+        if not self._size:
+            return None
+        return self._levels[self._select(commit=False)].peek()
+
+    def get(self, message_id: Hashable) -> Optional[Dict[str, Any]]:
+        """Look up a pending message by id"""
+        for level in self._levels:
+            message = level.get(message_id)
+            if message is not None:
+                return message
+        return None
+
+    def discard(self, message_id: Hashable) -> Optional[Dict[str, Any]]:
+        """Remove a message by id, returning it if it was pending"""
+        for level in self._levels:
+            message = level.discard(message_id)
+            if message is not None:
+                self._size -= 1
+                return message
+        return None
+
+    def remove(self, message: Dict[str, Any]) -> None:
+        """Remove a message, raising ValueError if it is not pending"""
+        if self.discard(message['id']) is None:
+            raise ValueError(f"Message {message['id']} is not pending")
+
+    def clear(self) -> None:
+        for level in self._levels:
+            level.clear()
+        self._credit = [0] * len(self._levels)
+        self._size = 0
+
+    def __contains__(self, message: Any) -> bool:
+        if isinstance(message, Mapping):
+            message = message.get('id')
+        return any(message in level for level in self._levels)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        return self._size > 0
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter([message for level in self._levels for message in level])
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        """Positional access in priority order; O(n) past the first level"""
+        size = self._size
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("queue index out of range")
+        for level in self._levels:
+            if index < len(level):
+                return level[index]
+            index -= len(level)
+        raise IndexError("queue index out of range")
@@ -1,30 +1,134 @@
+import functools
+import os
+import random
+import threading
 import time
-import uuid
-from typing import Dict, Any
-from datetime import datetime
+from typing import Dict, Any, Optional
+from . import config
+from .message import Message, to_epoch
+from .retry_policy import RetryPolicy
 
-def generate_message_id() -> str:
-    """Generate a unique message ID"""
-    return str(uuid.uuid4())
+# Not seeded from the clock, so processes started together draw different node ids
+_random = random.SystemRandom()
 
-def create_message_wrapper(data: Dict[str, Any]) -> Dict[str, Any]:
+class MessageIdGenerator:
+    """Snowflake-style 64-bit message IDs.
+
+    Layout: 41 bits of milliseconds since ``epoch_ms``, 10 bits of node id
+    and a 12-bit per-millisecond sequence.  IDs are unique and strictly
+    increasing within a generator, so they sort by enqueue order.  If the
+    sequence overflows, or the wall clock steps backwards, the generator
+    borrows the next millisecond instead of sleeping or repeating an id.
+
+    IDs are only unique across processes whose node ids differ.  Without
+    an explicit ``node_id`` (or ``config.MESSAGE_NODE_ID``) the node id is
+    random, and a forked child always draws one different from its
+    parent's; ``ProcessWorkerPool`` gives its workers distinct node ids.
+    Deployments with several producing processes should assign them.
+    """
+
+    EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+    NODE_BITS = 10
+    SEQUENCE_BITS = 12
+    MAX_NODE = (1 << NODE_BITS) - 1
+    MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+    def __init__(self, node_id: int = None, epoch_ms: int = EPOCH_MS):
+        self.epoch_ms = epoch_ms
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+        self._set_node(node_id)
+
+    def _set_node(self, node_id: int = None, avoid: int = None) -> None:
+        if node_id is None:
+            node_id = config.MESSAGE_NODE_ID
+        if node_id is None:
+            # Not the pid: pids a multiple of 1024 apart would share a node id
+            node_id = _random.getrandbits(self.NODE_BITS)
+            while node_id == avoid:
+                node_id = _random.getrandbits(self.NODE_BITS)
+        elif not 0 <= node_id <= self.MAX_NODE:
+            raise ValueError(f"node_id must be between 0 and {self.MAX_NODE}, got {node_id}")
+        self.node_id = node_id
+        self._node_bits = self.node_id << self.SEQUENCE_BITS
+
+    def reseed(self, node_id: int = None) -> None:
+        """Pick a new node id, e.g. in a freshly forked worker process"""
+        with self._lock:
+            self._set_node(node_id)
+
+    def _after_fork(self) -> None:
+        # The parent's lock may have been held mid-fork; start fresh
+        self._lock = threading.Lock()
+        self._set_node(avoid=self.node_id)
+
+    def next_id(self) -> int:
+        """Return the next unique ID"""
+        now_ms = time.time_ns() // 1_000_000 - self.epoch_ms
+        with self._lock:
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            else:
+                self._sequence += 1
+                if self._sequence > self.MAX_SEQUENCE:
+                    self._last_ms += 1
+                    self._sequence = 0
+            return (self._last_ms << (self.NODE_BITS + self.SEQUENCE_BITS)) | self._node_bits | self._sequence
+
+    def timestamp(self, message_id: int) -> float:
+        """Return the epoch seconds encoded in an ID"""
+        return ((message_id >> (self.NODE_BITS + self.SEQUENCE_BITS)) + self.epoch_ms) / 1000
+
+_id_generator = MessageIdGenerator()
+# Forked workers must not share the parent's node id
+os.register_at_fork(after_in_child=_id_generator._after_fork)
+
+def generate_message_id() -> int:
+    """Generate a unique, time-ordered message ID"""
+    return _id_generator.next_id()
+
+def create_message_wrapper(data: Dict[str, Any]) -> Message:
     """Wrap message data with metadata"""
-    return {
-        'id': generate_message_id(),
-        'data': data,
-        'timestamp': datetime.utcnow().isoformat(),
-        'attempt': 0,
-        'status': 'pending',
-        'failures': []
-    }
-
-def calculate_backoff_delay(attempt: int, base_delay: int = 5, max_delay: int = 300) -> int:
-    """Calculate exponential backoff delay"""
-    delay = min(base_delay * (2 ** (attempt - 1)), max_delay)
-    return delay
+    message = Message(generate_message_id(), data)
+    message['failures'] = []
+    return message
+
+def calculate_backoff_delay(attempt: int, base_delay: Optional[float] = None,
+                            max_delay: Optional[float] = None, jitter: str = 'none') -> float:
+    """Calculate exponential backoff delay
+
+    Delays default to ``config.BASE_RETRY_DELAY`` and ``MAX_RETRY_DELAY``;
+    ``jitter`` is one of ``retry_policy.JITTER``.
+    """
+    if base_delay is None:
+        base_delay = config.BASE_RETRY_DELAY
+    if max_delay is None:
+        max_delay = config.MAX_RETRY_DELAY
+    return _backoff_policy(base_delay, max_delay, jitter).delay(max(attempt, 1))
+
+@functools.lru_cache(maxsize=64)
+def _backoff_policy(base_delay: float, max_delay: float, jitter: str) -> RetryPolicy:
+    # Just long enough to reach max_delay; later attempts reuse the last delay
+    retries = 1
+    while base_delay * 2 ** (retries - 1) < max_delay and retries < 64:
+        retries += 1
+    return RetryPolicy(max_retries=retries, base_delay=base_delay, max_delay=max_delay,
+                       jitter=jitter)
 
 def is_message_expired(message: Dict[str, Any], timeout_seconds: int = 300) -> bool:
-    """Check if message has expired based on timestamp"""
-    created_time = datetime.fromisoformat(message['timestamp'])
-    elapsed = (datetime.utcnow() - created_time).total_seconds()
-    return elapsed > timeout_seconds
\ No newline at end of file
+    """Check if a message is past its TTL, or older than ``timeout_seconds`` without one
+
+    Timestamps are compared as epoch seconds; naive ISO strings are read
+    as UTC, matching what ``QueueSystem.enqueue`` writes.
+    """
+    now = time.time()
+    if isinstance(message, Message):
+        if message.expires_at is not None:
+            return now >= message.expires_at
+        return now - message.created_at > timeout_seconds
+    expires_at = message.get('expires_at')
+    if expires_at is not None:
+        return now >= to_epoch(expires_at)
+    return now - to_epoch(message['timestamp']) > timeout_seconds
\ No newline at end of file
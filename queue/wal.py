@@ -0,0 +1,302 @@
+import logging
+import os
+import pickle
+import struct
+import threading
+import zlib
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+FRAME_HEADER = struct.Struct('<II')  # payload length, crc32
+PICKLE_PROTOCOL = 5
+SYNC_MODES = ('group', 'async', 'none')
+
+class WriteAheadLog:
+    """Append-only, segmented log of queue state transitions.
+
+    Records are ``(op, payload)`` tuples framed as ``length | crc32 |
+    pickle``.  ``append`` only buffers a record; a background committer
+    writes whatever has accumulated in one ``write`` + ``fsync`` (group
+    commit), so concurrent producers share each fsync.
+
+    ``sync`` selects durability:
+
+    - ``'group'``: ``wait(lsn)`` blocks until the record is fsynced
+    - ``'async'``: records are fsynced every ``commit_interval`` seconds
+      and ``wait`` returns immediately
+    - ``'none'``: records are written but never fsynced
+
+    Every process run writes to a fresh segment, so a torn tail left by a
+    crash is never appended to.  ``rotate`` followed by ``write_snapshot``
+    stores a snapshot and deletes the segments it covers.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024,
+                 sync: str = 'group', commit_interval: float = 0.005,
+                 checkpoint_records: int = 1_000_000):
+        if sync not in SYNC_MODES:
+            raise ValueError(f"sync must be one of {SYNC_MODES}, got {sync!r}")
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.sync = sync
+        self.commit_interval = commit_interval
+        self.checkpoint_records = checkpoint_records
+        self.records_since_checkpoint = 0
+        self.logger = logging.getLogger(__name__)
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._work = threading.Condition(self._lock)
+        self._committed = threading.Condition(self._lock)
+        self._io_lock = threading.Lock()
+        self._buffer: List[bytes] = []
+        self._appended_lsn = 0
+        self._durable_lsn = 0
+        # (lsn, callback) pairs waiting for the committer
+        self._on_durable: List[Tuple[int, Callable[[], None]]] = []
+        self._closed = False
+        self._stopping = threading.Event()
+
+        existing = self._segment_numbers()
+        self._segment_no = (existing[-1] if existing else 0) + 1
+        self._file = None
+        self._file_size = 0
+        self._committer = threading.Thread(
+            target=self._commit_loop, name='queue-wal-committer', daemon=True
+        )
+        self._committer.start()
+
+    # Paths
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.directory, f"wal-{number:08d}.log")
+
+    def _snapshot_path(self, number: int) -> str:
+        return os.path.join(self.directory, f"snapshot-{number:08d}.pkl")
+
+    def _numbered(self, prefix: str, suffix: str) -> List[int]:
+        numbers = []
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and name.endswith(suffix):
+                numbers.append(int(name[len(prefix):-len(suffix)]))
+        return sorted(numbers)
+
+    def _segment_numbers(self) -> List[int]:
+        return self._numbered('wal-', '.log')
+
+    # Writing
+
+    @staticmethod
+    def encode(op: str, payload: Any) -> bytes:
+        body = pickle.dumps((op, payload), protocol=PICKLE_PROTOCOL)
+        return FRAME_HEADER.pack(len(body), zlib.crc32(body)) + body
+
+    def append(self, op: str, payload: Any) -> int:
+        """Buffer a record and return its log sequence number"""
+        return self.append_many([(op, payload)])
+
+    def append_many(self, records: List[Tuple[str, Any]]) -> int:
+        """Buffer several records at once; returns the LSN of the last one"""
+        frames = [self.encode(op, payload) for op, payload in records]
+        with self._lock:
+            if self._closed:
+                raise ValueError("write-ahead log is closed")
+            self._buffer.extend(frames)
+            self._appended_lsn += len(frames)
+            self.records_since_checkpoint += len(frames)
+            self._work.notify()
+            return self._appended_lsn
+
+    def wait(self, lsn: int) -> None:
+        """Block until ``lsn`` is durable (``'group'`` mode only)"""
+        if self.sync != 'group' or lsn is None:
+            return
+        with self._lock:
+            while self._durable_lsn < lsn and not self._closed:
+                self._committed.wait()
+
+    def when_durable(self, lsn: Optional[int], callback: Callable[[], None]) -> None:
+        """Call ``callback()`` once ``lsn`` is durable, without blocking.
+
+        The callback runs at once if ``wait(lsn)`` would return at once,
+        and otherwise on the committer thread right after the fsync.
+        """
+        if self.sync == 'group' and lsn is not None:
+            with self._lock:
+                if self._durable_lsn < lsn and not self._closed:
+                    self._on_durable.append((lsn, callback))
+                    return
+        callback()
+
+    def _mark_durable(self, lsn: int) -> None:
+        with self._lock:
+            self._durable_lsn = max(self._durable_lsn, lsn)
+            self._committed.notify_all()
+            if not self._on_durable:
+                return
+            ready = [callback for waiting, callback in self._on_durable
+                     if waiting <= self._durable_lsn or self._closed]
+            self._on_durable = [(waiting, callback) for waiting, callback in self._on_durable
+                                if waiting > self._durable_lsn and not self._closed]
+        for callback in ready:
+            callback()
+
+    def flush(self) -> None:
+        """Write and fsync everything buffered so far"""
+        self._commit()
+
+    def _commit(self) -> None:
+        with self._io_lock:
+            with self._lock:
+                frames, self._buffer = self._buffer, []
+                lsn = self._appended_lsn
+            if frames:
+                self._write(frames)
+            self._mark_durable(lsn)
+
+    def _write(self, frames: List[bytes]) -> None:
+        if self._file is None:
+            self._file = open(self._segment_path(self._segment_no), 'ab')
+            self._file_size = self._file.tell()
+        data = b''.join(frames)
+        self._file.write(data)
+        self._file.flush()
+        if self.sync != 'none':
+            os.fsync(self._file.fileno())
+        self._file_size += len(data)
+        if self._file_size >= self.segment_bytes:
+            self._next_segment()
+
+    def _next_segment(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._segment_no += 1
+        self._file_size = 0
+
+    def _commit_loop(self) -> None:
+        while True:
+            with self._lock:
+                while not self._buffer and not self._closed:
+                    self._work.wait()
+                if self._closed and not self._buffer:
+                    return
+            self._commit()
+            if self.sync == 'async':
+                # Let records accumulate between fsyncs
+                self._stopping.wait(self.commit_interval)
+
+    # Checkpoints
+
+    def needs_checkpoint(self) -> bool:
+        return self.records_since_checkpoint >= self.checkpoint_records
+
+    def rotate(self) -> int:
+        """Commit buffered records and start a new segment.
+
+        Returns the new segment number: a snapshot taken at this point
+        covers every earlier segment.  Callers must stop appends while the
+        snapshot state is captured and ``rotate`` runs.
+        """
+        with self._io_lock:
+            with self._lock:
+                frames, self._buffer = self._buffer, []
+                lsn = self._appended_lsn
+                self.records_since_checkpoint = 0
+            if frames:
+                self._write(frames)
+            self._next_segment()
+            self._mark_durable(lsn)
+            return self._segment_no
+
+    def write_snapshot(self, snapshot: bytes, segment_no: int, tail: Iterable[bytes] = ()) -> None:
+        """Atomically store a pickled snapshot and drop the segments it covers.
+
+        ``tail`` is streamed into the file after the snapshot, one pickle
+        per item, so large state kept on disk need not be held in memory.
+        """
+        path = self._snapshot_path(segment_no)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(snapshot)
+            f.writelines(tail)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self._fsync_directory()
+        for number in self._numbered('snapshot-', '.pkl'):
+            if number < segment_no:
+                os.remove(self._snapshot_path(number))
+        for number in self._segment_numbers():
+            if number < segment_no:
+                os.remove(self._segment_path(number))
+
+    def _fsync_directory(self) -> None:
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # Recovery
+
+    def load_snapshot(self) -> Tuple[Optional[Any], Iterator[Any], int]:
+        """Return the newest snapshot, an iterator over its tail and the first segment to replay
+
+        The tail is read lazily, one pickle at a time, and must be consumed
+        before the next checkpoint replaces the snapshot.
+        """
+        snapshots = self._numbered('snapshot-', '.pkl')
+        if not snapshots:
+            return None, iter(()), 0
+        path = self._snapshot_path(snapshots[-1])
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+            offset = f.tell()
+        return snapshot, self._read_tail(path, offset), snapshots[-1]
+
+    @staticmethod
+    def _read_tail(path: str, offset: int) -> Iterator[Any]:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            while f.peek(1):
+                yield pickle.load(f)
+
+    def replay(self, start_segment: int = 0) -> Iterator[Tuple[str, Any]]:
+        """Yield ``(op, payload)`` records from segments ``>= start_segment``.
+
+        A torn or corrupt frame ends its segment: it can only be the tail
+        of a write that never completed.
+        """
+        loads, crc32, unpack_from = pickle.loads, zlib.crc32, FRAME_HEADER.unpack_from
+        header_size = FRAME_HEADER.size
+        for number in self._segment_numbers():
+            if number < start_segment or number >= self._segment_no:
+                continue
+            with open(self._segment_path(number), 'rb') as f:
+                data = f.read()
+            view = memoryview(data)
+            offset, end = 0, len(data)
+            while offset + header_size <= end:
+                length, checksum = unpack_from(data, offset)
+                body = view[offset + header_size:offset + header_size + length]
+                if len(body) < length or crc32(body) != checksum:
+                    self.logger.warning(
+                        f"Discarding torn WAL tail in segment {number} at offset {offset}"
+                    )
+                    break
+                yield loads(body)
+                offset += header_size + length
+
+    def close(self) -> None:
+        """Commit outstanding records and stop the committer"""
+        with self._lock:
+            self._closed = True
+            self._work.notify_all()
+        self._stopping.set()
+        self._committer.join()
+        self._commit()
+        with self._io_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        self._mark_durable(self._durable_lsn)
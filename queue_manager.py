@@ -1,8 +1,9 @@
 import time
 from datetime import datetime
-import json
 from typing import Dict, Any
 import logging
+from queue.retry_policy import RetryPolicy
+from queue.utils import generate_message_id
 
 class QueueSystem:
     def __init__(self):
@@ -10,7 +11,8 @@ class QueueSystem:
         self.processing = {}  # Track in-progress items
         self.dead_letter_queue = []  # Store failed messages DLQ
         self.max_retries = 3
-        self.retry_delays = [5, 15, 30]  # Increasing delays between retries (seconds)
+        # Exponential backoff from config.BASE_RETRY_DELAY with full jitter
+        self.retry_policy = RetryPolicy(max_retries=self.max_retries, jitter='full')
         
         # Configure logging
         logging.basicConfig(level=logging.INFO)
@@ -19,7 +21,7 @@ class QueueSystem:
     def enqueue(self, message: Dict[str, Any]) -> None:
         """Add message to queue with metadata"""
         message_wrapper = {
-            'id': str(time.time()),
+            'id': generate_message_id(),
             'data': message,
             'attempt': 0,
             'timestamp': datetime.utcnow().isoformat(),
@@ -58,12 +60,12 @@ class QueueSystem:
         
         if message['attempt'] < self.max_retries:
             # Calculate delay for next retry
-            delay = self.retry_delays[min(message['attempt'] - 1, len(self.retry_delays) - 1)]
+            delay = self.retry_policy.delay(message['attempt'])
             message['next_retry'] = time.time() + delay
             self.queue.append(message)  # Re-queue for retry
             self.logger.warning(
                 f"Message {message['id']} failed, attempt {message['attempt']}/{self.max_retries}. "
-                f"Retrying in {delay} seconds"
+                f"Retrying in {delay:.1f} seconds"
             )
         else:
             # Move to dead letter queue after max retries
@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import time
+import pytest
+from datetime import datetime, timedelta, UTC
+from queue.async_manager import AsyncQueueSystem
+from queue.capacity import QueueFullError
+from queue.failures import FailureType, MessageFailure
+from queue.wal import WriteAheadLog
+
+@pytest.fixture
+def queue_system():
+    return AsyncQueueSystem()
+
+class TestAsyncQueueSystem:
+    def test_get_returns_pending_message(self, queue_system):
+        """Test get returns an already queued message without waiting"""
+        queue_system.enqueue({"data": "test"})
+        message = asyncio.run(queue_system.get(timeout=1))
+        assert message['data'] == {"data": "test"}
+        assert message['id'] in queue_system.processing
+
+    def test_get_timeout(self, queue_system):
+        """Test get gives up after the timeout"""
+        assert asyncio.run(queue_system.get(timeout=0.01)) is None
+
+    def test_get_wakes_on_enqueue(self, queue_system):
+        """Test a waiting consumer is woken by an enqueue in the loop"""
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            loop.call_later(0.02, queue_system.enqueue, {"data": "late"})
+            return await queue_system.get(timeout=2)
+
+        assert asyncio.run(scenario())['data'] == {"data": "late"}
+
+    def test_get_wakes_on_threaded_enqueue(self, queue_system):
+        """Test producers in other threads wake the event loop"""
+        async def scenario():
+            timer = threading.Timer(0.02, queue_system.enqueue, args=({"data": "thread"},))
+            timer.start()
+            message = await queue_system.get(timeout=2)
+            timer.join()
+            return message
+
+        assert asyncio.run(scenario())['data'] == {"data": "thread"}
+
+    def test_get_sleeps_until_retry_deadline(self, queue_system):
+        """Test a scheduled retry is delivered once its deadline passes"""
+        queue_system.enqueue({"data": "test"})
+        message = queue_system.dequeue()
+        queue_system.handle_failure(message, "timed out", FailureType.TIMEOUT)
+        message['next_process_time'] = datetime.now(UTC) + timedelta(milliseconds=30)
+        queue_system.scheduled.schedule(message)
+
+        start = time.monotonic()
+        retried = asyncio.run(queue_system.get(timeout=2))
+        assert retried is message
+        assert time.monotonic() - start >= 0.02
+
+    def test_run_with_concurrency_limit(self, queue_system):
+        """Test async handlers run concurrently up to the limit"""
+        in_flight = {'now': 0, 'peak': 0}
+
+        async def handler(message):
+            in_flight['now'] += 1
+            in_flight['peak'] = max(in_flight['peak'], in_flight['now'])
+            await asyncio.sleep(0.01)
+            in_flight['now'] -= 1
+
+        for i in range(50):
+            queue_system.enqueue({"n": i})
+        counts = asyncio.run(queue_system.run(handler, concurrency=10))
+        assert counts == {'processed': 50, 'failed': 0}
+        assert in_flight['peak'] == 10
+        assert queue_system.monitor_health()['processing'] == 0
+
+    def test_run_failures_use_failure_handler(self, queue_system):
+        """Test typed async failures follow FailureHandler semantics"""
+        async def handler(message):
+            raise MessageFailure("rule violated", FailureType.BUSINESS)
+
+        queue_system.enqueue({"data": "test"})
+        counts = asyncio.run(queue_system.run(handler))
+        assert counts == {'processed': 0, 'failed': 1}
+        assert len(queue_system.dead_letter_queue) == 1
+        assert queue_system.dead_letter_queue[0]['last_failure']['type'] == 'business'
+
+class TestAsyncPut:
+    def test_put_waits_for_space_without_blocking_the_loop(self):
+        """Test a full queue parks put while a consumer task frees space"""
+        queue_system = AsyncQueueSystem(max_size=2, processing_timeout=0)
+
+        async def consumer():
+            await asyncio.sleep(0.02)
+            message = await queue_system.get(timeout=1)
+            queue_system.ack(message['id'])
+
+        async def scenario():
+            await queue_system.put_many([{'n': 1}, {'n': 2}])
+            task = asyncio.create_task(consumer())
+            start = time.monotonic()
+            message_id = await queue_system.put({'n': 3}, timeout=2)
+            await task
+            return message_id, time.monotonic() - start
+
+        message_id, waited = asyncio.run(scenario())
+        assert message_id in queue_system.queue
+        assert waited < 1
+
+    def test_put_times_out(self):
+        """Test put raises QueueFullError once its timeout passes"""
+        queue_system = AsyncQueueSystem(max_size=1)
+
+        async def scenario():
+            await queue_system.put({'n': 1})
+            await queue_system.put({'n': 2}, timeout=0.02)
+
+        with pytest.raises(QueueFullError):
+            asyncio.run(scenario())
+
+    def test_put_awaits_wal_commit(self, tmp_path):
+        """Test put returns once its record is durable and leaves no LSN behind"""
+        queue_system = AsyncQueueSystem(wal=WriteAheadLog(str(tmp_path)))
+
+        async def scenario():
+            await queue_system.put({'n': 1})
+            return queue_system.wal._durable_lsn, queue_system.take_unsynced()
+
+        try:
+            assert asyncio.run(scenario()) == (1, None)
+        finally:
+            queue_system.wal.close()
@@ -0,0 +1,68 @@
+import pytest
+from benchmarks.suite import MAX_NOISE_WIDENING, NOISE_FACTOR, check_comparable, compare, run
+
+def metric(value, better, spread=0.0):
+    return {'value': value, 'spread': spread, 'unit': 'x', 'better': better}
+
+class TestCompare:
+    def test_throughput_drop_is_a_regression(self):
+        """Test a higher-is-better metric falling past its threshold is reported"""
+        regressions = compare({'throughput.enqueue': metric(70, 'higher')},
+                              {'throughput.enqueue': metric(100, 'higher')},
+                              {'default': 0.25})
+        assert [r['metric'] for r in regressions] == ['throughput.enqueue']
+        assert regressions[0]['change'] == 0.3
+
+    def test_within_threshold(self):
+        """Test changes inside the threshold, and improvements, pass"""
+        regressions = compare({'drain.depth_1000': metric(11, 'lower'),
+                               'throughput.enqueue': metric(150, 'higher')},
+                              {'drain.depth_1000': metric(10, 'lower'),
+                               'throughput.enqueue': metric(100, 'higher')},
+                              {'default': 0.25})
+        assert regressions == []
+
+    def test_per_metric_threshold(self):
+        """Test per-metric overrides and skipping metrics without a baseline"""
+        thresholds = {'default': 0.25, 'metrics': {'memory.bytes_per_message': 0.05}}
+        regressions = compare({'memory.bytes_per_message': metric(110, 'lower'),
+                               'replay.startup': metric(5, 'lower')},
+                              {'memory.bytes_per_message': metric(100, 'lower')},
+                              thresholds)
+        assert [r['metric'] for r in regressions] == ['memory.bytes_per_message']
+
+    def test_noisy_metric_threshold_covers_spread(self):
+        """Test a change within the observed run-to-run spread is not a regression"""
+        regressions = compare({'throughput.enqueue': metric(60, 'higher', spread=0.3)},
+                              {'throughput.enqueue': metric(100, 'higher', spread=0.1)},
+                              {'default': 0.25})
+        assert regressions == []
+        regressions = compare({'throughput.enqueue': metric(40, 'higher', spread=0.3)},
+                              {'throughput.enqueue': metric(100, 'higher')},
+                              {'default': 0.25})
+        assert regressions[0]['threshold'] == pytest.approx(0.3 * NOISE_FACTOR)
+
+    def test_noise_widening_is_capped(self):
+        """Test a very noisy run can't widen the threshold past its cap"""
+        regressions = compare({'throughput.enqueue': metric(40, 'higher', spread=2.0)},
+                              {'throughput.enqueue': metric(100, 'higher')},
+                              {'default': 0.25})
+        assert regressions[0]['threshold'] == pytest.approx(0.25 * MAX_NOISE_WIDENING)
+
+    def test_quick_and_full_runs_are_not_compared(self):
+        """Test runs at different sizes refuse to compare"""
+        with pytest.raises(ValueError):
+            check_comparable({'scale': 0.1}, {'scale': 1.0})
+        with pytest.raises(ValueError):
+            check_comparable({'scale': 0.1}, {'quick': False})
+        check_comparable({'scale': 0.1}, {'quick': True})
+
+class TestRun:
+    def test_median_and_spread(self, monkeypatch):
+        """Test repeated runs report the median and their relative range"""
+        values = iter([10.0, 14.0, 12.0])
+        monkeypatch.setattr('benchmarks.suite.BENCHMARKS',
+                            {'fake': lambda scale: {'metric': (next(values), 'x', 'lower')}})
+        result = run(repeat=3)['fake.metric']
+        assert result['value'] == 12.0
+        assert result['spread'] == pytest.approx(4 / 12)
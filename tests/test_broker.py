@@ -0,0 +1,234 @@
+import asyncio
+from datetime import datetime, UTC
+import multiprocessing
+import os
+import tempfile
+import threading
+import pytest
+from queue.async_manager import AsyncQueueSystem
+from queue.broker import (AUTH, ENQUEUE, FRAME, HEADER_BYTES, Broker, BrokerClient, pack_frame,
+                          split_frames)
+from queue.capacity import QueueFullError
+from queue.codec import encode_payload, get_codec, unpickles
+from queue.failures import FailureType
+from queue.wal import WriteAheadLog
+
+def run(scenario, **broker_options):
+    """Run ``scenario(broker, client)`` against a broker on an ephemeral port"""
+    async def main():
+        async with Broker(port=0, **broker_options) as broker:
+            host, port = broker.address
+            async with BrokerClient(host=host, port=port, pool_size=2, token=broker.token) as client:
+                return await scenario(broker, client)
+    return asyncio.run(main())
+
+def malformed_frame(body):
+    """An enqueue frame whose body doesn't unmarshal"""
+    return FRAME.pack(len(body) + HEADER_BYTES, ENQUEUE, 2) + body
+
+def produce(path, count):
+    async def main():
+        async with BrokerClient(path=path, pool_size=1) as client:
+            await client.enqueue_many([{'n': i} for i in range(count)])
+    asyncio.run(main())
+
+class TestProtocol:
+    def test_split_frames_keeps_partial_frame(self):
+        """Test complete frames are consumed and a partial one is left buffered"""
+        first, second = pack_frame(ENQUEUE, 1, ('a',)), pack_frame(ENQUEUE, 2, ('b',))
+        buffer = bytearray(first + second[:5])
+        assert split_frames(buffer, 1024) == [(ENQUEUE, 1, ('a',))]
+        buffer += second[5:]
+        assert split_frames(buffer, 1024) == [(ENQUEUE, 2, ('b',))]
+        assert not buffer
+
+    def test_malformed_frame_rejected(self):
+        """Test a frame whose body doesn't unmarshal raises ValueError"""
+        for body in (b'\xa9\x01', b'\xff'):
+            with pytest.raises(ValueError):
+                split_frames(bytearray(malformed_frame(body)), 1024)
+
+    def test_pickle_payloads_are_unsafe(self):
+        """Test payloads that decode through pickle are recognised"""
+        assert unpickles(encode_payload({'n': 1}, get_codec('pickle')))
+        assert unpickles(encode_payload({'at': datetime.now(UTC)}, get_codec('binary')))
+        assert not unpickles(encode_payload({'n': 1}, get_codec('binary')))
+        assert not unpickles(encode_payload({'n': 1}, get_codec('json')))
+        assert unpickles(b'\xfe')
+
+    def test_oversized_frame_rejected(self):
+        """Test a frame over the limit raises instead of buffering it"""
+        with pytest.raises(ValueError):
+            split_frames(bytearray(pack_frame(ENQUEUE, 1, ('x' * 100,))), 16)
+
+    def test_only_loopback_hosts(self):
+        """Test the broker refuses to listen beyond localhost"""
+        with pytest.raises(ValueError):
+            Broker(host='0.0.0.0')
+        Broker(host='::1')
+        assert Broker(host='localhost').host == '127.0.0.1'
+
+class TestBroker:
+    def test_enqueue_dequeue_ack(self):
+        """Test messages round-trip with their data still encoded in the broker"""
+        async def scenario(broker, client):
+            ids = await client.enqueue_many([{'n': 1, 'dependency': 'db'}, {'n': 2}])
+            messages = await client.dequeue_batch(10)
+            assert [message.id for message in messages] == ids
+            assert all(broker.queue_system.processing[i].payload is not None for i in ids)
+            assert broker.queue_system.processing[ids[0]].dependency == 'db'
+            assert [message['data']['n'] for message in messages] == [1, 2]
+            assert await client.ack_many(ids) == 2
+            return await client.stats()
+
+        stats = run(scenario)
+        assert stats['processing'] == 0 and stats['pending'] == 0
+
+    def test_localhost(self):
+        """Test a broker and client on localhost bind and connect without a name lookup"""
+        async def scenario(broker, client):
+            async with BrokerClient(host='localhost', port=broker.address[1],
+                                    token=broker.token) as local:
+                await local.ping()
+            return broker.address[0]
+
+        assert run(scenario, host='localhost') == '127.0.0.1'
+
+    def test_wal_commit_does_not_block_loop(self, tmp_path):
+        """Test an enqueue is answered after its group commit while other requests go on"""
+        wal = WriteAheadLog(str(tmp_path))
+        writing, release = threading.Event(), threading.Event()
+        write = wal._write
+
+        def slow_write(frames):
+            writing.set()
+            release.wait(5)
+            write(frames)
+
+        wal._write = slow_write
+
+        async def scenario(broker, client):
+            enqueue = asyncio.ensure_future(client.enqueue({'n': 1}))
+            while not writing.is_set():
+                await asyncio.sleep(0.005)
+            await client.ping()
+            assert not enqueue.done()
+            release.set()
+            await enqueue
+            return await client.stats()
+
+        try:
+            assert run(scenario, queue_system=AsyncQueueSystem(wal=wal))['pending'] == 1
+        finally:
+            release.set()
+            wal.close()
+
+    def test_tcp_requires_token(self):
+        """Test a TCP connection without the broker's token is closed"""
+        async def scenario(broker, client):
+            host, port = broker.address
+            with pytest.raises(ConnectionError):
+                async with BrokerClient(host=host, port=port, pool_size=1, token='wrong'):
+                    pass
+            await client.ping()
+            return broker.token
+
+        assert run(scenario)
+
+    def test_malformed_frame_closes_only_its_connection(self):
+        """Test garbage on one connection doesn't take down the broker"""
+        async def scenario(broker, client):
+            reader, writer = await asyncio.open_connection(*broker.address)
+            writer.write(pack_frame(AUTH, 1, (broker.token,)))
+            writer.write(malformed_frame(b'\xa9\x01'))
+            await reader.read(64)
+            assert await reader.read() == b''
+            writer.close()
+            await client.ping()
+            return await client.stats()
+
+        assert run(scenario)['pending'] == 0
+
+    def test_pickled_payloads_refused(self):
+        """Test the broker won't store data that consumers would unpickle"""
+        async def scenario(broker, client):
+            host, port = broker.address
+            async with BrokerClient(host=host, port=port, pool_size=1, codec='pickle',
+                                    token=broker.token) as other:
+                with pytest.raises(ValueError):
+                    await other.enqueue({'n': 1})
+            with pytest.raises(ValueError):
+                await client.enqueue({'at': datetime.now(UTC)})
+            return await client.stats()
+
+        assert run(scenario)['pending'] == 0
+
+    def test_pipelined_requests(self):
+        """Test many concurrent requests on few connections get their own responses"""
+        async def scenario(broker, client):
+            ids = await asyncio.gather(*(client.enqueue({'n': i}) for i in range(200)))
+            messages = await asyncio.gather(*(client.dequeue() for _ in range(200)))
+            return ids, messages
+
+        ids, messages = run(scenario)
+        assert len(set(ids)) == 200
+        assert sorted(message['data']['n'] for message in messages) == list(range(200))
+
+    def test_long_poll_wakes_on_enqueue(self):
+        """Test a waiting dequeue doesn't block other requests and wakes on enqueue"""
+        async def scenario(broker, client):
+            waiting = asyncio.ensure_future(client.dequeue(timeout=5))
+            await asyncio.sleep(0.02)
+            assert not waiting.done()
+            await client.enqueue({'n': 1})
+            return await waiting, await client.dequeue(timeout=0.02)
+
+        message, empty = run(scenario)
+        assert message['data'] == {'n': 1}
+        assert empty is None
+
+    def test_nack_dead_letters_and_redrive(self):
+        """Test nacked messages follow failure strategies and can be redriven"""
+        async def scenario(broker, client):
+            message_id = await client.enqueue({'n': 1})
+            await client.dequeue()
+            assert await client.nack(message_id, 'bad input', FailureType.VALIDATION)
+            dead, cursor = await client.dead_letters(FailureType.VALIDATION)
+            assert cursor is None
+            assert [message.id for message in dead] == [message_id]
+            assert dead[0]['error'] == 'bad input'
+            assert dead[0]['last_failure']['type'] == 'validation'
+            assert await client.redrive('validation') == 1
+            return await client.dequeue()
+
+        assert run(scenario)['data'] == {'n': 1}
+
+    def test_full_queue_raises_on_client(self):
+        """Test a full queue fails the request instead of blocking the broker"""
+        async def scenario(broker, client):
+            await client.enqueue({'n': 1})
+            with pytest.raises(QueueFullError):
+                await client.enqueue({'n': 2})
+            return await client.stats()
+
+        assert run(scenario, queue_system=AsyncQueueSystem(max_size=1))['pending'] == 1
+
+    def test_unix_socket_shared_across_processes(self):
+        """Test a producer process and this consumer share the broker's queue"""
+        async def main(path):
+            async with Broker(path=path):
+                assert os.stat(path).st_mode & 0o777 == 0o600
+                process = multiprocessing.Process(target=produce, args=(path, 50))
+                process.start()
+                async with BrokerClient(path=path, pool_size=1) as client:
+                    received = []
+                    while len(received) < 50:
+                        received += await client.dequeue_batch(50, max_wait=5)
+                    await client.ack_many([message.id for message in received])
+                process.join(5)
+                return sorted(message['data']['n'] for message in received)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'broker.sock')
+            assert asyncio.run(main(path)) == list(range(50))
+            assert not os.path.exists(path)
@@ -0,0 +1,166 @@
+import pickle
+import threading
+import time
+import pytest
+from queue.manager import QueueSystem
+from queue.capacity import OverflowPolicy, QueueFullError, SpillFile, Watermarks
+
+class TestWatermarks:
+    def test_hysteresis(self):
+        """Test each callback fires once per crossing"""
+        events = []
+        watermarks = Watermarks(8, 4, on_high=lambda q: events.append('high'),
+                                on_low=lambda q: events.append('low'))
+        assert watermarks.update(7) is None
+        watermarks.update(8)(None)
+        assert watermarks.update(9) is None
+        assert watermarks.update(5) is None
+        watermarks.update(4)(None)
+        assert events == ['high', 'low']
+
+    def test_invalid_levels(self):
+        """Test a low watermark above the high one is rejected"""
+        with pytest.raises(ValueError):
+            Watermarks(4, 8)
+
+class TestSpillFile:
+    def test_fifo_round_trip(self, tmp_path):
+        """Test spilled messages come back in order and the file resets"""
+        spill = SpillFile(str(tmp_path))
+        for i in range(5):
+            spill.append({'id': i})
+        assert [m['id'] for m in spill] == [0, 1, 2, 3, 4]
+        assert [m['id'] for m in spill.pop_many(3)] == [0, 1, 2]
+        spill.append({'id': 5})
+        assert [m['id'] for m in spill.pop_many(10)] == [3, 4, 5]
+        assert len(spill) == 0
+        spill.close()
+
+    def test_segments_rotate_and_drain(self, tmp_path):
+        """Test the backlog spans segment files that are deleted once read"""
+        spill = SpillFile(str(tmp_path), segment_bytes=256, prefetch=1)
+        for i in range(100):
+            spill.append({'id': i, 'data': 'x' * 20})
+        assert spill.segments() > 5
+        # Only the write tail and the read-ahead window stay mapped
+        assert sum(segment.map is not None for segment in spill._segments) <= 3
+        assert [m['id'] for m in spill.pop_many(50)] == list(range(50))
+        assert [m['id'] for m in spill] == list(range(50, 100))
+        assert [m['id'] for m in spill.pop_many(100)] == list(range(50, 100))
+        assert spill.segments() == 1
+        assert len(list(tmp_path.glob('queue-spill-*/*.seg'))) == 1
+        spill.close()
+        assert list(tmp_path.iterdir()) == []
+
+    def test_reader_survives_drain_and_reuse(self, tmp_path):
+        """Test an open reader sees the backlog as it was while the spill moves on"""
+        spill = SpillFile(str(tmp_path), segment_bytes=256)
+        for i in range(20):
+            spill.append({'id': i, 'data': 'x' * 20})
+        with spill.reader() as frames:
+            assert [m['id'] for m in spill.pop_many(20)] == list(range(20))
+            for i in range(20, 25):
+                spill.append({'id': i, 'data': 'y' * 20})
+            assert [pickle.loads(body)['id'] for body in frames] == list(range(20))
+        assert [m['id'] for m in spill] == list(range(20, 25))
+        spill.close()
+
+    def test_oversized_message(self, tmp_path):
+        """Test a message larger than a segment gets a segment of its own"""
+        spill = SpillFile(str(tmp_path), segment_bytes=64)
+        spill.append({'id': 1, 'data': 'x' * 1000})
+        spill.append({'id': 2})
+        assert [m['id'] for m in spill.pop_many(2)] == [1, 2]
+        spill.close()
+
+class TestBoundedQueue:
+    def test_default_bound_from_config(self):
+        """Test MAX_QUEUE_SIZE bounds the queue by default"""
+        assert QueueSystem().max_size == 10000
+
+    def test_reject(self):
+        """Test the reject policy raises once the queue is full"""
+        queue_system = QueueSystem(max_size=2, overflow='reject')
+        queue_system.enqueue({'n': 1})
+        queue_system.enqueue({'n': 2})
+        with pytest.raises(QueueFullError):
+            queue_system.enqueue({'n': 3})
+        with pytest.raises(QueueFullError):
+            queue_system.enqueue_many([{'n': 3}])
+        assert len(queue_system.queue) == 2
+
+    def test_block_times_out(self):
+        """Test a blocked producer gives up after the timeout"""
+        queue_system = QueueSystem(max_size=1, overflow=OverflowPolicy.BLOCK)
+        queue_system.enqueue({'n': 1})
+        start = time.monotonic()
+        with pytest.raises(QueueFullError):
+            queue_system.enqueue({'n': 2}, timeout=0.05)
+        assert time.monotonic() - start >= 0.05
+
+    def test_block_resumes_when_consumed(self):
+        """Test a blocked producer proceeds once a consumer frees a slot"""
+        queue_system = QueueSystem(max_size=1, overflow='block')
+        queue_system.enqueue({'n': 1})
+        producer = threading.Thread(target=queue_system.enqueue, args=({'n': 2},),
+                                    kwargs={'timeout': 5})
+        producer.start()
+        time.sleep(0.05)
+        assert queue_system.dequeue()['data'] == {'n': 1}
+        producer.join(timeout=5)
+        assert queue_system.dequeue()['data'] == {'n': 2}
+
+    def test_drop_oldest(self):
+        """Test the oldest pending message is dead-lettered to make room"""
+        queue_system = QueueSystem(max_size=2, overflow='drop_oldest')
+        for n in range(3):
+            queue_system.enqueue({'n': n})
+        assert [m['data']['n'] for m in queue_system.queue] == [1, 2]
+        assert queue_system.dead_letter_queue[0]['data'] == {'n': 0}
+        assert queue_system.dead_letter_queue[0]['error'] == 'Dropped: queue full'
+
+    def test_spill_preserves_order(self, tmp_path):
+        """Test overflow goes to disk and drains back in FIFO order"""
+        queue_system = QueueSystem(max_size=2, overflow='spill', spill_directory=str(tmp_path))
+        queue_system.enqueue_many([{'n': n} for n in range(5)])
+        health = queue_system.monitor_health()
+        assert health['pending'] == 2
+        assert health['spilled'] == 3
+        drained = []
+        while True:
+            message = queue_system.dequeue()
+            if message is None:
+                break
+            drained.append(message['data']['n'])
+            queue_system.ack(message['id'])
+        assert drained == [0, 1, 2, 3, 4]
+        assert queue_system.monitor_health()['spilled'] == 0
+
+    def test_spilled_messages_expire_on_refill(self, tmp_path):
+        """Test spilled TTL messages stay out of the expiry index until refilled"""
+        queue_system = QueueSystem(max_size=2, overflow='spill', spill_directory=str(tmp_path))
+        queue_system.enqueue_many([{'n': n} for n in range(5)], ttl=0.01)
+        assert len(queue_system.expiry) == 2
+        time.sleep(0.02)
+        assert queue_system.dequeue() is None
+        assert queue_system.monitor_health()['spilled'] == 0
+        assert len(queue_system.expiry) == 0
+
+    def test_watermark_callbacks(self):
+        """Test producers are told to pause and resume"""
+        events = []
+        queue_system = QueueSystem(max_size=10, overflow='reject')
+        queue_system.watermarks.on_high = lambda q: events.append(('high', len(q.queue)))
+        queue_system.watermarks.on_low = lambda q: events.append(('low', len(q.queue)))
+        queue_system.enqueue_many([{'n': n} for n in range(8)])
+        assert events == [('high', 8)]
+        queue_system.dequeue_batch(3)
+        queue_system.dequeue()
+        assert events == [('high', 8), ('low', 5)]
+
+    def test_unbounded(self):
+        """Test max_size=0 disables the bound"""
+        queue_system = QueueSystem(max_size=0, overflow='reject')
+        queue_system.enqueue_many([{'n': n} for n in range(20)])
+        assert len(queue_system.queue) == 20
+        assert queue_system.watermarks is None
@@ -0,0 +1,167 @@
+import pytest
+from queue.circuit_breaker import CircuitBreaker, CircuitBreakerRegistry, CircuitState
+from queue.handler import FailureHandler
+from queue.manager import QueueSystem
+from queue.failures import FailureType
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker('db', failure_threshold=0.5, minimum_calls=4, window_seconds=10,
+                          bucket_seconds=1, open_seconds=30, half_open_max_calls=2, clock=clock)
+
+def _registry(clock, **overrides):
+    settings = {'default': dict({'minimum_calls': 2, 'open_seconds': 30, 'half_open_max_calls': 1,
+                                 'clock': clock}, **overrides)}
+    return CircuitBreakerRegistry(settings)
+
+class TestCircuitBreaker:
+    def test_opens_on_failure_rate(self, breaker):
+        """Test the breaker opens once the failure rate crosses the threshold"""
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_success()
+        assert breaker.state is CircuitState.CLOSED
+        breaker.record_failure()
+        assert breaker.state is CircuitState.OPEN
+        assert breaker.allow_request() is False
+
+    def test_minimum_calls(self, breaker):
+        """Test a handful of failures cannot open the breaker"""
+        for _ in range(3):
+            breaker.record_failure()
+        assert breaker.state is CircuitState.CLOSED
+
+    def test_window_slides(self, breaker, clock):
+        """Test old outcomes fall out of the window"""
+        for _ in range(3):
+            breaker.record_failure()
+        clock.now += 11
+        breaker.record_failure()
+        assert breaker.state is CircuitState.CLOSED
+        assert breaker.failure_rate() == 1.0
+        clock.now += 100
+        assert breaker.failure_rate() == 0.0
+
+    def test_half_open_closes_after_successful_trials(self, breaker, clock):
+        """Test trial calls close the breaker after open_seconds"""
+        for _ in range(4):
+            breaker.record_failure()
+        assert breaker.retry_after() == 30
+        clock.now += 30
+        assert breaker.state is CircuitState.HALF_OPEN
+        assert breaker.allow_request() and breaker.allow_request()
+        assert breaker.allow_request() is False
+        breaker.record_success()
+        breaker.record_success()
+        assert breaker.state is CircuitState.CLOSED
+        assert breaker.failure_rate() == 0.0
+
+    def test_half_open_failure_reopens(self, breaker, clock):
+        """Test a failed trial call re-opens the breaker"""
+        for _ in range(4):
+            breaker.record_failure()
+        clock.now += 30
+        assert breaker.allow_request()
+        breaker.record_failure()
+        assert breaker.state is CircuitState.OPEN
+        assert breaker.retry_after() == 30
+
+    def test_registry_settings(self, clock):
+        """Test per-dependency settings override the defaults"""
+        registry = CircuitBreakerRegistry({'default': {'minimum_calls': 5, 'clock': clock},
+                                           'payments': {'minimum_calls': 1}})
+        assert registry.get('payments').minimum_calls == 1
+        assert registry.get('search').minimum_calls == 5
+        assert registry.get('search') is registry.get('search')
+        assert registry.states() == {'payments': 'closed', 'search': 'closed'}
+
+class TestFailureHandlerCircuitBreaker:
+    def test_open_breaker_parks_instead_of_dead_lettering(self, clock):
+        """Test DATABASE failures are parked while the breaker is open"""
+        handler = FailureHandler(_registry(clock))
+        for i in range(2):
+            message = {'id': i, 'data': {'dependency': 'orders-db'}}
+            handler.handle_message_failure(message, FailureType.DATABASE)
+        assert handler.circuit_breakers.get('orders-db').state is CircuitState.OPEN
+        assert message['status'] == 'retry'
+        assert 'next_process_time' in message
+
+    def test_failures_without_dependency_use_failure_type(self, clock):
+        """Test messages that name no dependency are tracked per failure type"""
+        handler = FailureHandler(_registry(clock))
+        message = {'id': 1, 'data': {}}
+        handler.handle_message_failure(message, FailureType.NETWORK)
+        assert handler.dependency_of(message) == 'network'
+        handler.handle_message_failure({'id': 2, 'data': {}}, FailureType.VALIDATION)
+        assert 'validation' not in handler.circuit_breakers.states()
+
+    def test_low_failure_rate_keeps_type_breaker_closed(self, clock):
+        """Test first-time successes count against the breaker their failures use"""
+        handler = FailureHandler(_registry(clock))
+        for i in range(100):
+            message = {'id': i, 'data': {}}
+            if i % 20 == 0:
+                handler.handle_message_failure(message, FailureType.NETWORK)
+            else:
+                handler.record_success(message)
+        assert handler.circuit_breakers.get('network').state is CircuitState.CLOSED
+
+class TestQueueSystemCircuitBreaker:
+    def test_dispatch_parks_messages_for_open_dependency(self, clock):
+        """Test dequeue skips and parks messages whose breaker is open"""
+        queue_system = QueueSystem()
+        queue_system.failure_handler = FailureHandler(_registry(clock))
+        breaker = queue_system.failure_handler.circuit_breakers.get('payments')
+        breaker.record_failure()
+        breaker.record_failure()
+
+        queue_system.enqueue({'dependency': 'payments'})
+        queue_system.enqueue({'dependency': 'search'})
+        message = queue_system.dequeue()
+        assert message['data'] == {'dependency': 'search'}
+        assert queue_system.monitor_health()['scheduled'] == 1
+        assert queue_system.dequeue() is None
+
+    def test_ack_records_success(self, clock):
+        """Test successful processing closes a half-open breaker"""
+        queue_system = QueueSystem()
+        queue_system.failure_handler = FailureHandler(_registry(clock))
+        breaker = queue_system.failure_handler.circuit_breakers.get('payments')
+        breaker.record_failure()
+        breaker.record_failure()
+        clock.now += 30
+
+        queue_system.enqueue({'dependency': 'payments'})
+        message = queue_system.dequeue()
+        assert message is not None
+        queue_system.ack(message['id'])
+        assert breaker.state is CircuitState.CLOSED
+
+    def test_unrelated_acks_do_not_close_half_open_breaker(self, clock):
+        """Test only a message the breaker admitted counts as its trial success"""
+        queue_system = QueueSystem()
+        queue_system.failure_handler = FailureHandler(_registry(clock))
+        breaker = queue_system.failure_handler.circuit_breakers.get('database')
+        breaker.record_failure()
+        breaker.record_failure()
+        clock.now += 30
+
+        for i in range(5):
+            queue_system.enqueue({'n': i})
+            queue_system.ack(queue_system.dequeue()['id'])
+        assert breaker.state is CircuitState.HALF_OPEN
+
+        queue_system.enqueue({'dependency': 'database'})
+        queue_system.ack(queue_system.dequeue()['id'])
+        assert breaker.state is CircuitState.CLOSED
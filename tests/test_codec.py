@@ -0,0 +1,100 @@
+import pickle
+import threading
+from datetime import datetime, UTC
+import pytest
+from queue.codec import (BinaryCodec, Codec, JsonCodec, decode_payload, encode_payload,
+                         get_codec, register_codec)
+from queue.manager import QueueSystem
+from queue.message import Message
+
+DATA = {'n': 1, 'body': 'x' * 20, 'raw': b'\x00\x01', 'items': [1, 2.5, None, True]}
+
+class TestCodecs:
+    @pytest.mark.parametrize('name', ['binary', 'pickle'])
+    def test_round_trip(self, name):
+        """Test payloads decode to equal data"""
+        payload = encode_payload(DATA, get_codec(name))
+        assert decode_payload(payload) == DATA
+        assert decode_payload(memoryview(payload)) == DATA
+
+    def test_json_round_trip(self):
+        """Test the JSON codec round-trips JSON types"""
+        data = {'n': 1, 'items': [1, 2.5, None, True]}
+        assert decode_payload(encode_payload(data, JsonCodec())) == data
+
+    def test_binary_falls_back_to_pickle(self):
+        """Test values marshal can't encode still round-trip"""
+        data = {'at': datetime(2024, 1, 1, tzinfo=UTC)}
+        assert decode_payload(encode_payload(data, BinaryCodec())) == data
+
+    def test_registry(self):
+        """Test names resolve, 'none' disables encoding and ids can't clash"""
+        assert get_codec('binary').codec_id == 1
+        assert get_codec('none') is None
+        with pytest.raises(ValueError):
+            get_codec('yaml')
+
+        class Clash(Codec):
+            name = 'clash'
+            codec_id = 1
+
+        with pytest.raises(ValueError):
+            register_codec(Clash())
+        with pytest.raises(ValueError):
+            decode_payload(b'\xfe')
+
+class TestLazyPayload:
+    def test_decoded_on_first_read(self):
+        """Test data stays encoded until read, then the bytes are dropped"""
+        message = Message(1, dict(DATA))
+        message.encode(BinaryCodec())
+        assert message.payload is not None
+        assert message['data'] == DATA
+        assert message.payload is None
+
+    def test_mapping_view_does_not_decode(self):
+        """Test in, iteration and len leave the payload encoded"""
+        message = Message(1, {'n': 1})
+        message.encode(JsonCodec())
+        assert 'data' in message
+        assert 'data' in list(message)
+        assert len(message) == len(list(message))
+        assert message.payload is not None
+        assert message['data'] == {'n': 1}
+        assert message.payload is None
+
+    def test_pickle_keeps_payload_encoded(self):
+        """Test persisting a message copies the payload bytes as they are"""
+        message = Message(1, {'dependency': 'db', 'n': 1})
+        message.encode(BinaryCodec())
+        restored = pickle.loads(pickle.dumps(message))
+        assert restored.payload == message.payload
+        assert restored.dependency == 'db'
+        assert restored.data == {'dependency': 'db', 'n': 1}
+
+    def test_queue_decodes_only_in_handler(self):
+        """Test dispatch and breaker checks don't decode the payload"""
+        queue_system = QueueSystem(codec='binary')
+        queue_system.enqueue({'dependency': 'db', 'n': 1})
+        message = queue_system.dequeue()
+        assert message.payload is not None
+        assert queue_system.failure_handler.dependency_of(message) == 'db'
+        seen = []
+        assert queue_system.process_message(message, lambda m: seen.append(m['data']['n']))
+        assert seen == [1]
+
+    def test_codec_none_keeps_objects(self):
+        """Test codec='none' stores data as given"""
+        data = {'n': 1}
+        queue_system = QueueSystem(codec='none')
+        queue_system.enqueue(data)
+        assert queue_system.dequeue()['data'] is data
+
+    def test_default_accepts_unserializable_data(self):
+        """Test an in-process queue takes data no codec can encode by default"""
+        event = threading.Event()
+        queue_system = QueueSystem()
+        queue_system.enqueue({'done': event})
+        message = queue_system.dequeue()
+        assert message.payload is None
+        assert message['data']['done'] is event
@@ -0,0 +1,184 @@
+import json
+import time
+import pytest
+from queue.dead_letter import DeadLetterArchive, DeadLetterStore
+from queue.failures import FailureType
+from queue.manager import QueueSystem
+from queue.wal import WriteAheadLog
+
+def _dead(message_id, failure_type=None, error='boom'):
+    message = {'id': message_id, 'data': {}, 'attempt': 1, 'status': 'dead_letter', 'error': error}
+    if failure_type is not None:
+        message['last_failure'] = {'type': failure_type, 'timestamp': '', 'attempt': 1}
+    return message
+
+@pytest.fixture
+def store():
+    return DeadLetterStore(max_size=0, max_age=0, bucket_seconds=60)
+
+class TestDeadLetterStore:
+    def test_query_by_type_and_error(self, store):
+        """Test secondary indexes narrow queries"""
+        store.append(_dead(1, 'network', 'refused'))
+        store.append(_dead(2, 'validation', 'bad input'))
+        store.append(_dead(3, 'network', 'reset'))
+        messages, cursor = store.query(failure_type=FailureType.NETWORK)
+        assert [m['id'] for m in messages] == [1, 3]
+        assert cursor is None
+        messages, _ = store.query(failure_type='network', error='reset')
+        assert [m['id'] for m in messages] == [3]
+        assert store.query(error='missing')[0] == []
+
+    def test_query_by_time_range(self, store):
+        """Test the time bucket index bounds range queries"""
+        store.append(_dead(1), dead_at=1000)
+        store.append(_dead(2), dead_at=1100)
+        store.append(_dead(3), dead_at=1300)
+        messages, _ = store.query(since=1050, until=1200)
+        assert [m['id'] for m in messages] == [2]
+        messages, _ = store.query(since=1100)
+        assert [m['id'] for m in messages] == [2, 3]
+
+    def test_pagination(self, store):
+        """Test the cursor walks the matches page by page"""
+        for i in range(5):
+            store.append(_dead(i, 'timeout'))
+        pages = []
+        cursor = None
+        while True:
+            messages, cursor = store.query(failure_type='timeout', limit=2, cursor=cursor)
+            pages.append([m['id'] for m in messages])
+            if cursor is None:
+                break
+        assert pages == [[0, 1], [2, 3], [4]]
+
+    def test_pagination_skips_removed_and_compacts(self, store):
+        """Test pages resume after the cursor past removed messages"""
+        for i in range(300):
+            store.append(_dead(i, 'timeout'))
+        for i in range(300):
+            if i % 3:
+                store.discard(i)
+        first, cursor = store.query(failure_type='timeout', limit=60)
+        rest, end = store.query(failure_type='timeout', limit=60, cursor=cursor)
+        assert [m['id'] for m in first + rest] == list(range(0, 300, 3))
+        assert end is None
+        assert len(store._by_type['timeout'].sequences) < 300
+
+    def test_size_eviction_archives(self, tmp_path):
+        """Test the oldest messages are evicted to the archive past max_size"""
+        path = tmp_path / 'dlq.jsonl'
+        store = DeadLetterStore(max_size=2, max_age=0, archive=DeadLetterArchive(str(path)))
+        for i in range(3):
+            store.append(_dead(i, 'business'))
+        assert [m['id'] for m in store] == [1, 2]
+        assert store.evicted == 1
+        assert json.loads(path.read_text())['id'] == 0
+        assert store.counts()['failure_type'] == {'business': 2}
+
+    def test_age_eviction(self):
+        """Test messages older than max_age are evicted"""
+        store = DeadLetterStore(max_size=0, max_age=60)
+        store.append(_dead(1), dead_at=1000)
+        store.append(_dead(2), dead_at=1050)
+        assert [m['id'] for m in store.evict_expired(now=1100)] == [1]
+        assert len(store) == 1
+
+    def test_list_compatibility(self, store):
+        """Test list-style access used by existing callers"""
+        first, last = _dead(1), _dead(2)
+        store.append(first)
+        store.append(last)
+        assert store[0] is first
+        assert store[-1] is last
+        assert first in store
+        assert store == [first, last]
+        store.remove(first)
+        assert store.get(1) is None
+
+class TestRedrive:
+    def _dead_letter(self, queue_system, count, failure_type, error):
+        for i in range(count):
+            queue_system.enqueue({'n': i})
+            message = queue_system.dequeue()
+            queue_system.handle_failure(message, error, failure_type)
+
+    def test_redrive_by_filter(self):
+        """Test only matching messages go back with a fresh retry budget"""
+        queue_system = QueueSystem()
+        self._dead_letter(queue_system, 3, FailureType.VALIDATION, 'schema v1')
+        self._dead_letter(queue_system, 2, FailureType.BUSINESS, 'limit exceeded')
+        assert queue_system.redrive(failure_type=FailureType.VALIDATION) == 3
+        assert len(queue_system.dead_letter_queue) == 2
+        message = queue_system.dequeue()
+        assert message['attempt'] == 0
+        assert 'failure_count' not in message
+        assert 'error' not in message
+
+    def test_redrive_into_spilling_queue(self, tmp_path):
+        """Test messages redriven to the spill tier come back reset"""
+        queue_system = QueueSystem(max_size=1, overflow='spill', spill_directory=str(tmp_path))
+        self._dead_letter(queue_system, 3, FailureType.BUSINESS, 'limit exceeded')
+        queue_system.enqueue({'n': 'hot'})
+        assert queue_system.redrive() == 3
+        assert len(queue_system.spill) == 3
+        assert queue_system.dequeue()['data'] == {'n': 'hot'}
+        for _ in range(3):
+            message = queue_system.dequeue()
+            assert message['status'] == 'processing'
+            assert message['attempt'] == 0
+            assert 'error' not in message
+            assert 'failure_count' not in message
+            assert 'last_failure' not in message
+
+    def test_redrive_into_full_drop_oldest_queue(self):
+        """Test messages evicted by the redrive itself are not redriven again"""
+        queue_system = QueueSystem(max_size=2, overflow='drop_oldest')
+        self._dead_letter(queue_system, 2, FailureType.BUSINESS, 'limit exceeded')
+        queue_system.enqueue({'n': 'a'})
+        queue_system.enqueue({'n': 'b'})
+        assert queue_system.redrive(batch_size=1) == 2
+        assert len(queue_system.queue) == 2
+        assert len(queue_system.dead_letter_queue) == 2
+        assert {m['data']['n'] for m in queue_system.dead_letter_queue} == {'a', 'b'}
+
+    def test_redrive_resets_dict_messages(self):
+        """Test redriven plain-dict messages can fail again"""
+        queue_system = QueueSystem()
+        message = {'id': 1, 'data': {}, 'attempt': 2, 'status': 'dead_letter', 'error': 'x',
+                   'failure_count': {'business': 1},
+                   'last_failure': {'type': 'business', 'timestamp': 0, 'attempt': 1}}
+        queue_system.dead_letter_queue.append(message)
+        assert queue_system.redrive() == 1
+        assert 'failure_count' not in message and 'last_failure' not in message
+        queue_system.failure_handler.handle_message_failure(message, FailureType.NETWORK)
+        assert message['failure_count'] == {'network': 1}
+
+    def test_redrive_rate_limit(self):
+        """Test rate_limit spreads the redrive over time"""
+        queue_system = QueueSystem()
+        self._dead_letter(queue_system, 4, FailureType.BUSINESS, 'limit exceeded')
+        start = time.monotonic()
+        assert queue_system.redrive(error='limit exceeded', rate_limit=40, batch_size=2) == 4
+        assert time.monotonic() - start >= 0.09
+        assert len(queue_system.queue) == 4
+
+    def test_redrive_limit(self):
+        """Test limit caps how many messages move"""
+        queue_system = QueueSystem()
+        self._dead_letter(queue_system, 5, FailureType.BUSINESS, 'limit exceeded')
+        assert queue_system.redrive(limit=2, batch_size=10) == 2
+        assert len(queue_system.dead_letter_queue) == 3
+
+    def test_redrive_survives_restart(self, tmp_path):
+        """Test redriven and evicted messages are not restored to the DLQ"""
+        queue_system = QueueSystem(wal=WriteAheadLog(str(tmp_path)))
+        queue_system.dead_letter_queue.max_size = 2
+        self._dead_letter(queue_system, 3, FailureType.BUSINESS, 'limit exceeded')
+        queue_system.redrive(limit=1)
+        queue_system.wal.close()
+
+        restored = QueueSystem(wal=WriteAheadLog(str(tmp_path)))
+        assert len(restored.dead_letter_queue) == 1
+        assert len(restored.queue) == 1
+        restored.wal.close()
@@ -1,7 +1,9 @@
+import random
 import pytest
 from datetime import datetime, timedelta
 from queue.handler import FailureHandler
 from queue.failures import FailureType
+from queue.message import Message
 
 @pytest.fixture
 def failure_handler():
@@ -90,4 +92,50 @@ class TestFailureHandler:
         
         result = failure_handler.handle_message_failure(message, FailureType.RESOURCE)
         assert result['status'] == 'retry'
-        assert result['requires_resource_check'] is True
\ No newline at end of file
+        assert result['requires_resource_check'] is True
+
+class TestBatchFailures:
+    @staticmethod
+    def histories():
+        """Messages at every failure count up to past each type's retry limit"""
+        for failure_type in FailureType:
+            for previous in range(7):
+                yield failure_type, previous
+
+    @staticmethod
+    def delay(message):
+        last_failure = message['last_failure']
+        failed_at = datetime.fromisoformat(last_failure['timestamp'])
+        return (message['next_process_time'] - failed_at).total_seconds()
+
+    @pytest.mark.parametrize('make', [dict, Message.from_dict], ids=['dict', 'Message'])
+    def test_matches_per_message_path(self, make):
+        """Test batch results equal handle_message_failure for every type and history"""
+        histories = list(self.histories())
+        def build():
+            return [make({'id': i, 'data': {}, 'status': 'processing',
+                          'failure_count': {t.value: n} if n else {}})
+                    for i, (t, n) in enumerate(histories)]
+        single, batch = build(), build()
+        types = [failure_type for failure_type, _ in histories]
+        # Same seed, so both paths draw the same jitter
+        handler = FailureHandler(rng=random.Random(1))
+        for message, failure_type in zip(single, types):
+            handler.handle_message_failure(message, failure_type)
+        FailureHandler(rng=random.Random(1)).handle_failures_batch(batch, types)
+
+        for one, many in zip(single, batch):
+            assert many['status'] == one['status']
+            assert many['failure_count'] == one['failure_count']
+            assert many['last_failure']['attempt'] == one['last_failure']['attempt']
+            assert many.get('requires_resource_check') == one.get('requires_resource_check')
+            assert ('next_process_time' in many) == ('next_process_time' in one)
+            if 'next_process_time' in one:
+                assert self.delay(many) == pytest.approx(self.delay(one), abs=0.01)
+
+    def test_single_failure_type(self, failure_handler):
+        """Test one FailureType applies to the whole batch, with jittered deadlines"""
+        messages = [Message(i, {}) for i in range(3)]
+        failure_handler.handle_failures_batch(messages, FailureType.NETWORK)
+        assert [message['status'] for message in messages] == ['retry'] * 3
+        assert len({message.next_process_at for message in messages}) == 3
@@ -0,0 +1,121 @@
+import json
+import logging
+import pytest
+from queue.log import BackgroundHandler, EventLogger, JsonFormatter, setup_logging
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+@pytest.fixture
+def captured():
+    logger = logging.getLogger('tests.log')
+    handler = ListHandler()
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    yield logger, handler
+    logger.removeHandler(handler)
+
+class TestEventLogger:
+    def test_fields_format_lazily(self, captured):
+        """Test keyword fields are the record's format arguments"""
+        logger, handler = captured
+        events = EventLogger(logger, sample_every={}, max_per_second={})
+        events.info('enqueued', "Message %(message_id)s enqueued", message_id=7)
+        record = handler.records[0]
+        assert record.event == 'enqueued'
+        assert record.args == {'message_id': 7}
+        assert record.getMessage() == "Message 7 enqueued"
+
+    def test_disabled_level_is_skipped(self, captured):
+        """Test nothing is recorded below the logger level"""
+        logger, handler = captured
+        EventLogger(logger, sample_every={}, max_per_second={}).debug('x', "hidden")
+        assert handler.records == []
+
+    def test_sampling(self, captured):
+        """Test 1-in-N sampling per event"""
+        logger, handler = captured
+        events = EventLogger(logger, sample_every={'acked': 10}, max_per_second={})
+        for i in range(30):
+            events.info('acked', "Message %(message_id)s acked", message_id=i)
+            events.info('other', "kept")
+        acked = [r.args['message_id'] for r in handler.records if r.event == 'acked']
+        assert acked == [9, 19, 29]
+        assert len([r for r in handler.records if r.event == 'other']) == 30
+        assert events.suppressed == {'acked': 27}
+
+    def test_rate_limit(self, captured):
+        """Test max_per_second caps records per event"""
+        logger, handler = captured
+        events = EventLogger(logger, sample_every={}, max_per_second={'dead_lettered': 5})
+        for i in range(20):
+            events.error('dead_lettered', "Message %(message_id)s dead", message_id=i)
+        assert len(handler.records) == 5
+        assert events.suppressed == {'dead_lettered': 15}
+
+class TestHandlers:
+    def test_json_lines(self):
+        """Test records become JSON objects carrying their fields"""
+        record = logging.LogRecord('queue.manager', logging.INFO, __file__, 1,
+                                   "Message %(message_id)s enqueued", ({'message_id': 3},), None)
+        record.event = 'enqueued'
+        entry = json.loads(JsonFormatter().format(record))
+        assert entry['event'] == 'enqueued'
+        assert entry['message'] == "Message 3 enqueued"
+        assert entry['message_id'] == 3
+        assert entry['level'] == 'INFO'
+
+    def test_background_handler_writes_on_flush(self):
+        """Test records reach the target handlers from the writer thread"""
+        target = ListHandler()
+        background = BackgroundHandler([target])
+        logger = logging.getLogger('tests.background')
+        logger.addHandler(background)
+        logger.propagate = False
+        try:
+            for i in range(100):
+                logger.warning("record %s", i)
+            background.flush()
+            assert [r.getMessage() for r in target.records][-1] == "record 99"
+            assert len(target.records) == 100
+        finally:
+            logger.removeHandler(background)
+            background.close()
+
+    def test_background_handler_drops_oldest_when_full(self):
+        """Test a full backlog discards records instead of blocking"""
+        background = BackgroundHandler([ListHandler()], capacity=0)
+        background.close()
+        background.capacity = 2
+        for i in range(5):
+            background.emit(logging.LogRecord('x', logging.INFO, __file__, 1, str(i), (), None))
+        assert background.dropped == 3
+        assert len(background._records) == 2
+
+    def test_setup_logging(self, tmp_path):
+        """Test the configured handlers are moved behind the writer thread"""
+        root = logging.getLogger()
+        saved_handlers, saved_level = root.handlers[:], root.level
+        path = tmp_path / 'queue.jsonl'
+        try:
+            background = setup_logging({
+                'version': 1,
+                'formatters': {'json': {'()': 'queue.log.JsonFormatter'}},
+                'handlers': {'file': {'class': 'logging.FileHandler', 'filename': str(path),
+                                      'formatter': 'json'}},
+                'root': {'handlers': ['file'], 'level': 'INFO'},
+            })
+            assert root.handlers == [background]
+            logging.getLogger('tests.setup').info("hello %s", 'world')
+            background.flush()
+            assert json.loads(path.read_text())['message'] == "hello world"
+            background.close()
+        finally:
+            root.handlers = saved_handlers
+            root.setLevel(saved_level)
@@ -1,7 +1,9 @@
+import threading
+import time
 import pytest
 from datetime import datetime
 from queue.manager import QueueSystem
-from queue.failures import FailureType
+from queue.failures import FailureType, MessageFailure
 
 @pytest.fixture
 def queue_system():
@@ -71,4 +73,235 @@ class TestQueueSystem:
         health = queue_system.monitor_health()
         assert health['pending'] == 1
         assert health['processing'] == 0
-        assert health['dead_letter'] == 0
\ No newline at end of file
+        assert health['dead_letter'] == 0
+
+class TestConcurrentConsumers:
+    def test_run_processes_all_messages(self, queue_system):
+        """Test a worker pool drains the queue exactly once per message"""
+        seen = []
+        for i in range(200):
+            queue_system.enqueue({"n": i})
+
+        counts = queue_system.run(lambda message: seen.append(message['data']['n']), workers=8)
+        assert counts == {'processed': 200, 'failed': 0}
+        assert sorted(seen) == list(range(200))
+        assert queue_system.monitor_health()['pending'] == 0
+        assert queue_system.monitor_health()['processing'] == 0
+
+    def test_run_dead_letters_failing_messages(self, queue_system):
+        """Test handler exceptions are retried and then dead-lettered"""
+        def handler(message):
+            if message['data'].get('fail'):
+                raise ValueError("boom")
+
+        queue_system.enqueue({"fail": True})
+        queue_system.enqueue({"fail": False})
+        counts = queue_system.run(handler, workers=4)
+        assert counts['processed'] == 1
+        assert counts['failed'] == queue_system.max_retries
+        assert len(queue_system.dead_letter_queue) == 1
+
+    def test_typed_handler_failure(self, queue_system):
+        """Test MessageFailure routes through the FailureHandler strategy"""
+        queue_system.enqueue({"data": "test"})
+        message = queue_system.dequeue()
+
+        def handler(message):
+            raise MessageFailure("invalid payload", FailureType.VALIDATION)
+
+        assert queue_system.process_message(message, handler) is False
+        assert queue_system.dead_letter_queue == [message]
+
+    def test_nack_requeues(self, queue_system):
+        """Test nack returns an in-flight message to the queue"""
+        queue_system.enqueue({"data": "test"})
+        message = queue_system.dequeue()
+        assert queue_system.nack(message['id'], "try again") is True
+        assert message['attempt'] == 1
+        assert queue_system.dequeue() is message
+        assert queue_system.nack(12345) is False
+
+    def test_visibility_timeout_redelivers(self, queue_system):
+        """Test an unacked lease is redelivered as a timeout after it expires"""
+        queue_system.enqueue({"data": "test"})
+        message = queue_system.dequeue(visibility_timeout=30)
+        assert queue_system.requeue_expired() == []
+        expired = queue_system.requeue_expired(now=time.time() + 60)
+        assert expired == [message]
+        assert message['id'] not in queue_system.processing
+        assert message['last_failure']['type'] == 'timeout'
+        queue_system.dequeue_ready(now=time.time() + 600)
+        assert queue_system.dequeue() is message
+
+    def test_ack_cancels_lease(self, queue_system):
+        """Test acked messages are never redelivered"""
+        queue_system.enqueue({"data": "test"})
+        message = queue_system.dequeue(visibility_timeout=30)
+        queue_system.ack(message['id'])
+        assert queue_system.requeue_expired(now=time.time() + 60) == []
+
+    def test_blocking_dequeue_wakes_on_enqueue(self, queue_system):
+        """Test a blocked consumer is woken by a producer"""
+        timer = threading.Timer(0.05, queue_system.enqueue, args=({"data": "late"},))
+        timer.start()
+        message = queue_system.dequeue(block=True, timeout=2)
+        timer.join()
+        assert message['data'] == {"data": "late"}
+        assert queue_system.dequeue(block=True, timeout=0.01) is None
+
+class TestLeases:
+    def test_dequeue_leases_for_processing_timeout(self):
+        """Test dequeued messages are leased for PROCESSING_TIMEOUT by default"""
+        queue_system = QueueSystem()
+        queue_system.enqueue({"data": "test"})
+        message = queue_system.dequeue()
+        deadline = queue_system.leases.next_deadline()
+        assert queue_system.processing_timeout == 30
+        assert message['id'] in queue_system.leases
+        assert time.time() + 25 < deadline <= time.time() + 30
+
+    def test_zero_timeout_disables_leases(self):
+        """Test processing_timeout=0 hands out messages without leases"""
+        queue_system = QueueSystem(processing_timeout=0)
+        queue_system.enqueue({"data": "test"})
+        queue_system.dequeue()
+        assert len(queue_system.leases) == 0
+
+    def test_extend_lease(self, queue_system):
+        """Test a heartbeat pushes the lease deadline out"""
+        queue_system.enqueue({"data": "test"})
+        message = queue_system.dequeue(visibility_timeout=10)
+        assert queue_system.extend_lease(message['id'], 120) is True
+        assert queue_system.requeue_expired(now=time.time() + 60) == []
+        assert queue_system.extend_lease(12345) is False
+
+    def test_extend_lease_by_zero_expires_now(self, queue_system):
+        """Test seconds=0 is honoured rather than read as the default"""
+        queue_system.enqueue({"data": "test"})
+        message = queue_system.dequeue(visibility_timeout=60)
+        assert queue_system.extend_lease(message['id'], 0) is True
+        assert [m['id'] for m in queue_system.requeue_expired(now=time.time() + 1)] == [message['id']]
+        with pytest.raises(ValueError):
+            queue_system.extend_lease(message['id'], -1)
+
+    def test_reaper_fails_hung_messages(self):
+        """Test the reaper thread redelivers an expired lease as a timeout"""
+        queue_system = QueueSystem(processing_timeout=0.05)
+        queue_system.enqueue({"data": "hung"})
+        message = queue_system.dequeue()
+        queue_system.start_reaper()
+        try:
+            deadline = time.monotonic() + 5
+            while message['id'] in queue_system.processing and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            queue_system.stop_reaper()
+        assert message['id'] not in queue_system.processing
+        assert message['status'] == 'retry'
+        assert message['failure_count'] == {'timeout': 1}
+
+    def test_late_ack_cancels_timeout_retry(self, queue_system):
+        """Test acking after the lease expired stops the redelivery"""
+        queue_system.enqueue({"data": "slow"})
+        message = queue_system.dequeue(visibility_timeout=1)
+        queue_system.requeue_expired(now=time.time() + 5)
+        assert queue_system.ack(message['id']) is True
+        assert len(queue_system.scheduled) == 0
+
+class TestTTL:
+    def test_expire_due_drops_expired(self, queue_system):
+        """Test only messages past their TTL are dropped"""
+        queue_system.enqueue({'n': 1}, ttl=10)
+        queue_system.enqueue({'n': 2}, ttl=100)
+        queue_system.enqueue({'n': 3})
+        expired = queue_system.expire_due(time.time() + 50)
+        assert [m['data']['n'] for m in expired] == [1]
+        assert expired[0]['status'] == 'expired'
+        assert [m['data']['n'] for m in queue_system.queue] == [2, 3]
+        assert queue_system.metrics.expired.values() == {None: 1}
+
+    def test_expired_messages_are_not_dispatched(self, queue_system):
+        """Test a message past its TTL is expired instead of handed out"""
+        queue_system.enqueue({'n': 1}, ttl=0)
+        queue_system.enqueue({'n': 2})
+        assert queue_system.dequeue()['data']['n'] == 2
+        assert queue_system.dequeue() is None
+
+    def test_dead_letter_policy(self):
+        """Test expired messages can be dead-lettered instead of dropped"""
+        queue_system = QueueSystem(ttl=10, expired_policy='dead_letter')
+        queue_system.enqueue_many([{'n': 1}, {'n': 2}])
+        assert len(queue_system.expire_due(time.time() + 11)) == 2
+        assert [m['error'] for m in queue_system.dead_letter_queue] == ['Expired', 'Expired']
+
+    def test_scheduled_retries_expire(self, queue_system):
+        """Test a message waiting for a retry expires from the scheduler"""
+        queue_system.enqueue({'n': 1}, ttl=60)
+        message = queue_system.dequeue()
+        queue_system.nack(message['id'], 'down', FailureType.NETWORK)
+        assert message['id'] in queue_system.scheduled
+        assert queue_system.expire_due(time.time() + 61) == [message]
+        assert len(queue_system.scheduled) == 0
+
+    def test_in_flight_and_acked_messages_are_kept(self, queue_system):
+        """Test the sweep leaves in-flight work alone and forgets acked messages"""
+        queue_system.enqueue({'n': 1}, ttl=10)
+        queue_system.enqueue({'n': 2}, ttl=10)
+        in_flight = queue_system.dequeue()
+        acked = queue_system.dequeue()
+        queue_system.ack(acked['id'])
+        assert len(queue_system.expiry) == 1
+        assert queue_system.expire_due(time.time() + 11) == []
+        assert in_flight['id'] in queue_system.processing
+
+class TestBatchOperations:
+    def test_enqueue_many(self, queue_system):
+        """Test enqueueing a batch keeps order and returns ids"""
+        ids = queue_system.enqueue_many([{"n": i} for i in range(5)])
+        assert len(ids) == 5
+        assert [m['id'] for m in queue_system.queue] == ids
+        assert queue_system.enqueue_many([]) == []
+
+    def test_dequeue_batch(self, queue_system):
+        """Test dequeue_batch returns at most max_n messages"""
+        queue_system.enqueue_many([{"n": i} for i in range(5)])
+        batch = queue_system.dequeue_batch(3)
+        assert [m['data']['n'] for m in batch] == [0, 1, 2]
+        assert all(m['id'] in queue_system.processing for m in batch)
+        assert len(queue_system.dequeue_batch(10)) == 2
+        assert queue_system.dequeue_batch(10) == []
+
+    def test_dequeue_batch_waits_for_first_message(self, queue_system):
+        """Test dequeue_batch long-polls up to max_wait"""
+        timer = threading.Timer(0.05, queue_system.enqueue_many, args=([{"n": 1}, {"n": 2}],))
+        timer.start()
+        batch = queue_system.dequeue_batch(10, max_wait=2)
+        timer.join()
+        assert [m['data']['n'] for m in batch] == [1, 2]
+
+    def test_ack_many(self, queue_system):
+        """Test acknowledging a batch of in-flight messages"""
+        queue_system.enqueue_many([{"n": i} for i in range(3)])
+        batch = queue_system.dequeue_batch(3)
+        assert queue_system.ack_many([m['id'] for m in batch] + [999]) == 3
+        assert all(m['status'] == 'completed' for m in batch)
+        assert len(queue_system.processing) == 0
+
+    def test_nack_many(self, queue_system):
+        """Test failing a batch of in-flight messages"""
+        queue_system.enqueue_many([{"n": i} for i in range(3)])
+        batch = queue_system.dequeue_batch(3)
+        assert queue_system.nack_many([m['id'] for m in batch], "bad", FailureType.VALIDATION) == 3
+        assert len(queue_system.dead_letter_queue) == 3
+
+    def test_nack_many_schedules_retries(self, queue_system):
+        """Test a typed batch failure schedules every message within the backoff window"""
+        queue_system.enqueue_many([{"n": i} for i in range(4)])
+        batch = queue_system.dequeue_batch(4)
+        ids = [m['id'] for m in batch] + [batch[0]['id']]
+        start = time.time()
+        assert queue_system.nack_many(ids, "down", FailureType.NETWORK) == 4
+        assert len(queue_system.scheduled) == 4
+        # NETWORK backs off 10s with equal jitter: [5s, 10s)
+        assert all(start + 5 <= m.next_process_at < time.time() + 10 for m in batch)
+        assert all(m['attempt'] == 1 and m['status'] == 'retry' for m in batch)
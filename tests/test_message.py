@@ -0,0 +1,93 @@
+import pickle
+import pytest
+from datetime import datetime, UTC
+from queue.message import Message, DEAD_LETTER, FAILURE_CODES
+from queue.handler import FailureHandler
+from queue.failures import FailureType
+
+@pytest.fixture
+def message():
+    return Message(1, {'test': 'data'}, created_at=1704067200.0)
+
+class TestMessage:
+    def test_has_no_instance_dict(self, message):
+        """Test the record is slot-based"""
+        assert not hasattr(message, '__dict__')
+
+    def test_dict_view(self, message):
+        """Test the wrapper keys existing callers read"""
+        assert message['id'] == 1
+        assert message['data'] == {'test': 'data'}
+        assert message['attempt'] == 0
+        assert message['status'] == 'pending'
+        assert message['timestamp'] == '2024-01-01T00:00:00+00:00'
+        assert 'error' not in message
+        assert message.get('error', 'none') == 'none'
+        assert set(message) == {'id', 'data', 'attempt', 'timestamp', 'status'}
+
+    def test_status_is_integer_coded(self, message):
+        """Test status strings are stored as codes"""
+        message['status'] = 'dead_letter'
+        assert message.status_code == DEAD_LETTER
+        assert message.status == 'dead_letter'
+        with pytest.raises(KeyError):
+            message['status'] = 'unknown'
+
+    def test_next_process_time_round_trip(self, message):
+        """Test datetimes are stored as epoch floats and read back as datetimes"""
+        when = datetime(2024, 1, 1, 0, 5, tzinfo=UTC)
+        message['next_process_time'] = when
+        assert message.next_process_at == when.timestamp()
+        assert message['next_process_time'] == when
+        assert message.pop('next_process_time') == when
+        assert 'next_process_time' not in message
+        assert message.pop('next_process_time', None) is None
+
+    def test_extra_keys(self, message):
+        """Test unknown keys are kept in the extra dict"""
+        message['next_retry'] = 12.5
+        assert message['next_retry'] == 12.5
+        del message['next_retry']
+        assert 'next_retry' not in message
+        with pytest.raises(KeyError):
+            message['missing']
+
+    def test_failure_handler_compatibility(self, message):
+        """Test FailureHandler works on Message records"""
+        handler = FailureHandler()
+        handler.handle_message_failure(message, FailureType.NETWORK)
+        first = message['next_process_time']
+        handler.handle_message_failure(message, FailureType.NETWORK)
+        assert message['next_process_time'] > first
+        assert message['failure_count'] == {'network': 2}
+        assert message.failure_counts[FAILURE_CODES['network']] == 2
+        assert message['last_failure']['type'] == 'network'
+        assert message['status'] == 'retry'
+
+        handler.handle_message_failure(message, FailureType.BUSINESS)
+        assert message['status'] == 'dead_letter'
+        assert 'next_process_time' not in message
+
+    def test_pickle_round_trip(self, message):
+        """Test messages survive the WAL and process pool serialization"""
+        message['error'] = 'boom'
+        message['next_retry'] = 3.0
+        restored = pickle.loads(pickle.dumps(message, protocol=5))
+        assert restored.to_dict() == message.to_dict()
+
+    def test_from_dict(self):
+        """Test converting a legacy dict wrapper"""
+        message = Message.from_dict({
+            'id': 'abc', 'data': {}, 'attempt': 2, 'status': 'failed',
+            'timestamp': '2024-01-01T00:00:00', 'failures': []
+        })
+        assert message.attempt == 2
+        assert message['status'] == 'failed'
+        assert message.created_at == 1704067200.0
+        assert message['failures'] == []
+
+    def test_identity_equality(self, message):
+        """Test messages are entities compared by identity"""
+        other = Message(1, {'test': 'data'}, created_at=1704067200.0)
+        assert message == message
+        assert message != other
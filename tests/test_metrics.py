@@ -0,0 +1,128 @@
+import threading
+import urllib.request
+import pytest
+from queue.failures import FailureType
+from queue.manager import QueueSystem
+from queue.metrics import Counter, Histogram, Metrics
+from queue.partitioned import PartitionedQueueSystem
+
+@pytest.fixture
+def queue_system():
+    return QueueSystem()
+
+class TestCounter:
+    def test_labels(self):
+        """Test counts are kept per label value"""
+        counter = Counter('failures_total', 'Failures', 'failure_type')
+        counter.inc(1, 'network')
+        counter.inc(2, 'network')
+        counter.inc(1, 'timeout')
+        assert counter.values() == {'network': 3, 'timeout': 1}
+
+    def test_threads_sum(self):
+        """Test increments from several threads are all counted"""
+        counter = Counter('enqueued_total', 'Enqueued')
+
+        def work():
+            for _ in range(10_000):
+                counter.inc()
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert counter.values() == {None: 40_000}
+
+class TestHistogram:
+    def test_buckets(self):
+        """Test observations land in the first bucket whose bound covers them"""
+        histogram = Histogram('latency', 'Latency', buckets=(0.1, 1, 10))
+        for value in (0.05, 0.1, 0.5, 5, 50):
+            histogram.observe(value)
+        counts, total = histogram.totals()
+        assert counts == [2, 1, 1, 1]
+        assert total == pytest.approx(55.65)
+
+    def test_quantile(self):
+        """Test quantiles resolve to bucket upper bounds"""
+        histogram = Histogram('latency', 'Latency', buckets=(0.1, 1, 10))
+        for _ in range(99):
+            histogram.observe(0.01)
+        histogram.observe(5)
+        assert histogram.quantile(0.5) == 0.1
+        assert histogram.quantile(1.0) == 10
+
+class TestQueueMetrics:
+    def test_message_lifecycle(self, queue_system):
+        """Test enqueue, dispatch, handler and ack are recorded"""
+        queue_system.enqueue({'n': 1})
+        queue_system.enqueue_many([{'n': 2}, {'n': 3}])
+        message = queue_system.dequeue()
+        queue_system.process_message(message, lambda m: None)
+        snapshot = queue_system.metrics.snapshot()
+        assert snapshot['counters']['queue_enqueued_total'] == 3
+        assert snapshot['histograms']['queue_wait_seconds']['count'] == 1
+        assert snapshot['histograms']['queue_handler_seconds']['count'] == 1
+        assert snapshot['histograms']['queue_ack_latency_seconds']['count'] == 1
+        assert snapshot['gauges']['pending'] == 2
+
+    def test_failures_by_type(self, queue_system):
+        """Test failures, retries and dead letters are counted per failure type"""
+        queue_system.enqueue({'n': 1})
+        queue_system.enqueue({'n': 2})
+        first = queue_system.dequeue()
+        second = queue_system.dequeue()
+        queue_system.nack(first['id'], 'down', FailureType.NETWORK)
+        queue_system.nack(second['id'], 'bad', FailureType.BUSINESS)
+        counters = queue_system.metrics.snapshot()['counters']
+        assert counters['queue_failures_total'] == {'network': 1, 'business': 1}
+        assert counters['queue_retries_total'] == {'network': 1}
+        assert counters['queue_dead_lettered_total'] == {'business': 1}
+
+    def test_prometheus_text(self, queue_system):
+        """Test the exposition format has typed counters, cumulative buckets and gauges"""
+        queue_system.enqueue({'n': 1})
+        message = queue_system.dequeue()
+        queue_system.nack(message['id'], 'down', FailureType.NETWORK)
+        text = queue_system.metrics.to_prometheus()
+        assert '# TYPE queue_enqueued_total counter\nqueue_enqueued_total 1\n' in text
+        assert 'queue_failures_total{failure_type="network"} 1' in text
+        assert 'queue_wait_seconds_bucket{le="+Inf"} 1' in text
+        assert 'queue_wait_seconds_count 1' in text
+        assert 'queue_scheduled 1' in text
+
+    def test_write_prometheus(self, queue_system, tmp_path):
+        """Test the text file is written in place of any previous one"""
+        path = tmp_path / 'queue.prom'
+        queue_system.enqueue({'n': 1})
+        queue_system.metrics.write_prometheus(str(path))
+        assert 'queue_enqueued_total 1' in path.read_text()
+        assert [p.name for p in tmp_path.iterdir()] == ['queue.prom']
+
+    def test_serve(self, queue_system):
+        """Test the HTTP endpoint serves /metrics"""
+        queue_system.enqueue({'n': 1})
+        server = queue_system.metrics.serve()
+        try:
+            host, port = server.server_address
+            with urllib.request.urlopen(f"http://{host}:{port}/metrics") as response:
+                body = response.read().decode()
+        finally:
+            server.shutdown()
+            server.server_close()
+        assert 'queue_enqueued_total 1' in body
+
+    def test_throughput(self):
+        """Test rates are counter deltas over elapsed time"""
+        before = {'time': 10.0, 'counters': {'queue_enqueued_total': 100}}
+        after = {'time': 12.0, 'counters': {'queue_enqueued_total': 300, 'by_type': {}}}
+        assert Metrics.throughput(before, after) == {'queue_enqueued_total': 100.0}
+
+    def test_partitions_share_metrics(self):
+        """Test partitioned shards record into one registry"""
+        partitioned = PartitionedQueueSystem(partitions=3)
+        partitioned.enqueue_many([{'user_id': n} for n in range(9)])
+        snapshot = partitioned.metrics.snapshot()
+        assert snapshot['counters']['queue_enqueued_total'] == 9
+        assert snapshot['gauges']['pending'] == 9
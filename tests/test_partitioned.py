@@ -0,0 +1,86 @@
+import threading
+import pytest
+from queue.partitioned import PartitionedQueueSystem
+from queue.failures import FailureType
+
+@pytest.fixture
+def partitioned():
+    return PartitionedQueueSystem(partitions=4, key='user_id')
+
+class TestRouting:
+    def test_same_key_same_shard(self, partitioned):
+        """Test every message for a key lands on one shard"""
+        for n in range(10):
+            partitioned.enqueue({'user_id': 'alice', 'n': n})
+        sizes = [len(shard.queue) for shard in partitioned.shards]
+        assert sorted(sizes) == [0, 0, 0, 10]
+
+    def test_stable_hash(self, partitioned):
+        """Test the partition does not depend on the process hash seed"""
+        other = PartitionedQueueSystem(partitions=4, key='user_id')
+        assert partitioned.partition_for({'user_id': 42}) == other.partition_for({'user_id': 42})
+
+    def test_keyless_messages_spread(self, partitioned):
+        """Test messages without the key are spread round robin"""
+        partitioned.enqueue_many([{'n': n} for n in range(8)])
+        assert [len(shard.queue) for shard in partitioned.shards] == [2, 2, 2, 2]
+
+    def test_enqueue_many_returns_ids_in_order(self, partitioned):
+        """Test ids line up with the input messages"""
+        messages = [{'user_id': n % 3, 'n': n} for n in range(9)]
+        ids = partitioned.enqueue_many(messages)
+        for message_id, payload in zip(ids, messages):
+            assert partitioned.shard_of(message_id).queue.get(message_id)['data'] == payload
+
+    def test_ack_and_nack_find_the_shard(self, partitioned):
+        """Test acknowledgements are routed to the owning shard"""
+        partitioned.enqueue({'user_id': 'bob'})
+        partitioned.enqueue({'user_id': 'carol'})
+        first = partitioned.dequeue()
+        second = partitioned.dequeue()
+        assert partitioned.ack(first['id']) is True
+        assert partitioned.nack(second['id'], 'bad', FailureType.BUSINESS) is True
+        health = partitioned.monitor_health()
+        assert health['processing'] == 0
+        assert health['dead_letter'] == 1
+        assert partitioned.ack(12345) is False
+
+class TestConsumerGroup:
+    def test_rebalance_on_join_and_leave(self, partitioned):
+        """Test shards are spread over consumers and handed back on leave"""
+        assert partitioned.join('a') == [0, 1, 2, 3]
+        partitioned.join('b')
+        assert partitioned.assignment('a') == [0, 2]
+        assert partitioned.assignment('b') == [1, 3]
+        generation = partitioned.generation
+        partitioned.leave('a')
+        assert partitioned.assignment('b') == [0, 1, 2, 3]
+        assert partitioned.generation == generation + 1
+
+    def test_consumer_only_sees_owned_shards(self, partitioned):
+        """Test dequeue for a consumer is limited to its shards"""
+        partitioned.join('a')
+        partitioned.join('b')
+        partitioned.enqueue_many([{'n': n} for n in range(4)])
+        taken = [partitioned.dequeue('a') for _ in range(3)]
+        assert taken[2] is None
+        owners = {partitioned.shards.index(partitioned.shard_of(m['id'])) for m in taken[:2]}
+        assert owners == {0, 2}
+
+class TestRun:
+    def test_per_key_order(self, partitioned):
+        """Test run keeps messages for each key in enqueue order"""
+        seen = {}
+        seen_lock = threading.Lock()
+
+        def handler(message):
+            with seen_lock:
+                seen.setdefault(message['data']['user_id'], []).append(message['data']['n'])
+
+        partitioned.enqueue_many([{'user_id': n % 5, 'n': n} for n in range(200)])
+        counts = partitioned.run(handler, poll_interval=0.01)
+        assert counts == {'processed': 200, 'failed': 0}
+        for user_id, ns in seen.items():
+            assert ns == sorted(ns)
+        assert partitioned.generation > 0
+        assert partitioned.assignment('partition-worker-0') == []
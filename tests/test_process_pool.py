@@ -0,0 +1,105 @@
+import os
+import pickle
+import pytest
+from multiprocessing import Pipe
+from queue.manager import QueueSystem
+from queue.failures import FailureType, MessageFailure
+from queue import utils
+from queue.codec import get_codec
+from queue.message import Message
+from queue.process_pool import send_frames, recv_frames, _batch_records, OUT_OF_BAND_BYTES
+
+def square(message):
+    return message['data']['n'] ** 2
+
+def reject_odd(message):
+    if message['data']['n'] % 2:
+        raise MessageFailure("odd input", FailureType.VALIDATION)
+
+def record_node_id(message):
+    with open(message['data']['path'], 'a') as f:
+        f.write(f"{os.getpid()} {utils._id_generator.node_id}\n")
+
+def crash_on_first_attempt(message):
+    if message['data'].get('crash') and message['attempt'] == 0:
+        os._exit(1)
+
+@pytest.fixture
+def queue_system():
+    return QueueSystem()
+
+class TestFrames:
+    def test_round_trip_with_out_of_band_buffer(self):
+        """Test pickle protocol 5 buffers survive the pipe"""
+        parent, child = Pipe()
+        payload = bytearray(b'x' * 100000)
+        send_frames(parent, {'blob': pickle.PickleBuffer(payload), 'n': 1})
+        received = recv_frames(child)
+        assert bytes(received['blob']) == bytes(payload)
+        assert received['n'] == 1
+
+    def test_large_payloads_are_sent_out_of_band(self):
+        """Test a dispatched batch sends large encoded payloads as raw frames"""
+        large = Message(1, {'blob': 'x' * OUT_OF_BAND_BYTES})
+        small = Message(2, {'n': 2})
+        plain = Message(3, {'n': 3})
+        large.encode(get_codec('json'))
+        small.encode(get_codec('json'))
+        buffers = []
+        pickle.dumps(_batch_records([large, small, plain]), protocol=5,
+                     buffer_callback=buffers.append)
+        assert [bytes(buffer.raw()) for buffer in buffers] == [large.payload]
+
+        parent, child = Pipe()
+        send_frames(parent, _batch_records([large, small, plain]))
+        received = recv_frames(child)
+        assert received[0] == (1, None, large.payload, 0)
+        assert received[1] == (2, None, small.payload, 0)
+        assert received[2] == (3, {'n': 3}, None, 0)
+
+class TestProcessWorkerPool:
+    def test_processes_all_messages(self, queue_system):
+        """Test every message is acked by a worker process"""
+        for i in range(100):
+            queue_system.enqueue({"n": i})
+        counts = queue_system.run_processes(square, processes=2, batch_size=8)
+        assert counts == {'processed': 100, 'failed': 0, 'crashed_workers': 0}
+        assert queue_system.monitor_health()['processing'] == 0
+        assert queue_system.monitor_health()['pending'] == 0
+
+    def test_failure_types_flow_back(self, queue_system):
+        """Test MessageFailure raised in a worker reaches the FailureHandler"""
+        for i in range(4):
+            queue_system.enqueue({"n": i})
+        counts = queue_system.run_processes(reject_odd, processes=2, batch_size=1)
+        assert counts['processed'] == 2
+        assert len(queue_system.dead_letter_queue) == 2
+        assert all(m['last_failure']['type'] == 'validation' for m in queue_system.dead_letter_queue)
+
+    def test_worker_crash_is_recovered(self, queue_system):
+        """Test messages held by a dead worker are recovered and retried"""
+        queue_system.enqueue({"crash": True})
+        queue_system.enqueue({"crash": False})
+        counts = queue_system.run_processes(crash_on_first_attempt, processes=1, batch_size=2)
+        assert counts['crashed_workers'] == 1
+        assert counts['processed'] == 2
+        assert queue_system.dead_letter_queue == []
+
+    def test_recover_selected_messages(self, queue_system):
+        """Test recovery can be limited to one consumer's messages"""
+        queue_system.enqueue({"n": 1})
+        queue_system.enqueue({"n": 2})
+        first, second = queue_system.dequeue(), queue_system.dequeue()
+        queue_system.recover_processing_messages([first['id']])
+        assert list(queue_system.processing) == [second['id']]
+        assert first['attempt'] == 1
+
+    def test_workers_get_distinct_node_ids(self, queue_system, tmp_path):
+        """Test worker processes generate ids under their own node ids"""
+        path = str(tmp_path / 'nodes')
+        queue_system.enqueue_many([{'path': path} for _ in range(64)])
+        queue_system.run_processes(record_node_id, processes=3, batch_size=1)
+        with open(path) as f:
+            nodes = dict(line.split() for line in f)
+        assert len(set(nodes.values())) == len(nodes)
+        assert str(utils._id_generator.node_id) not in nodes.values()
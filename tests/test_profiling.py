@@ -0,0 +1,101 @@
+import time
+import pytest
+from queue.failures import FailureType, MessageFailure
+from queue.manager import QueueSystem
+from queue.profiling import Hook, PhaseTimer, SamplingProfiler
+
+class RecordingHook(Hook):
+    def __init__(self):
+        self.calls = []
+
+    def before(self, phase, args):
+        self.calls.append(('before', phase))
+
+    def after(self, phase, args, elapsed):
+        self.calls.append(('after', phase))
+
+@pytest.fixture
+def queue_system():
+    return QueueSystem()
+
+class TestHooks:
+    def test_disabled_by_default(self, queue_system):
+        """Test uninstrumented queues run the plain class methods"""
+        assert 'enqueue' not in vars(queue_system)
+        assert 'log' not in vars(queue_system.events)
+
+    def test_phases_are_reported(self, queue_system):
+        """Test hooks see enqueue, dispatch, handler and ack"""
+        hook = RecordingHook()
+        queue_system.add_hook(hook)
+        queue_system.enqueue({'n': 1})
+        queue_system.process_message(queue_system.dequeue(), lambda message: None)
+        phases = [phase for event, phase in hook.calls if event == 'before']
+        assert phases[:2] == ['enqueue', 'logging']
+        assert 'dispatch' in phases and 'handler' in phases and 'ack' in phases
+
+    def test_failure_phases_nest(self, queue_system):
+        """Test the failure strategy and DLQ move run inside the failure phase"""
+        hook = RecordingHook()
+        queue_system.add_hook(hook)
+        queue_system.enqueue({'n': 1})
+        message = queue_system.dequeue()
+        queue_system.nack(message['id'], 'bad', FailureType.BUSINESS)
+        calls = [call for call in hook.calls if call[1] != 'logging']
+        assert calls[-6:] == [('before', 'failure'), ('before', 'failure_strategy'),
+                              ('after', 'failure_strategy'), ('before', 'dead_letter'),
+                              ('after', 'dead_letter'), ('after', 'failure')]
+
+    def test_remove_last_hook_restores_methods(self, queue_system):
+        """Test removing the last hook unwraps the instance"""
+        hook = RecordingHook()
+        queue_system.add_hook(hook)
+        queue_system.remove_hook(hook)
+        assert 'enqueue' not in vars(queue_system)
+        assert 'process_message' not in vars(queue_system)
+        queue_system.enqueue({'n': 1})
+        assert hook.calls == []
+
+class TestPhaseTimer:
+    def test_self_time_excludes_nested_phases(self, queue_system):
+        """Test handler time is not counted again as bookkeeping"""
+        timer = PhaseTimer()
+        queue_system.add_hook(timer)
+        queue_system.enqueue({'n': 1})
+        queue_system.process_message(queue_system.dequeue(), lambda message: time.sleep(0.02))
+        stats = timer.snapshot()
+        assert stats['handler']['calls'] == 1
+        assert stats['handler']['self'] >= 0.02
+        assert stats['enqueue']['self'] <= stats['enqueue']['total']
+        assert 'handler' in timer.report()
+
+    def test_exception_still_times(self, queue_system):
+        """Test a raising handler is timed and failed"""
+        timer = PhaseTimer()
+        queue_system.add_hook(timer)
+        queue_system.enqueue({'n': 1})
+
+        def handler(message):
+            raise MessageFailure("down", FailureType.NETWORK)
+
+        assert queue_system.process_message(queue_system.dequeue(), handler) is False
+        stats = timer.snapshot()
+        assert stats['handler']['calls'] == 1
+        assert stats['failure_strategy']['calls'] == 1
+
+class TestSamplingProfiler:
+    def test_samples_are_tagged_by_phase(self, queue_system, tmp_path):
+        """Test samples taken inside the handler land under its phase"""
+        queue_system.enqueue({'n': 1})
+        with SamplingProfiler(queue_system, interval=0.001) as profiler:
+            message = queue_system.dequeue()
+            queue_system.process_message(message, lambda m: time.sleep(0.05))
+        assert profiler.phase_samples().get('handler', 0) > 0
+        assert 'enqueue' not in vars(queue_system)
+
+        path = tmp_path / 'queue.collapsed'
+        profiler.dump(str(path))
+        lines = path.read_text().splitlines()
+        assert any(line.startswith('handler;') for line in lines)
+        stack, count = lines[0].rsplit(' ', 1)
+        assert int(count) > 0
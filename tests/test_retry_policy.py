@@ -0,0 +1,77 @@
+import random
+import pytest
+from queue.failures import FailureType
+from queue.handler import FailureHandler
+from queue.retry_policy import RetryPolicy, compile_policies
+
+class TestRetryPolicy:
+    def test_exponential_delays_are_capped(self):
+        """Test the delay table doubles per failure up to max_delay"""
+        policy = RetryPolicy(max_retries=5, base_delay=10, max_delay=60, jitter='none')
+        assert policy.delays == (10, 20, 40, 60, 60)
+        assert policy.delay(3) == 40
+        assert policy.delay(0) == 10
+
+    def test_fixed_backoff(self):
+        """Test fixed backoff waits the base delay every time"""
+        policy = RetryPolicy(max_retries=3, base_delay=60, backoff='fixed', jitter='none')
+        assert policy.delays == (60, 60, 60)
+
+    def test_strategy_past_max_retries(self):
+        """Test failures beyond max_retries dead-letter"""
+        policy = RetryPolicy('retry_with_backoff', max_retries=2)
+        assert policy.strategy_for(2) == 'retry_with_backoff'
+        assert policy.strategy_for(3) == 'dead_letter'
+        assert RetryPolicy('dead_letter', max_retries=3).strategy_for(1) == 'dead_letter'
+
+    @pytest.mark.parametrize('jitter, low, high', [
+        ('full', 0, 40), ('equal', 20, 40), ('decorrelated', 10, 60)
+    ])
+    def test_jitter_bounds(self, jitter, low, high):
+        """Test jittered delays stay inside each scheme's window"""
+        policy = RetryPolicy(max_retries=5, base_delay=10, max_delay=60, jitter=jitter)
+        rng = random.Random(7)
+        delays = [policy.delay(3, 20, rng.random) for _ in range(1000)]
+        assert all(low <= delay <= high for delay in delays)
+        assert len(set(delays)) > 900
+
+    def test_rejects_unknown_settings(self):
+        """Test typos in a policy fail at compile time"""
+        with pytest.raises(ValueError):
+            RetryPolicy(jitter='fuzzy')
+        with pytest.raises(ValueError):
+            RetryPolicy('retry_eventually')
+
+class TestCompilePolicies:
+    def test_reads_config(self):
+        """Test the default policies follow RETRY_POLICIES and MAX_RETRIES"""
+        policies = compile_policies()
+        assert policies[FailureType.NETWORK].strategy == 'retry_with_backoff'
+        assert policies[FailureType.NETWORK].max_retries == 5
+        assert policies[FailureType.TIMEOUT].delays == (5, 10, 20)
+        assert policies[FailureType.BUSINESS].strategy_for(1) == 'dead_letter'
+
+    def test_custom_policies_drive_the_handler(self):
+        """Test FailureHandler uses the given policies and random source"""
+        policies = compile_policies({'NETWORK': {'base_delay': 1, 'max_retries': 1,
+                                                 'jitter': 'none'}})
+        handler = FailureHandler(policies=policies, rng=random.Random(1))
+        assert handler.max_retries[FailureType.NETWORK] == 1
+        message = {'id': 1, 'data': {}, 'status': 'processing'}
+        handler.handle_message_failure(message, FailureType.NETWORK)
+        assert message['status'] == 'retry'
+        handler.handle_message_failure(message, FailureType.NETWORK)
+        assert message['status'] == 'dead_letter'
+
+    def test_decorrelated_grows_from_previous_delay(self):
+        """Test decorrelated jitter remembers each message's last delay"""
+        policies = compile_policies({'NETWORK': {'base_delay': 1, 'max_delay': 1000,
+                                                 'jitter': 'decorrelated'}},
+                                    {'NETWORK': 10})
+        handler = FailureHandler(policies=policies, rng=random.Random(3))
+        message = {'id': 1, 'data': {}, 'status': 'processing'}
+        previous = None
+        for _ in range(5):
+            handler.handle_message_failure(message, FailureType.NETWORK)
+            assert 1 <= message['retry_delay'] <= 3 * (previous or 1)
+            previous = message['retry_delay']
@@ -0,0 +1,129 @@
+import threading
+import time
+import pytest
+from datetime import datetime, timedelta, UTC
+from queue.scheduler import RetryScheduler, message_deadline
+from queue.manager import QueueSystem
+from queue.failures import FailureType
+
+def _message(message_id, **fields):
+    return dict({'id': message_id, 'data': {}, 'attempt': 0, 'status': 'retry'}, **fields)
+
+@pytest.fixture
+def scheduler():
+    return RetryScheduler()
+
+class TestRetryScheduler:
+    def test_dequeue_ready_returns_only_due(self, scheduler):
+        """Test only messages whose deadline passed are returned"""
+        scheduler.schedule(_message('late'), 200.0)
+        scheduler.schedule(_message('early'), 100.0)
+        scheduler.schedule(_message('mid'), 150.0)
+        assert [m['id'] for m in scheduler.dequeue_ready(now=160.0)] == ['early', 'mid']
+        assert len(scheduler) == 1
+        assert scheduler.next_deadline() == 200.0
+
+    def test_cancel(self, scheduler):
+        """Test cancelled messages are never returned"""
+        scheduler.schedule(_message('a'), 100.0)
+        scheduler.schedule(_message('b'), 110.0)
+        assert scheduler.cancel('a')['id'] == 'a'
+        assert scheduler.next_deadline() == 110.0
+        assert [m['id'] for m in scheduler.dequeue_ready(now=200.0)] == ['b']
+
+    def test_reschedule_replaces_entry(self, scheduler):
+        """Test scheduling the same id twice keeps only the latest deadline"""
+        scheduler.schedule(_message('a'), 100.0)
+        scheduler.schedule(_message('a'), 300.0)
+        assert scheduler.dequeue_ready(now=200.0) == []
+        assert len(scheduler) == 1
+
+    def test_message_deadline_fields(self):
+        """Test deadlines are read from next_process_time and next_retry"""
+        when = datetime(2024, 1, 1, tzinfo=UTC)
+        assert message_deadline({'next_process_time': when}) == when.timestamp()
+        assert message_deadline({'next_process_time': when.replace(tzinfo=None)}) == when.timestamp()
+        assert message_deadline({'next_retry': 42.5}) == 42.5
+        assert message_deadline({}) is None
+
+    def test_wait_next_sleeps_until_deadline(self, scheduler):
+        """Test wait_next blocks until the earliest deadline"""
+        scheduler.schedule(_message('a'), time.time() + 0.05)
+        start = time.monotonic()
+        ready = scheduler.wait_next(timeout=2)
+        assert [m['id'] for m in ready] == ['a']
+        assert time.monotonic() - start >= 0.04
+
+    def test_wait_next_wakes_on_earlier_schedule(self, scheduler):
+        """Test scheduling an earlier deadline wakes a sleeping waiter"""
+        scheduler.schedule(_message('far'), time.time() + 60)
+        timer = threading.Timer(0.05, scheduler.schedule, args=(_message('near'), time.time()))
+        timer.start()
+        ready = scheduler.wait_next(timeout=2)
+        timer.join()
+        assert [m['id'] for m in ready] == ['near']
+
+    def test_wait_next_timeout(self, scheduler):
+        """Test wait_next returns empty when nothing becomes due"""
+        assert scheduler.wait_next(timeout=0.01) == []
+
+    def test_wake_interrupts_wait_next(self, scheduler):
+        """Test wake() releases a thread blocked in wait_next"""
+        timer = threading.Timer(0.05, scheduler.wake)
+        timer.start()
+        start = time.monotonic()
+        assert scheduler.wait_next(timeout=5) == []
+        assert time.monotonic() - start < 1
+
+    def test_cancelled_entries_are_compacted(self, scheduler):
+        """Test cancelling most of the heap doesn't leave it full of dead entries"""
+        for i in range(1000):
+            scheduler.schedule(_message(i), deadline=time.time() + 1000 - i)
+        for i in range(1000):
+            if i % 3:
+                scheduler.cancel(i)
+        assert len(scheduler._heap) <= 2 * len(scheduler)
+        assert [message['id'] for message in scheduler.dequeue_ready(time.time() + 2000)] == \
+            list(range(999, -1, -3))
+
+class TestQueueSystemRetries:
+    def test_typed_failure_is_scheduled(self):
+        """Test a typed failure parks the message until next_process_time"""
+        queue_system = QueueSystem()
+        queue_system.enqueue({"data": "test"})
+        message = queue_system.dequeue()
+        queue_system.handle_failure(message, "timed out", FailureType.TIMEOUT)
+        assert message['status'] == 'retry'
+        assert len(queue_system.queue) == 0
+        assert queue_system.monitor_health()['scheduled'] == 1
+        assert queue_system.dequeue() is None
+
+        due = message['next_process_time'] + timedelta(seconds=1)
+        ready = queue_system.dequeue_ready(now=due.timestamp())
+        assert ready == [message]
+        assert message['status'] == 'pending'
+        assert queue_system.dequeue() is message
+
+    def test_typed_failure_dead_letter(self):
+        """Test non-retryable failure types go straight to the DLQ"""
+        queue_system = QueueSystem()
+        queue_system.enqueue({"data": "test"})
+        message = queue_system.dequeue()
+        queue_system.handle_failure(message, "bad input", FailureType.VALIDATION)
+        assert queue_system.dead_letter_queue == [message]
+        assert len(queue_system.scheduled) == 0
+
+    def test_acked_leases_do_not_accumulate(self):
+        """Test the lease heap stays bounded across many dequeue/ack cycles"""
+        queue_system = QueueSystem(max_size=0)
+        for i in range(5000):
+            queue_system.enqueue({'n': i})
+            queue_system.ack(queue_system.dequeue()['id'])
+        assert len(queue_system.leases._heap) == 0
+        # Acked newest first, so the earliest lease stays at the top of the heap
+        queue_system.enqueue_many([{'n': i} for i in range(5000)])
+        messages = queue_system.dequeue_batch(5000)
+        for message in reversed(messages[1:]):
+            queue_system.ack(message['id'])
+        assert len(queue_system.leases) == 1
+        assert len(queue_system.leases._heap) <= RetryScheduler.COMPACT_MIN
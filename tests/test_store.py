@@ -0,0 +1,135 @@
+import pytest
+from queue.store import PendingQueue, PriorityPendingQueue
+from queue.manager import QueueSystem
+
+def _message(message_id, priority=None):
+    message = {'id': message_id, 'data': {}, 'attempt': 0, 'status': 'pending'}
+    if priority is not None:
+        message['priority'] = priority
+    return message
+
+@pytest.fixture
+def pending():
+    return PendingQueue()
+
+class TestPendingQueue:
+    def test_fifo_order(self, pending):
+        """Test messages are popped in insertion order"""
+        for i in range(3):
+            pending.append(_message(i))
+        assert [pending.popleft()['id'] for _ in range(3)] == [0, 1, 2]
+        assert len(pending) == 0
+
+    def test_remove_by_id(self, pending):
+        """Test removing a message from the middle of the queue"""
+        for i in range(3):
+            pending.append(_message(i))
+        assert pending.discard(1)['id'] == 1
+        assert pending.discard(1) is None
+        assert [m['id'] for m in pending] == [0, 2]
+
+    def test_list_compatibility(self, pending):
+        """Test list-style access used by existing callers"""
+        first, last = _message('a'), _message('b')
+        pending.append(first)
+        pending.append(last)
+        assert pending[0] is first
+        assert pending[-1] is last
+        assert first in pending
+        pending.remove(first)
+        assert first not in pending
+        with pytest.raises(ValueError):
+            pending.remove(first)
+
+    def test_duplicate_id_rejected(self, pending):
+        """Test a message id can only be pending once"""
+        pending.append(_message('a'))
+        with pytest.raises(ValueError):
+            pending.append(_message('a'))
+
+    def test_appendleft(self, pending):
+        """Test pushing a message back to the head of the queue"""
+        pending.append(_message(1))
+        pending.appendleft(_message(0))
+        assert pending.peek()['id'] == 0
+
+class TestPriorityPendingQueue:
+    @pytest.fixture
+    def prioritized(self):
+        return PriorityPendingQueue({'high': 3, 'low': 1}, default_priority='low')
+
+    def test_single_level_is_fifo(self, prioritized):
+        """Test one busy level behaves like a plain FIFO"""
+        for i in range(3):
+            prioritized.append(_message(i))
+        assert [prioritized.popleft()['id'] for _ in range(3)] == [0, 1, 2]
+
+    def test_weighted_fair_share(self, prioritized):
+        """Test dequeues follow the weights while both levels are busy"""
+        for i in range(8):
+            prioritized.append(_message(f"h{i}", 'high'))
+            prioritized.append(_message(f"l{i}", 'low'))
+        order = [prioritized.popleft()['id'][0] for _ in range(8)]
+        assert order.count('h') == 6
+        assert order.count('l') == 2
+        assert order[:4].count('l') == 1
+
+    def test_peek_matches_popleft(self, prioritized):
+        """Test peek predicts the next popleft without consuming credit"""
+        for i in range(4):
+            prioritized.append(_message(f"h{i}", 'high'))
+            prioritized.append(_message(f"l{i}", 'low'))
+        for _ in range(8):
+            expected = prioritized.peek()
+            assert prioritized.popleft() is expected
+
+    def test_lookup_and_removal(self, prioritized):
+        """Test id lookups span every level"""
+        prioritized.append(_message('a', 'high'))
+        prioritized.append(_message('b'))
+        assert 'b' in prioritized
+        assert prioritized.get('a')['priority'] == 'high'
+        assert prioritized.discard('a')['id'] == 'a'
+        assert len(prioritized) == 1
+        assert [m['id'] for m in prioritized] == ['b']
+        assert prioritized.level_sizes() == {'high': 0, 'low': 1}
+
+    def test_pop_lowest(self, prioritized):
+        """Test the lowest level gives up its oldest message first"""
+        prioritized.append(_message('h', 'high'))
+        prioritized.append(_message('l1'))
+        prioritized.append(_message('l2'))
+        assert prioritized.pop_lowest()['id'] == 'l1'
+
+    def test_unknown_priority(self, prioritized):
+        """Test messages must name a configured level"""
+        with pytest.raises(ValueError):
+            prioritized.append(_message('x', 'urgent'))
+
+class TestQueueSystemDequeue:
+    def test_dequeue_and_ack(self):
+        """Test dequeue moves a message to processing and ack completes it"""
+        queue_system = QueueSystem()
+        queue_system.enqueue({"data": "test"})
+        message = queue_system.dequeue()
+        assert message['status'] == 'processing'
+        assert message['id'] in queue_system.processing
+        assert len(queue_system.queue) == 0
+        assert queue_system.ack(message['id']) is True
+        assert message['status'] == 'completed'
+        assert len(queue_system.processing) == 0
+
+    def test_dequeue_empty(self):
+        """Test dequeue on an empty queue"""
+        assert QueueSystem().dequeue() is None
+
+    def test_priority_enqueue(self):
+        """Test critical messages overtake a backlog of bulk work"""
+        queue_system = QueueSystem()
+        queue_system.enqueue_many([{'job': 'reindex'}] * 10, priority='low')
+        queue_system.enqueue({'job': 'payment'}, priority='critical')
+        message = queue_system.dequeue()
+        assert message['data'] == {'job': 'payment'}
+        assert message['priority'] == 'critical'
+        with pytest.raises(ValueError):
+            queue_system.enqueue({'job': 'x'}, priority='urgent')
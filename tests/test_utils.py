@@ -0,0 +1,114 @@
+import threading
+import time
+import pytest
+from datetime import datetime, timedelta, UTC
+from queue.message import Message
+from queue.utils import (MessageIdGenerator, _backoff_policy, calculate_backoff_delay,
+                         create_message_wrapper, generate_message_id, is_message_expired)
+
+@pytest.fixture
+def generator():
+    return MessageIdGenerator(node_id=7)
+
+class TestMessageIdGenerator:
+    def test_ids_are_increasing(self, generator):
+        """Test IDs are strictly increasing within a generator"""
+        ids = [generator.next_id() for _ in range(10000)]
+        assert ids == sorted(ids)
+        assert len(set(ids)) == len(ids)
+
+    def test_unique_across_threads(self, generator):
+        """Test concurrent enqueue threads never receive the same ID"""
+        results = [[] for _ in range(8)]
+
+        def worker(out):
+            for _ in range(5000):
+                out.append(generator.next_id())
+
+        threads = [threading.Thread(target=worker, args=(out,)) for out in results]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        ids = [i for out in results for i in out]
+        assert len(set(ids)) == len(ids)
+
+    def test_sequence_overflow_borrows_next_millisecond(self, generator, monkeypatch):
+        """Test more than 4096 IDs in one millisecond stay unique and ordered"""
+        monkeypatch.setattr('queue.utils.time.time_ns', lambda: 1_800_000_000_000_000_000)
+        ids = [generator.next_id() for _ in range(MessageIdGenerator.MAX_SEQUENCE + 10)]
+        assert ids == sorted(ids)
+        assert len(set(ids)) == len(ids)
+
+    def test_clock_going_backwards(self, generator, monkeypatch):
+        """Test a wall-clock step backwards does not repeat IDs"""
+        clock = iter([1_800_000_000_000_000_000, 1_700_000_000_000_000_000])
+        monkeypatch.setattr('queue.utils.time.time_ns', lambda: next(clock))
+        first, second = generator.next_id(), generator.next_id()
+        assert second > first
+
+    def test_node_and_timestamp_encoding(self, generator):
+        """Test the node id and creation time are recoverable from an ID"""
+        message_id = generator.next_id()
+        assert (message_id >> MessageIdGenerator.SEQUENCE_BITS) & MessageIdGenerator.MAX_NODE == 7
+        assert generator.timestamp(message_id) > 1704067200
+        assert message_id < 2 ** 63
+
+    def test_node_ids_are_not_pid_derived(self, monkeypatch):
+        """Test processes whose pids differ by 1024 don't share a node id"""
+        monkeypatch.setattr('queue.utils.os.getpid', lambda: 2048)
+        nodes = {MessageIdGenerator().node_id for _ in range(20)}
+        assert len(nodes) > 1
+        with pytest.raises(ValueError):
+            MessageIdGenerator(node_id=1024)
+
+    def test_forked_child_changes_node_id(self, generator):
+        """Test a child never keeps its parent's node id after a fork"""
+        for _ in range(50):
+            generator._after_fork()
+            parent_node = generator.node_id
+            generator._after_fork()
+            assert generator.node_id != parent_node
+
+class TestMessageWrapper:
+    def test_wrapper_uses_integer_ids(self):
+        """Test wrapped messages get unique integer IDs"""
+        first = create_message_wrapper({'a': 1})
+        second = create_message_wrapper({'a': 2})
+        assert isinstance(first['id'], int)
+        assert second['id'] > first['id']
+        assert generate_message_id() > second['id']
+
+class TestIsMessageExpired:
+    def test_aware_and_naive_timestamps(self):
+        """Test aware ISO timestamps and naive UTC ones give the same answer"""
+        old = datetime.now(UTC) - timedelta(seconds=600)
+        assert is_message_expired({'timestamp': old.isoformat()})
+        assert is_message_expired({'timestamp': old.replace(tzinfo=None).isoformat()})
+        assert not is_message_expired({'timestamp': datetime.now(UTC).isoformat()})
+
+    def test_ttl_deadline(self):
+        """Test a TTL deadline takes precedence over the age check"""
+        message = Message(1, {})
+        message.expires_at = time.time() - 1
+        assert is_message_expired(message, timeout_seconds=3600)
+        assert not is_message_expired({'timestamp': datetime.now(UTC).isoformat(),
+                                       'expires_at': time.time() + 60}, timeout_seconds=0)
+
+class TestCalculateBackoffDelay:
+    def test_exponential_up_to_cap(self):
+        """Test delays double from the base delay and stop at the cap"""
+        delays = [calculate_backoff_delay(n, base_delay=5, max_delay=300) for n in range(1, 10)]
+        assert delays == [5, 10, 20, 40, 80, 160, 300, 300, 300]
+
+    def test_attempt_zero_gets_base_delay(self):
+        """Test attempt 0 (and below) waits the base delay, not the maximum"""
+        assert calculate_backoff_delay(0, base_delay=5, max_delay=300) == 5
+        assert calculate_backoff_delay(-1, base_delay=5, max_delay=300) == 5
+
+    def test_policy_is_compiled_once(self):
+        """Test repeated calls reuse one compiled delay table"""
+        calculate_backoff_delay(3, base_delay=7, max_delay=70)
+        hits = _backoff_policy.cache_info().hits
+        calculate_backoff_delay(4, base_delay=7, max_delay=70)
+        assert _backoff_policy.cache_info().hits == hits + 1
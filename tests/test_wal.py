@@ -0,0 +1,248 @@
+import os
+import threading
+import pytest
+from queue.wal import WriteAheadLog
+from queue.manager import QueueSystem
+from queue.failures import FailureType
+
+@pytest.fixture
+def wal_dir(tmp_path):
+    return str(tmp_path / "wal")
+
+def _segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith('wal-'))
+
+class TestWriteAheadLog:
+    def test_append_and_replay(self, wal_dir):
+        """Test records written by one log are replayed by the next"""
+        wal = WriteAheadLog(wal_dir)
+        lsn = wal.append_many([('enqueue', {'id': 1}), ('ack', 1)])
+        wal.wait(lsn)
+        wal.close()
+
+        records = list(WriteAheadLog(wal_dir).replay())
+        assert records == [('enqueue', {'id': 1}), ('ack', 1)]
+
+    def test_torn_tail_is_discarded(self, wal_dir):
+        """Test a partially written final frame is ignored on replay"""
+        wal = WriteAheadLog(wal_dir)
+        wal.append('enqueue', {'id': 1})
+        wal.append('enqueue', {'id': 2})
+        wal.close()
+        path = os.path.join(wal_dir, _segments(wal_dir)[-1])
+        with open(path, 'r+b') as f:
+            f.truncate(os.path.getsize(path) - 3)
+
+        records = list(WriteAheadLog(wal_dir).replay())
+        assert records == [('enqueue', {'id': 1})]
+
+    def test_when_durable_runs_after_commit(self, wal_dir):
+        """Test durability callbacks fire once their record is committed"""
+        wal = WriteAheadLog(wal_dir)
+        committed = threading.Event()
+        wal.when_durable(wal.append('enqueue', {'id': 1}), committed.set)
+        assert committed.wait(5)
+        calls = []
+        wal.when_durable(1, lambda: calls.append(1))
+        assert calls == [1]
+        wal.close()
+
+    def test_new_run_writes_new_segment(self, wal_dir):
+        """Test a reopened log never appends to an existing segment"""
+        for i in range(2):
+            wal = WriteAheadLog(wal_dir, sync='none')
+            wal.append('ack', i)
+            wal.close()
+        assert len(_segments(wal_dir)) == 2
+
+    def test_segment_rollover(self, wal_dir):
+        """Test segments are rotated once they reach segment_bytes"""
+        wal = WriteAheadLog(wal_dir, segment_bytes=64, sync='none')
+        for i in range(10):
+            wal.append('ack', i)
+            wal.flush()
+        wal.close()
+        assert len(_segments(wal_dir)) > 1
+        assert [payload for _, payload in WriteAheadLog(wal_dir).replay()] == list(range(10))
+
+    def test_invalid_sync_mode(self, wal_dir):
+        """Test unknown durability modes are rejected"""
+        with pytest.raises(ValueError):
+            WriteAheadLog(wal_dir, sync='sometimes')
+
+class TestDurableQueueSystem:
+    def test_state_survives_restart(self, wal_dir):
+        """Test pending, scheduled and dead-lettered messages are restored"""
+        queue_system = QueueSystem(wal=WriteAheadLog(wal_dir))
+        for i in range(4):
+            queue_system.enqueue({"n": i})
+        acked = queue_system.dequeue()
+        queue_system.ack(acked['id'])
+        retried = queue_system.dequeue()
+        queue_system.handle_failure(retried, "timed out", FailureType.TIMEOUT)
+        dead = queue_system.dequeue()
+        queue_system.handle_failure(dead, "bad input", FailureType.VALIDATION)
+        queue_system.wal.close()
+
+        restored = QueueSystem(wal=WriteAheadLog(wal_dir))
+        assert [m['data'] for m in restored.queue] == [{"n": 3}]
+        assert [m['id'] for m in restored.scheduled.messages()] == [retried['id']]
+        assert [m['id'] for m in restored.dead_letter_queue] == [dead['id']]
+        restored.wal.close()
+
+    def test_in_flight_messages_are_recovered(self, wal_dir):
+        """Test messages processing at crash time are retried after restart"""
+        queue_system = QueueSystem(wal=WriteAheadLog(wal_dir))
+        queue_system.enqueue({"n": 1})
+        in_flight = queue_system.dequeue()
+        queue_system.wal.close()
+
+        restored = QueueSystem(wal=WriteAheadLog(wal_dir))
+        assert len(restored.processing) == 0
+        assert restored.queue[0]['id'] == in_flight['id']
+        assert restored.queue[0]['attempt'] == 1
+        restored.wal.close()
+
+    def test_checkpoint_compacts_segments(self, wal_dir):
+        """Test checkpoints drop covered segments and restore from the snapshot"""
+        wal = WriteAheadLog(wal_dir, checkpoint_records=10)
+        queue_system = QueueSystem(wal=wal)
+        for i in range(25):
+            queue_system.enqueue({"n": i})
+        wal.close()
+        assert len(_segments(wal_dir)) <= 2
+        assert any(name.startswith('snapshot-') for name in os.listdir(wal_dir))
+
+        restored = QueueSystem(wal=WriteAheadLog(wal_dir))
+        assert [m['data']['n'] for m in restored.queue] == list(range(25))
+        restored.wal.close()
+
+    def test_checkpoint_streams_spill(self, wal_dir, tmp_path):
+        """Test a checkpoint stores the spilled backlog after the in-memory state"""
+        queue_system = QueueSystem(wal=WriteAheadLog(wal_dir), max_size=3, overflow='spill',
+                                   spill_directory=str(tmp_path))
+        queue_system.enqueue_many([{"n": i} for i in range(10)])
+        queue_system.checkpoint()
+        queue_system.wal.close()
+
+        restored = QueueSystem(wal=WriteAheadLog(wal_dir), max_size=3, overflow='spill',
+                               spill_directory=str(tmp_path))
+        assert restored.monitor_health()['spilled'] == 7
+        assert [m['data']['n'] for m in restored.dequeue_batch(10)] == list(range(10))
+        restored.wal.close()
+
+    def test_restore_replays_log_over_streamed_spill(self, wal_dir, tmp_path):
+        """Test records after a checkpoint apply to messages restored from its spill"""
+        options = dict(max_size=3, overflow='spill', spill_directory=str(tmp_path))
+        queue_system = QueueSystem(wal=WriteAheadLog(wal_dir), **options)
+        queue_system.enqueue_many([{"n": i} for i in range(10)])
+        queue_system.checkpoint()
+        taken = queue_system.dequeue_batch(5)
+        queue_system.ack_many([message['id'] for message in taken[:2]])
+        queue_system.enqueue({"n": 10})
+        queue_system.wal.close()
+
+        snapshot, tail, _ = WriteAheadLog(wal_dir).load_snapshot()
+        assert len(snapshot['pending']) == 3
+        assert not isinstance(tail, list)
+        assert [m['data']['n'] for m in tail] == list(range(3, 10))
+
+        restored = QueueSystem(wal=WriteAheadLog(wal_dir), **options)
+        health = restored.monitor_health()
+        assert health['pending'] + health['spilled'] == 9
+        received = [m['data']['n'] for m in restored.dequeue_batch(20)]
+        # In-flight messages are recovered and retried alongside the backlog
+        assert sorted(received) == list(range(2, 11))
+        assert [n for n in received if n >= 5] == [5, 6, 7, 8, 9, 10]
+        restored.wal.close()
+
+    def test_restore_with_spill_reads_replayed_messages_back(self, wal_dir, tmp_path):
+        """Test messages replayed from the log reach every state when read in a second pass"""
+        queue_system = QueueSystem(wal=WriteAheadLog(wal_dir), max_size=0)
+        queue_system.enqueue_many([{"n": i} for i in range(6)])
+        first, second, third = queue_system.dequeue_batch(3)
+        queue_system.nack(first['id'], 'timed out', FailureType.NETWORK)
+        queue_system.nack(second['id'], 'bad input', FailureType.VALIDATION)
+        queue_system.wal.close()
+
+        restored = QueueSystem(wal=WriteAheadLog(wal_dir), max_size=2, overflow='spill',
+                               spill_directory=str(tmp_path))
+        assert restored.scheduled.messages()[0]['data'] == {"n": 0}
+        assert [m['data'] for m in restored.dead_letter_queue] == [{"n": 1}]
+        assert restored.monitor_health()['spilled'] == 1
+        # The in-flight message is recovered and retried
+        received = [m['data']['n'] for m in restored.dequeue_batch(10)]
+        assert sorted(received) == [2, 3, 4, 5]
+        restored.wal.close()
+
+    def test_run_logs_each_dequeue_once(self, wal_dir):
+        """Test worker dispatch writes one dequeue record per message"""
+        queue_system = QueueSystem(wal=WriteAheadLog(wal_dir))
+        queue_system.enqueue_many([{"n": i} for i in range(5)])
+        assert queue_system.run(lambda message: None, workers=2)['processed'] == 5
+        queue_system.wal.close()
+        ops = [op for op, _ in WriteAheadLog(wal_dir).replay()]
+        assert ops.count('dequeue') == 5
+
+    def test_nack_waits_for_commit_without_the_lock(self, wal_dir):
+        """Test other callers can use the queue while a nack waits on the WAL"""
+        queue_system = QueueSystem(wal=WriteAheadLog(wal_dir))
+        queue_system.enqueue({"n": 1})
+        message = queue_system.dequeue()
+        waiting, release = threading.Event(), threading.Event()
+
+        def slow_wait(lsn):
+            waiting.set()
+            release.wait(5)
+
+        queue_system.wal.wait = slow_wait
+        nacking = threading.Thread(target=queue_system.nack, args=(message['id'],))
+        nacking.start()
+        assert waiting.wait(5)
+        acquired = queue_system._lock.acquire(timeout=1)
+        if acquired:
+            queue_system._lock.release()
+        release.set()
+        nacking.join()
+        queue_system.wal.close()
+        assert acquired
+
+    def test_batches_survive_restart(self, wal_dir):
+        """Test batch operations are logged and replayed"""
+        queue_system = QueueSystem(wal=WriteAheadLog(wal_dir))
+        queue_system.enqueue_many([{"n": i} for i in range(6)])
+        batch = queue_system.dequeue_batch(4)
+        queue_system.ack_many([m['id'] for m in batch[:2]])
+        queue_system.nack_many([m['id'] for m in batch[2:]], "bad", FailureType.VALIDATION)
+        queue_system.wal.close()
+
+        restored = QueueSystem(wal=WriteAheadLog(wal_dir))
+        assert [m['data']['n'] for m in restored.queue] == [4, 5]
+        assert sorted(m['data']['n'] for m in restored.dead_letter_queue) == [2, 3]
+        restored.wal.close()
+
+    def test_expiry_survives_restart(self, wal_dir):
+        """Test expired messages stay gone and TTL deadlines are restored"""
+        queue_system = QueueSystem(wal=WriteAheadLog(wal_dir))
+        queue_system.enqueue({"n": 1}, ttl=10)
+        queue_system.enqueue({"n": 2}, ttl=1000)
+        queue_system.expire_due(queue_system.queue[0].expires_at)
+        queue_system.wal.close()
+
+        restored = QueueSystem(wal=WriteAheadLog(wal_dir))
+        assert [m['data']['n'] for m in restored.queue] == [2]
+        assert len(restored.expiry) == 1
+        restored.wal.close()
+
+    def test_restore_spills_past_hot_window(self, wal_dir, tmp_path):
+        """Test a restored backlog larger than max_size goes back to disk"""
+        queue_system = QueueSystem(wal=WriteAheadLog(wal_dir), max_size=0)
+        queue_system.enqueue_many([{"n": i} for i in range(10)])
+        queue_system.wal.close()
+
+        restored = QueueSystem(wal=WriteAheadLog(wal_dir), max_size=4, overflow='spill',
+                               spill_directory=str(tmp_path))
+        assert restored.monitor_health()['pending'] == 4
+        assert restored.monitor_health()['spilled'] == 6
+        assert [m['data']['n'] for m in restored.dequeue_batch(10)] == list(range(10))
+        restored.wal.close()